@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+# Serve the read endpoints from their async views (core.asyncviews)
+os.environ.setdefault("ASYNC_READ_VIEWS", "True")
 
 application = get_asgi_application()
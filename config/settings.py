@@ -1,6 +1,8 @@
+import sys
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -71,16 +73,58 @@ INTERNAL_IPS = [
 # ------------------------
 # Database
 # ------------------------
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': config('DB_NAME', default='harvestguard_db'),
-        'USER': config('DB_USER', default='postgres'),
-        'PASSWORD': config('DB_PASSWORD', default='password'),
-        'HOST': config('DB_HOST', default='localhost'),
-        'PORT': config('DB_PORT', default='5432'),
+# `manage.py test` runs on SQLite unless DB_ENGINE=postgresql is set, so the
+# suite works without a database server; everything else defaults to PostgreSQL.
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+DB_ENGINE = config('DB_ENGINE', default='sqlite' if TESTING else 'postgresql')
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='harvestguard_db'),
+            'USER': config('DB_USER', default='postgres'),
+            'PASSWORD': config('DB_PASSWORD', default='password'),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'OPTIONS': {},
+        }
+    }
+
+# How each process manages its connections (see GET /api/db-stats/):
+#   close       connect for every request, Django's default
+#   persistent  keep each thread's connection for DB_CONN_MAX_AGE seconds
+#   pool        a psycopg 3 pool shared by the process's threads (PostgreSQL only)
+# Reused connections are checked before the first query of each request, or
+# on checkout from the pool, so one dropped while a serverless instance was
+# frozen is replaced instead of failing the request.
+DB_CONNECTION_MODE = config('DB_CONNECTION_MODE', default='close')
+
+if DB_CONNECTION_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif DB_CONNECTION_MODE == 'pool':
+    if DB_ENGINE == 'sqlite':
+        raise ImproperlyConfigured("DB_CONNECTION_MODE=pool needs PostgreSQL.")
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=1, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=4, cast=int),
+        # seconds a request waits for a free connection before failing
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+        # idle connections are closed after max_idle seconds, every one after max_lifetime
+        'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+        'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=1800, cast=float),
+    }
+elif DB_CONNECTION_MODE != 'close':
+    raise ImproperlyConfigured(f"Unknown DB_CONNECTION_MODE {DB_CONNECTION_MODE!r}; use close, persistent or pool.")
 
 # ------------------------
 # Password validation
@@ -107,8 +151,35 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = "whitenoise.storage.CompressedStaticFilesStorage"
 
+# ------------------------
+# API docs
+# ------------------------
+# Written under STATIC_ROOT by `manage.py build_openapi_schema`. When it is there, the Swagger UI and ReDoc
+# pages load the schema from it through WhiteNoise rather than from the schema view
+OPENAPI_SCHEMA_FILE = 'openapi/schema.json'
+if (STATIC_ROOT / OPENAPI_SCHEMA_FILE).exists():
+    SWAGGER_SETTINGS = {'SPEC_URL': STATIC_URL + OPENAPI_SCHEMA_FILE}
+    REDOC_SETTINGS = {'SPEC_URL': STATIC_URL + OPENAPI_SCHEMA_FILE}
+
 # Media files
 MEDIA_URL = '/media/'
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+
+# ------------------------
+# Export jobs
+# ------------------------
+EXPORT_JOB_CHUNK_SIZE = config('EXPORT_JOB_CHUNK_SIZE', default=5000, cast=int)
+# RUNNING jobs not touched for this long are assumed to belong to a dead worker
+EXPORT_JOB_STALE_AFTER = timedelta(minutes=config('EXPORT_JOB_STALE_MINUTES', default=10, cast=int))
+
+# ------------------------
+# Health scans
+# ------------------------
+HEALTH_SCAN_MAX_UPLOAD_SIZE = config('HEALTH_SCAN_MAX_UPLOAD_SIZE', default=20 * 1024 * 1024, cast=int)
+# Dotted path to a core.scans.ScanClassifier; the default is a local stand-in model
+HEALTH_SCAN_CLASSIFIER = config('HEALTH_SCAN_CLASSIFIER', default='core.scans.DarkSpotClassifier')
+# PROCESSING scans not touched for this long are assumed to belong to a dead worker
+HEALTH_SCAN_STALE_AFTER = timedelta(minutes=config('HEALTH_SCAN_STALE_MINUTES', default=10, cast=int))
 
 # ------------------------
 # Auth
@@ -116,28 +187,65 @@ MEDIA_URL = '/media/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'core.User'
 
+# Users resolved from JWTs are kept in a per-process LRU (core.authentication)
+# and revalidated against a version in the shared cache on every request.
+# Off by default: it needs a CACHE_BACKEND shared by every worker (checked below)
+AUTH_USER_CACHE_ENABLED = config('AUTH_USER_CACHE_ENABLED', default=False, cast=bool)
+AUTH_USER_CACHE_SIZE = config('AUTH_USER_CACHE_SIZE', default=1024, cast=int)
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=300, cast=int)
+
 # ------------------------
 # REST Framework
 # ------------------------
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # MessagePack for mobile clients: Accept/Content-Type application/msgpack or ?format=msgpack
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'core.renderers.MessagePackRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'core.parsers.MessagePackParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 }
 
+# Batch, loss event and intervention reads skip ModelSerializer (core.reads)
+VALUES_READ_PATH_ENABLED = config('VALUES_READ_PATH_ENABLED', default=True, cast=bool)
+
+# Read endpoints served by async views (core.asyncviews). config/asgi.py turns
+# this on. WSGI servers would run each async view through a fresh event loop,
+# so they keep the synchronous views.
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('JWT',),
+    # Rotated-out refresh tokens are revoked in core.revocation, not token_blacklist
+    'TOKEN_REFRESH_SERIALIZER': 'core.serializers.RevocableTokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER': 'core.serializers.RevocableTokenVerifySerializer',
 }
 
+# Each process answers "is this refresh token revoked?" from a Bloom filter
+# sized for this many unexpired revocations (it grows when they outnumber it)
+REVOKED_TOKEN_BLOOM_CAPACITY = config('REVOKED_TOKEN_BLOOM_CAPACITY', default=100000, cast=int)
+REVOKED_TOKEN_BLOOM_ERROR_RATE = config('REVOKED_TOKEN_BLOOM_ERROR_RATE', default=0.001, cast=float)
+# Incremental loads look back this far, for revocations that commit late
+REVOKED_TOKEN_OVERLAP = timedelta(seconds=config('REVOKED_TOKEN_OVERLAP_SECONDS', default=5, cast=int))
+
 DJOSER = {
     'USER_ID_FIELD': 'id',
     'SERIALIZERS': {
@@ -148,7 +256,78 @@ DJOSER = {
     'LOGIN_FIELD': 'email',
 }
 
+# ------------------------
+# Cache
+# ------------------------
+# Local memory works out of the box; point CACHE_BACKEND/CACHE_LOCATION at a
+# shared backend (e.g. django.core.cache.backends.redis.RedisCache) in
+# production so invalidations reach every worker.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='harvestguard'),
+    }
+}
+
+RESPONSE_CACHE_ENABLED = config('RESPONSE_CACHE_ENABLED', default=True, cast=bool)
+RESPONSE_CACHE_ALIAS = config('RESPONSE_CACHE_ALIAS', default='default')
+
+# Local memory only reaches the worker that bumps a user's auth version; the
+# others would keep serving a deactivated user until AUTH_USER_CACHE_TIMEOUT
+if AUTH_USER_CACHE_ENABLED and CACHES[RESPONSE_CACHE_ALIAS]['BACKEND'].endswith('.LocMemCache'):
+    raise ImproperlyConfigured("AUTH_USER_CACHE_ENABLED needs a CACHE_BACKEND shared by all workers, "
+                               "such as django.core.cache.backends.redis.RedisCache")
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Earned-badge sets consulted by the achievement rules (core.achievements)
+BADGE_CACHE_TIMEOUT = config('BADGE_CACHE_TIMEOUT', default=86400, cast=int)
+
+# ------------------------
+# Farmer import
+# ------------------------
+# Password hashing threads per POST /api/users/import/ request; the
+# import_farmers command uses a process pool (--workers) instead
+FARMER_IMPORT_HASH_THREADS = config('FARMER_IMPORT_HASH_THREADS', default=4, cast=int)
+# Rows accepted per POST /api/users/import/ request. Each costs a PBKDF2 hash in the request,
+# which has to finish inside the serverless function timeout
+FARMER_IMPORT_MAX_ROWS = config('FARMER_IMPORT_MAX_ROWS', default=100, cast=int)
+
+# ------------------------
+# Weather
+# ------------------------
+# Current conditions per division (core.weather). The file provider serves
+# WEATHER_FIXTURE_PATH; core.weather.StoredWeatherProvider serves the latest
+# imported WeatherData instead.
+WEATHER_PROVIDER = config('WEATHER_PROVIDER', default='core.weather.FileWeatherProvider')
+WEATHER_FIXTURE_PATH = config('WEATHER_FIXTURE_PATH', default=str(BASE_DIR / 'core' / 'fixtures' / 'weather.json'))
+# Shared tier (RESPONSE_CACHE_ALIAS) and the per-process LRU in front of it
+WEATHER_CACHE_TIMEOUT = config('WEATHER_CACHE_TIMEOUT', default=900, cast=int)
+WEATHER_LOCAL_CACHE_TIMEOUT = config('WEATHER_LOCAL_CACHE_TIMEOUT', default=60, cast=int)
+WEATHER_LOCAL_CACHE_SIZE = config('WEATHER_LOCAL_CACHE_SIZE', default=32, cast=int)
+# How long one worker may hold the fetch lock before others fetch themselves
+WEATHER_FETCH_LOCK_TIMEOUT = config('WEATHER_FETCH_LOCK_TIMEOUT', default=10, cast=int)
+
+# ------------------------
+# Delta sync
+# ------------------------
+# Tokens are backdated by this much so rows from transactions that commit
+# late are not skipped
+SYNC_TOKEN_OVERLAP = timedelta(seconds=config('SYNC_TOKEN_OVERLAP_SECONDS', default=5, cast=int))
+# Tombstones older than this are pruned; older tokens get a full resync
+SYNC_TOMBSTONE_RETENTION = timedelta(days=config('SYNC_TOMBSTONE_RETENTION_DAYS', default=90, cast=int))
+
+# ------------------------
+# Loss rollups
+# ------------------------
+# The refresh high-water mark is set this far before the run started, so
+# rows from transactions that commit late are rolled up by the next run
+LOSS_ROLLUP_OVERLAP = timedelta(seconds=config('LOSS_ROLLUP_OVERLAP_SECONDS', default=60, cast=int))
+# Months rebuilt per transaction
+LOSS_ROLLUP_MONTHS_PER_CHUNK = config('LOSS_ROLLUP_MONTHS_PER_CHUNK', default=6, cast=int)
+
 # ------------------------
 # CORS
 # ------------------------
 CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS', default='http://localhost:5173').split(',')
+# Let browser clients read the validators used for conditional GETs
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified']
@@ -1,8 +1,155 @@
-from core.models import Achievement
+"""
+Declarative badge rules, evaluated incrementally from write events.
 
-def award_badge(user, badge_name):
+Views report what happened (evaluate_badges(user, 'loss_event_created',
+loss_events=[...])). Only rules listening to that event whose badge the
+user has not earned yet are looked at, and the earned set is cached, so
+once a badge is held its rule costs no queries at all.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+
+from core.cache import get_cache, invalidate_user
+from core.models import Achievement, CropBatch, HealthScan, LossEvent, Intervention
+
+DATA_KEEPER_MIN_RECORDS = 10
+WEATHER_ANALYST_MIN_EVENTS = 3
+SCANNER_MASTER_MIN_SCANS = 10
+
+
+class BadgeRule:
     """
-    Awards a badge to the user if not already earned.
+    badge       -- Achievement.badge_name to award
+    events      -- write events that can earn it
+    qualifiers  -- user_ids -> queryset of ids of those users who qualify
+    trigger     -- cheap check on the event payload; the qualifier query only
+                   runs when it passes
+    proven_by_trigger -- the event alone earns the badge, skip the query
     """
-    if not Achievement.objects.filter(user=user, badge_name=badge_name).exists():
-        Achievement.objects.create(user=user, badge_name=badge_name)
+    def __init__(self, badge, events, qualifiers, trigger=None, proven_by_trigger=False):
+        self.badge = badge
+        self.events = set(events)
+        self.qualifiers = qualifiers
+        self.trigger = trigger or (lambda context: True)
+        self.proven_by_trigger = proven_by_trigger
+
+    def earned_by(self, user_id, context):
+        if not self.trigger(context):
+            return False
+        return self.proven_by_trigger or self.qualifiers([user_id]).exists()
+
+
+def _record_counts(user_ids):
+    # summed from the batches' counter columns (core.counters), no joins
+    return (
+        CropBatch.objects.filter(farmer_id__in=user_ids)
+        .order_by()
+        .values('farmer_id')
+        .annotate(records=Sum(F('loss_event_count') + F('intervention_count')))
+    )
+
+
+BADGE_RULES = [
+    BadgeRule(
+        'FIRST_HARVEST',
+        events=['batch_created'],
+        qualifiers=lambda user_ids: CropBatch.objects.filter(farmer_id__in=user_ids)
+                                                     .values_list('farmer_id', flat=True).distinct(),
+        proven_by_trigger=True,
+    ),
+    BadgeRule(
+        'RISK_MITIGATOR',
+        events=['intervention_created', 'intervention_updated'],
+        qualifiers=lambda user_ids: Intervention.objects.filter(batch__farmer_id__in=user_ids, success=True)
+                                                        .values_list('batch__farmer_id', flat=True).distinct(),
+        trigger=lambda context: any(i.success for i in context.get('interventions', ())),
+        proven_by_trigger=True,
+    ),
+    BadgeRule(
+        'WEATHER_ANALYST',
+        events=['loss_event_created', 'loss_event_updated'],
+        qualifiers=lambda user_ids: LossEvent.objects.filter(batch__farmer_id__in=user_ids, loss_type='WEATHER')
+                                                     .values('batch__farmer_id')
+                                                     .annotate(events=Count('id'))
+                                                     .filter(events__gte=WEATHER_ANALYST_MIN_EVENTS)
+                                                     .values_list('batch__farmer_id', flat=True),
+        trigger=lambda context: any(e.loss_type == 'WEATHER' for e in context.get('loss_events', ())),
+    ),
+    BadgeRule(
+        'SCANNER_MASTER',
+        events=['health_scan_created'],
+        qualifiers=lambda user_ids: HealthScan.objects.filter(batch__farmer_id__in=user_ids)
+                                                      .values('batch__farmer_id')
+                                                      .annotate(scans=Count('id'))
+                                                      .filter(scans__gte=SCANNER_MASTER_MIN_SCANS)
+                                                      .values_list('batch__farmer_id', flat=True),
+    ),
+    BadgeRule(
+        'DATA_KEEPER',
+        events=['loss_event_created', 'intervention_created'],
+        qualifiers=lambda user_ids: _record_counts(user_ids).filter(records__gte=DATA_KEEPER_MIN_RECORDS)
+                                                            .values_list('farmer_id', flat=True),
+    ),
+]
+
+RULES_BY_EVENT = defaultdict(list)
+for _rule in BADGE_RULES:
+    for _event in _rule.events:
+        RULES_BY_EVENT[_event].append(_rule)
+
+
+def _badges_key(user_id):
+    return f'hg:badges:{user_id}'
+
+
+def get_earned_badges(user_id):
+    """The user's earned badge names, from the cache when possible"""
+    cache = get_cache()
+    badges = cache.get(_badges_key(user_id))
+    if badges is None:
+        badges = frozenset(Achievement.objects.filter(user_id=user_id).values_list('badge_name', flat=True))
+        cache.set(_badges_key(user_id), badges, settings.BADGE_CACHE_TIMEOUT)
+    return badges
+
+
+def forget_earned_badges(user_id):
+    get_cache().delete(_badges_key(user_id))
+
+
+def award_badges(user_ids_by_badge):
+    """
+    Insert achievements for {badge_name: [user_id, ...]} in one statement,
+    skipping ones that already exist. Concurrent awards of the same badge
+    simply collide on the (user, badge_name) unique constraint and are ignored.
+    """
+    achievements = [
+        Achievement(user_id=user_id, badge_name=badge)
+        for badge, user_ids in user_ids_by_badge.items()
+        for user_id in user_ids
+    ]
+    if not achievements:
+        return
+    Achievement.objects.bulk_create(achievements, ignore_conflicts=True)
+    # bulk_create() sends no post_save, so refresh the caches here
+    for user_id in {achievement.user_id for achievement in achievements}:
+        forget_earned_badges(user_id)
+        invalidate_user(user_id)
+
+
+def evaluate_badges(user, event, **context):
+    """Run the rules listening to `event` for badges the user does not hold yet"""
+    rules = RULES_BY_EVENT.get(event)
+    if not rules:
+        return []
+    earned = get_earned_badges(user.pk)
+    newly_earned = [
+        rule.badge for rule in rules
+        if rule.badge not in earned and rule.earned_by(user.pk, context)
+    ]
+    if newly_earned:
+        award_badges({badge: [user.pk] for badge in newly_earned})
+        # the insert either added the badges or found them already there
+        get_cache().set(_badges_key(user.pk), earned | set(newly_earned), settings.BADGE_CACHE_TIMEOUT)
+    return newly_earned
@@ -1,8 +1,44 @@
 from django.contrib import admin
-from .models import CropBatch, User, Achievement
+from .models import CropBatch, User, Achievement, ExportJob, LossRollup, WeatherData, RiskPrediction, HealthScan
+
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    list_display = ('email', 'phone_number', 'batch_count', 'created_at')
+    search_fields = ('email', 'phone_number')
+
+
+@admin.register(CropBatch)
+class CropBatchAdmin(admin.ModelAdmin):
+    # the counts are denormalized columns, so the changelist needs no joins
+    list_display = ('id', 'farmer', 'storage_location', 'status', 'loss_event_count',
+                    'total_loss_kg', 'intervention_count', 'successful_intervention_count')
+    list_filter = ('status', 'storage_location', 'storage_type')
+    list_select_related = ('farmer',)
+
+
+@admin.register(LossRollup)
+class LossRollupAdmin(admin.ModelAdmin):
+    list_display = ('month', 'division', 'storage_type', 'loss_type', 'loss_event_count',
+                    'total_loss_kg', 'batch_count', 'loss_rate')
+    list_filter = ('division', 'storage_type', 'loss_type')
+
+
+@admin.register(RiskPrediction)
+class RiskPredictionAdmin(admin.ModelAdmin):
+    list_display = ('batch', 'risk_level', 'risk_score', 'etcl_hours', 'updated_at')
+    list_filter = ('risk_level',)
+    list_select_related = ('batch__farmer',)
+
+
+@admin.register(HealthScan)
+class HealthScanAdmin(admin.ModelAdmin):
+    list_display = ('id', 'batch', 'status', 'detection_result', 'confidence', 'size', 'created_at')
+    list_filter = ('status', 'detection_result')
+    list_select_related = ('batch__farmer',)
+
 
 # Register models so they appear in Django Admin
-admin.site.register(User)
-admin.site.register(CropBatch)
 admin.site.register(Achievement)
-
+admin.site.register(ExportJob)
+admin.site.register(WeatherData)
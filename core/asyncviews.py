@@ -0,0 +1,83 @@
+"""
+Async read paths for the ASGI entry point (config/asgi.py).
+
+Under ASGI, Django runs each synchronous view on the one thread it keeps for
+sync code, so every request waits for the queries of the ones ahead of it,
+serialization and rendering included. With ASYNC_READ_VIEWS on, viewsets
+using AsyncReadMixin answer an action from its `a<action>` twin (alist for
+list, aactive for active) on the event loop. Only the async ORM calls leave
+the loop. Actions without a twin, writes included, run the synchronous view
+as before. WSGI deployments leave the setting off and keep synchronous views.
+"""
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.shortcuts import aget_object_or_404 as django_aget_object_or_404
+
+
+async def aget_object_or_404(queryset, **filter_kwargs):
+    """rest_framework.generics.get_object_or_404 for async views"""
+    try:
+        return await django_aget_object_or_404(queryset, **filter_kwargs)
+    except (TypeError, ValueError, ValidationError):
+        raise Http404
+
+
+async def fetch_all(queryset):
+    """
+    The queryset's rows. Iterating the queryset fetches them in one trip to
+    the sync thread; aiterator() would make one per chunk plus a last one.
+    """
+    return [row async for row in queryset]
+
+
+class AsyncReadMixin:
+    """Routes a viewset's actions to their async twins when ASYNC_READ_VIEWS is on"""
+    # set by as_view(); pass async_reads=True/False to override the setting
+    async_reads = False
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        if 'async_reads' not in initkwargs:
+            initkwargs['async_reads'] = settings.ASYNC_READ_VIEWS and any(
+                hasattr(cls, f'a{action}') for action in (actions or {}).values()
+            )
+        view = super().as_view(actions, **initkwargs)
+        if initkwargs['async_reads']:
+            # Django awaits the coroutine dispatch() returns
+            markcoroutinefunction(view)
+        return view
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.async_reads:
+            return self.adispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """APIView.dispatch(), awaiting the action's async twin"""
+        action = self.action_map.get(request.method.lower())
+        handler = getattr(self, f'a{action}', None) if action else None
+        if handler is None:
+            return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            # a user cache miss loads the user from the database
+            await sync_to_async(self.perform_authentication)(request)
+            self.initial(request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def apaginate_queryset(self, queryset):
+        """paginate_queryset() through the paginator's apaginate_queryset()"""
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
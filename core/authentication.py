@@ -0,0 +1,92 @@
+"""
+JWT authentication without the per-request users-table lookup.
+
+JWTAuthentication checks the token signature, then loads the User named by
+its user_id claim on every request. CachedJWTAuthentication keeps the users
+it has loaded in a small in-process LRU with a TTL. Each entry is stamped
+with the user's auth version from the shared cache. The version is bumped
+whenever the row changes: profile edits, deactivation and password changes
+through core.signals, batch_count moves through core.counters. A hit then
+costs one cache read instead of a query.
+"""
+import copy
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import get_cache
+from .lru import LRUCache
+
+_users = None
+
+
+def _user_cache():
+    global _users
+    if _users is None:
+        _users = LRUCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TIMEOUT)
+    return _users
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    global _users
+    if setting.startswith('AUTH_USER_CACHE'):
+        _users = None
+
+
+def _version_key(user_id):
+    return f'hg:auth:version:{user_id}'
+
+
+def get_auth_version(user_id):
+    return get_cache().get_or_set(_version_key(user_id), 1, timeout=None)
+
+
+def _bump(user_id):
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), 2, timeout=None)
+    _user_cache().discard(str(user_id))
+
+
+def forget_authenticated_user(user_id):
+    """
+    Make every worker reload the user on its next request. Bumped now and
+    again on commit, so a request that read the old row just before the
+    commit cannot cache it under the new version.
+    """
+    if user_id is None:
+        return
+    _bump(user_id)
+    transaction.on_commit(lambda: _bump(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication serving users from the auth LRU (AUTH_USER_CACHE_ENABLED)"""
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if not settings.AUTH_USER_CACHE_ENABLED or user_id is None:
+            return super().get_user(validated_token)
+
+        version = get_auth_version(user_id)
+        entry = _user_cache().get(str(user_id))
+        if entry is not None and entry[0] == version:
+            user = entry[1]
+            # inactive users never reach the cache; a password change bumps the version
+            if (api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+                    != get_md5_hash_password(user.password)):
+                raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        else:
+            user = super().get_user(validated_token)
+            _user_cache().set(str(user_id), (version, user))
+        # each request gets its own copy to modify
+        return copy.copy(user)
@@ -0,0 +1,153 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from . import counters
+from .cache import invalidate_user
+from .models import CropBatch
+
+
+def to_pk(model, value):
+    """Coerce a client-supplied primary key, returning None if it is malformed"""
+    try:
+        return model._meta.pk.to_python(value)
+    except (DjangoValidationError, TypeError, ValueError):
+        return None
+
+
+class BulkWriteMixin:
+    """
+    Adds POST/PATCH ``bulk/`` routes that take a JSON array of items.
+
+    Every referenced batch is checked against the caller's batches in a
+    single query, valid items are written with one bulk_create/bulk_update
+    inside a transaction (together with the parent counters, see
+    core.counters), and invalid items are reported by index without
+    blocking the rest of the sync.
+    Viewsets hook side effects in through perform_bulk_create/perform_bulk_update.
+    """
+    bulk_max_items = 1000
+
+    def get_bulk_items(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of items.']})
+        if len(items) > self.bulk_max_items:
+            raise ValidationError({'non_field_errors': [
+                f'A bulk request may contain at most {self.bulk_max_items} items.'
+            ]})
+        return items
+
+    def get_owned_batches(self, items):
+        """Load the caller's batches referenced by items, in one query"""
+        batch_ids = {to_pk(CropBatch, item.get('batch')) for item in items if isinstance(item, dict)}
+        batch_ids.discard(None)
+        if not batch_ids:
+            return {}
+        batches = CropBatch.objects.filter(farmer=self.request.user, id__in=batch_ids).only('id', 'farmer_id')
+        return {batch.id: batch for batch in batches}
+
+    def get_bulk_context(self, items):
+        context = self.get_serializer_context()
+        context['owned_batches'] = self.get_owned_batches(items)
+        return context
+
+    @staticmethod
+    def bulk_status(succeeded, errors, success_status):
+        if not errors:
+            return success_status
+        return status.HTTP_207_MULTI_STATUS if succeeded else status.HTTP_400_BAD_REQUEST
+
+    @action(detail=False, methods=['POST', 'PATCH'], url_path='bulk')
+    def bulk(self, request):
+        """Create (POST) or update (PATCH, items carry their id) many records at once"""
+        if request.method == 'PATCH':
+            return self.bulk_update(request)
+        return self.bulk_create(request)
+
+    def bulk_create(self, request):
+        items = self.get_bulk_items(request)
+        context = self.get_bulk_context(items)
+        serializer_class = self.get_serializer_class()
+        model = serializer_class.Meta.model
+
+        instances, errors = [], []
+        for index, item in enumerate(items):
+            serializer = serializer_class(data=item, context=context)
+            if serializer.is_valid():
+                instances.append(model(**serializer.validated_data, **self.get_bulk_create_kwargs()))
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+
+        if instances:
+            with transaction.atomic():
+                model.objects.bulk_create(instances)
+                counters.record_created(instances)
+                self.perform_bulk_create(instances)
+                # bulk_create() sends no post_save, so invalidate by hand
+                invalidate_user(self.request.user.pk)
+
+        data = {
+            'created': serializer_class(instances, many=True, context=context).data,
+            'errors': errors,
+        }
+        return Response(data, status=self.bulk_status(instances, errors, status.HTTP_201_CREATED))
+
+    def bulk_update(self, request):
+        items = self.get_bulk_items(request)
+        context = self.get_bulk_context(items)
+        serializer_class = self.get_serializer_class()
+        model = serializer_class.Meta.model
+
+        ids = [to_pk(model, item.get('id')) if isinstance(item, dict) else None for item in items]
+        existing = self.get_queryset().in_bulk([pk for pk in ids if pk is not None])
+
+        instances, fields, errors = [], set(), []
+        for index, (item, pk) in enumerate(zip(items, ids)):
+            instance = existing.get(pk)
+            if instance is None:
+                errors.append({'index': index, 'errors': {'id': ['Not found.']}})
+                continue
+            serializer = serializer_class(instance, data=item, partial=True, context=context)
+            if not serializer.is_valid():
+                errors.append({'index': index, 'errors': serializer.errors})
+                continue
+            for attr, value in serializer.validated_data.items():
+                setattr(instance, attr, value)
+                fields.add(attr)
+            instances.append(instance)
+
+        if instances:
+            # bulk_update() skips save(), so stamp auto_now fields ourselves
+            now = timezone.now()
+            for field in model._meta.concrete_fields:
+                if getattr(field, 'auto_now', False):
+                    for instance in instances:
+                        setattr(instance, field.attname, now)
+                    fields.add(field.name)
+            with transaction.atomic():
+                if fields:
+                    model.objects.bulk_update(instances, sorted(fields))
+                    counters.record_updated(instances)
+                self.perform_bulk_update(instances)
+                invalidate_user(self.request.user.pk)
+
+        data = {
+            'updated': serializer_class(instances, many=True, context=context).data,
+            'errors': errors,
+        }
+        return Response(data, status=self.bulk_status(instances, errors, status.HTTP_200_OK))
+
+    def get_bulk_create_kwargs(self):
+        """Extra model attributes set on every bulk-created instance"""
+        return {}
+
+    def perform_bulk_create(self, instances):
+        pass
+
+    def perform_bulk_update(self, instances):
+        pass
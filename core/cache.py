@@ -0,0 +1,152 @@
+"""
+Per-farmer response cache on top of Django's cache framework.
+
+Entries are keyed by user, endpoint, query string and the user's current
+cache version. Writes bump the version (see core.signals), which orphans
+every cached response for that farmer at once; orphans simply expire.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+CACHED_ENDPOINTS = []
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f'hg:resp:version:{user_id}'
+
+
+def get_version(user_id):
+    return get_cache().get_or_set(_version_key(user_id), 1, timeout=None)
+
+
+def _bump(user_id):
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), 2, timeout=None)
+
+
+def invalidate_user(user_id):
+    """
+    Drop every cached response for a farmer. The version is bumped now, for
+    readers in this transaction, and again on commit, so a request that
+    read the old rows just before the commit cannot repopulate the new key.
+    """
+    if user_id is None:
+        return
+    _bump(user_id)
+    transaction.on_commit(lambda: _bump(user_id))
+
+
+def _count(endpoint, outcome):
+    cache = get_cache()
+    key = f'hg:resp:metrics:{endpoint}:{outcome}'
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_metrics():
+    """Hit/miss counters per cached endpoint, shared across workers via the cache"""
+    cache = get_cache()
+    keys = [f'hg:resp:metrics:{endpoint}:{outcome}'
+            for endpoint in CACHED_ENDPOINTS for outcome in ('hit', 'miss')]
+    values = cache.get_many(keys)
+    metrics = {}
+    for endpoint in CACHED_ENDPOINTS:
+        hits = values.get(f'hg:resp:metrics:{endpoint}:hit', 0)
+        misses = values.get(f'hg:resp:metrics:{endpoint}:miss', 0)
+        total = hits + misses
+        metrics[endpoint] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total * 100, 2) if total else 0,
+        }
+    return metrics
+
+
+def _lookup(endpoint, view, request):
+    """(cache key, cached data or None) for the request, counting the hit or miss"""
+    user_id = request.user.pk
+    # the same path may be negotiated to JSON or MessagePack, whose data differ
+    parts = [request.get_full_path(), getattr(request, 'accepted_media_type', '') or '']
+    # and whatever else the view's ETag depends on (e.g. embedded weather) keys it too
+    get_extra_parts = getattr(view, 'get_validator_parts', None)
+    if get_extra_parts is not None:
+        parts.extend(get_extra_parts())
+    variant = '|'.join(parts)
+    path = hashlib.md5(variant.encode(), usedforsecurity=False).hexdigest()
+    key = f'hg:resp:{user_id}:{get_version(user_id)}:{endpoint}:{path}'
+    data = get_cache().get(key)
+    _count(endpoint, 'miss' if data is None else 'hit')
+    return key, data
+
+
+def _hit(data):
+    response = Response(data)
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+def _store(key, response, timeout):
+    if isinstance(response, Response) and response.status_code == 200:
+        get_cache().set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT if timeout is None else timeout)
+        response['X-Cache'] = 'MISS'
+    return response
+
+
+def _bypasses_cache(view, request):
+    return (not settings.RESPONSE_CACHE_ENABLED or request.method != 'GET'
+            or getattr(view, 'swagger_fake_view', False))
+
+
+def cached_response(timeout=None):
+    """
+    Serve a GET view's data from the farmer's response cache. Only 200
+    DRF Responses are stored (streamed exports pass straight through), and
+    the X-Cache header reports HIT or MISS. Works on async view methods,
+    whose cache calls run off the event loop.
+    """
+    def decorator(view_method):
+        endpoint = view_method.__qualname__
+        if iscoroutinefunction(view_method):
+            # async twins (CropBatchViewSet.aactive) share their sync view's entries and counters
+            owner, _, name = endpoint.rpartition('.')
+            endpoint = f'{owner}.{name[1:]}'
+
+            @wraps(view_method)
+            async def async_wrapper(self, request, *args, **kwargs):
+                if _bypasses_cache(self, request):
+                    return await view_method(self, request, *args, **kwargs)
+                key, data = await sync_to_async(_lookup)(endpoint, self, request)
+                if data is not None:
+                    return _hit(data)
+                response = await view_method(self, request, *args, **kwargs)
+                return await sync_to_async(_store)(key, response, timeout)
+            return async_wrapper
+
+        CACHED_ENDPOINTS.append(endpoint)
+
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if _bypasses_cache(self, request):
+                return view_method(self, request, *args, **kwargs)
+            key, data = _lookup(endpoint, self, request)
+            if data is not None:
+                return _hit(data)
+            return _store(key, view_method(self, request, *args, **kwargs), timeout)
+        return wrapper
+    return decorator
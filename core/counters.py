@@ -0,0 +1,175 @@
+"""
+Denormalized counters kept on CropBatch and User.
+
+Each counted model contributes (parent pk, {counter: amount}) to its
+parent. A write turns the row's contribution before and after into
+deltas, which are applied with F() expressions in a single UPDATE, so
+concurrent writers never lose increments. Single-row saves reach here
+through core.signals (inside the model's atomic save), bulk writes through
+BulkWriteMixin. QuerySet.update() and raw SQL bypass both; run the
+recompute_counters command to repair any drift.
+"""
+from collections import defaultdict
+
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .authentication import forget_authenticated_user
+from .models import User, CropBatch, LossEvent, Intervention
+
+
+def _loss_event(event):
+    return event.batch_id, {'loss_event_count': 1, 'total_loss_kg': event.estimated_loss_kg or 0.0}
+
+
+def _intervention(intervention):
+    return intervention.batch_id, {'intervention_count': 1,
+                                   'successful_intervention_count': int(bool(intervention.success))}
+
+
+def _crop_batch(batch):
+    return batch.farmer_id, {'batch_count': 1}
+
+
+# counted model -> (parent model, attributes read, contribution function)
+COUNTED_MODELS = {
+    LossEvent: (CropBatch, ('batch_id', 'estimated_loss_kg'), _loss_event),
+    Intervention: (CropBatch, ('batch_id', 'success'), _intervention),
+    CropBatch: (User, ('farmer_id',), _crop_batch),
+}
+
+
+def contribution(instance):
+    return COUNTED_MODELS[type(instance)][2](instance)
+
+
+def remember(instance):
+    """Snapshot what the row counts towards, to diff against on its next write"""
+    attnames = COUNTED_MODELS[type(instance)][1]
+    # rows loaded with .only()/.defer() are skipped rather than refetched
+    if all(attname in instance.__dict__ for attname in attnames):
+        instance._counted = contribution(instance)
+
+
+def load_snapshot(instance):
+    """Read the stored contribution of a row that was not snapshotted on load"""
+    model = type(instance)
+    attnames = COUNTED_MODELS[model][1]
+    values = model._base_manager.filter(pk=instance.pk).values_list(*attnames).first()
+    if values is None:
+        return None
+    stored = model(pk=instance.pk, **dict(zip(attnames, values)))
+    return contribution(stored)
+
+
+def apply_deltas(model, deltas):
+    """
+    Apply {pk: {field: amount}} to `model` in one UPDATE, as
+    field = field + CASE pk WHEN ... END for every touched field.
+    """
+    deltas = {pk: amounts for pk, amounts in deltas.items()
+              if pk is not None and any(amounts.values())}
+    if not deltas:
+        return
+    updates = {}
+    for name in {name for amounts in deltas.values() for name in amounts}:
+        field = model._meta.get_field(name)
+        whens = [When(pk=pk, then=Value(amounts[name], output_field=field))
+                 for pk, amounts in deltas.items() if amounts.get(name)]
+        updates[name] = F(name) + Case(*whens, default=Value(0, output_field=field), output_field=field)
+    if model is CropBatch:
+        # serialized batches carry the counters; ETags and sync deltas key on updated_at
+        updates['updated_at'] = timezone.now()
+    model.objects.filter(pk__in=deltas).update(**updates)
+    if model is User:
+        # users held by the auth cache carry batch_count
+        for pk in deltas:
+            forget_authenticated_user(pk)
+
+
+def record_changes(model, changes):
+    """
+    changes: iterable of (before, after) contributions of `model` rows,
+    None for a created (before) or deleted (after) row.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for before, after in changes:
+        if before is not None:
+            parent_id, amounts = before
+            for name, amount in amounts.items():
+                deltas[parent_id][name] -= amount
+        if after is not None:
+            parent_id, amounts = after
+            for name, amount in amounts.items():
+                deltas[parent_id][name] += amount
+    apply_deltas(COUNTED_MODELS[model][0], deltas)
+
+
+def record_created(instances):
+    if instances:
+        record_changes(type(instances[0]), [(None, contribution(instance)) for instance in instances])
+        for instance in instances:
+            remember(instance)
+
+
+def record_updated(instances):
+    """Instances must have been loaded from the database before being modified"""
+    if instances:
+        record_changes(type(instances[0]),
+                       [(getattr(instance, '_counted', None), contribution(instance)) for instance in instances])
+        for instance in instances:
+            remember(instance)
+
+
+def record_deleted(instances):
+    if instances:
+        record_changes(type(instances[0]),
+                       [(getattr(instance, '_counted', None) or contribution(instance), None)
+                        for instance in instances])
+
+
+def recompute_batch_counters(batch_ids):
+    """Recount the given batches from their rows; returns how many were off"""
+    loss_events = LossEvent.objects.filter(batch=OuterRef('pk')).order_by().values('batch')
+    interventions = Intervention.objects.filter(batch=OuterRef('pk')).order_by().values('batch')
+    expected = {
+        'loss_event_count': Coalesce(Subquery(loss_events.annotate(n=Count('pk')).values('n')), 0),
+        'total_loss_kg': Coalesce(Subquery(loss_events.annotate(n=Sum('estimated_loss_kg')).values('n')), 0.0),
+        'intervention_count': Coalesce(Subquery(interventions.annotate(n=Count('pk')).values('n')), 0),
+        'successful_intervention_count': Coalesce(
+            Subquery(interventions.annotate(n=Count('pk', filter=Q(success=True))).values('n')), 0),
+    }
+    return _repair(CropBatch.objects.filter(pk__in=batch_ids), expected)
+
+
+def recompute_user_counters(user_ids):
+    """Recount the given users' batches; returns how many were off"""
+    batches = CropBatch.objects.filter(farmer=OuterRef('pk')).order_by().values('farmer')
+    expected = {'batch_count': Coalesce(Subquery(batches.annotate(n=Count('pk')).values('n')), 0)}
+    return _repair(User.objects.filter(pk__in=user_ids), expected)
+
+
+def _repair(queryset, expected):
+    drifted = Q()
+    for name in expected:
+        # floats are compared with a tolerance so rounding noise is not "drift"
+        if name == 'total_loss_kg':
+            drifted |= Q(**{f'{name}__gt': F(f'_expected_{name}') + 0.001})
+            drifted |= Q(**{f'{name}__lt': F(f'_expected_{name}') - 0.001})
+        else:
+            drifted |= ~Q(**{name: F(f'_expected_{name}')})
+    stale = list(
+        queryset.annotate(**{f'_expected_{name}': value for name, value in expected.items()})
+        .filter(drifted)
+        .values_list('pk', flat=True)
+    )
+    if stale:
+        updates = dict(expected)
+        if queryset.model is CropBatch:
+            updates['updated_at'] = timezone.now()
+        queryset.model.objects.filter(pk__in=stale).update(**updates)
+        if queryset.model is User:
+            for pk in stale:
+                forget_authenticated_user(pk)
+    return len(stale)
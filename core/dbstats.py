@@ -0,0 +1,49 @@
+"""
+Connection counters for this process (GET /api/db-stats/).
+
+`connects` counts the times Django set up a connection: a fresh connect in
+the close and persistent modes, a checkout in pool mode. Next to `requests`,
+it shows how often connections are reused. In pool mode the psycopg pool's
+own counters are added, where connections_num counts real connects.
+"""
+import threading
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_lock = threading.Lock()
+_counts = {'requests': 0, 'connects': 0}
+
+
+def _bump(name):
+    with _lock:
+        _counts[name] += 1
+
+
+@receiver(request_started)
+def _count_request(**kwargs):
+    _bump('requests')
+
+
+@receiver(connection_created)
+def _count_connect(connection, **kwargs):
+    if connection.alias == DEFAULT_DB_ALIAS:
+        _bump('connects')
+
+
+def get_connection_stats():
+    connection = connections[DEFAULT_DB_ALIAS]
+    pool = getattr(connection, 'pool', None)
+    with _lock:
+        counts = dict(_counts)
+    return {
+        'mode': settings.DB_CONNECTION_MODE,
+        'vendor': connection.vendor,
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+        'health_checks': connection.settings_dict['CONN_HEALTH_CHECKS'],
+        **counts,
+        'pool': pool.get_stats() if pool is not None else None,
+    }
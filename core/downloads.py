@@ -0,0 +1,66 @@
+import os
+import re
+
+from django.http import FileResponse, HttpResponse
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range ``Range: bytes=...`` header into (start, end).
+    Returns None when the header is absent, invalid (``bytes=5-3``) or not
+    one we handle, and the caller then sends the whole file, as RFC 9110
+    asks. Raises ValueError when a valid range is unsatisfiable.
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        return None
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def _read_range(handle, start, length, block_size=64 * 1024):
+    with handle:
+        handle.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = handle.read(min(block_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def ranged_file_response(request, path, content_type, filename):
+    """Serve a local file, honouring a single byte range for resumable downloads"""
+    size = os.path.getsize(path)
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type,
+                                as_attachment=True, filename=filename)
+    else:
+        start, end = byte_range
+        response = FileResponse(_read_range(open(path, 'rb'), start, end - start + 1),
+                                status=206, content_type=content_type,
+                                as_attachment=True, filename=filename)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
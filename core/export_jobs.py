@@ -0,0 +1,116 @@
+"""
+Worker side of ExportJob: writes a dataset to a gzip file in keyset-ordered
+chunks so a crashed job can pick up from the last committed primary key.
+"""
+import csv
+import gzip
+import io
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from .exports import BATCH_FIELDS, LOSS_EVENT_FIELDS, INTERVENTION_FIELDS, ndjson_line
+from .models import CropBatch, LossEvent, Intervention, ExportJob
+
+# dataset -> (model, farmer lookup, exported fields)
+DATASETS = {
+    'BATCHES': (CropBatch, 'farmer', ['id', 'farmer_id', *BATCH_FIELDS[1:]]),
+    'LOSS_EVENTS': (LossEvent, 'batch__farmer', LOSS_EVENT_FIELDS),
+    'INTERVENTIONS': (Intervention, 'batch__farmer', INTERVENTION_FIELDS),
+}
+
+
+def job_queryset(job):
+    model, farmer_lookup, fields = DATASETS[job.dataset]
+    queryset = model.objects.all()
+    if not job.all_farmers:
+        queryset = queryset.filter(**{farmer_lookup: job.requested_by_id})
+    return queryset.order_by('pk')
+
+
+def encode_chunk(job, rows, fields, header=False):
+    """Render a chunk of value tuples as CSV or NDJSON bytes"""
+    if job.format == 'NDJSON':
+        return ''.join(ndjson_line(dict(zip(fields, row))) for row in rows).encode()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(fields)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def claim_job(job):
+    """
+    Atomically move a PENDING job, or a RUNNING job whose worker went quiet,
+    to RUNNING. Returns False if another worker got there first.
+    """
+    stale_before = timezone.now() - settings.EXPORT_JOB_STALE_AFTER
+    claimable = Q(status='PENDING') | Q(status='RUNNING', updated_at__lt=stale_before)
+    claimed = ExportJob.objects.filter(claimable, pk=job.pk).update(
+        status='RUNNING', updated_at=timezone.now()
+    )
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+def run_export_job(job, chunk_size=None):
+    """
+    Write the job's rows after job.last_pk to its file, one gzip member per
+    chunk. Progress is saved after every chunk is flushed to disk, so on a
+    crash the file is cut back to the last recorded size and the job resumes
+    from last_pk without duplicating or losing rows.
+    """
+    chunk_size = chunk_size or settings.EXPORT_JOB_CHUNK_SIZE
+    _, _, fields = DATASETS[job.dataset]
+    queryset = job_queryset(job)
+
+    if not job.file:
+        extension = 'ndjson' if job.format == 'NDJSON' else 'csv'
+        job.file.name = f'exports/{job.id}.{extension}.gz'
+        job.total_rows = queryset.count()
+        job.save(update_fields=['file', 'total_rows', 'updated_at'])
+
+    path = default_storage.path(job.file.name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    try:
+        with open(path, 'ab') as handle:
+            handle.truncate(job.bytes_written)
+            handle.seek(job.bytes_written)
+            while True:
+                chunk_qs = queryset
+                if job.last_pk:
+                    chunk_qs = chunk_qs.filter(pk__gt=job.last_pk)
+                rows = list(chunk_qs.values_list(*fields)[:chunk_size])
+                if not rows and job.bytes_written:
+                    break
+
+                # the first member always goes out, so even an empty export
+                # produces a valid gzip file (with the CSV header)
+                data = encode_chunk(job, rows, fields, header=job.bytes_written == 0)
+                handle.write(gzip.compress(data, mtime=0))
+                handle.flush()
+                os.fsync(handle.fileno())
+
+                if rows:
+                    job.last_pk = rows[-1][0]
+                job.rows_written += len(rows)
+                job.bytes_written = handle.tell()
+                job.save(update_fields=['last_pk', 'rows_written', 'bytes_written', 'updated_at'])
+                if len(rows) < chunk_size:
+                    break
+    except Exception as exc:
+        job.status = 'FAILED'
+        job.error = str(exc)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        raise
+
+    job.status = 'COMPLETED'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at', 'updated_at'])
+    return job
@@ -0,0 +1,161 @@
+"""Streaming export of crop batch data as CSV or NDJSON"""
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from rest_framework import serializers
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import LossEvent, Intervention
+
+EXPORT_CHUNK_SIZE = 2000
+# lines handed across the thread boundary per step when streaming under ASGI
+ASYNC_BLOCK_LINES = 500
+
+BATCH_FIELDS = ['id', 'crop_type', 'estimated_weight', 'harvest_date',
+                'storage_location', 'storage_type', 'status', 'notes',
+                'created_at', 'updated_at', 'loss_event_count', 'total_loss_kg',
+                'intervention_count', 'successful_intervention_count']
+LOSS_EVENT_FIELDS = ['id', 'batch_id', 'event_date', 'loss_type', 'estimated_loss_kg', 'description']
+INTERVENTION_FIELDS = ['id', 'batch_id', 'intervention_type', 'applied_date', 'success', 'notes']
+
+# ?include= name -> (model, exported fields)
+INCLUDES = {
+    'loss_events': (LossEvent, LOSS_EVENT_FIELDS),
+    'interventions': (Intervention, INTERVENTION_FIELDS),
+}
+
+CSV_BATCH_COLUMNS = [
+    ('Crop Type', 'crop_type'),
+    ('Weight (kg)', 'estimated_weight'),
+    ('Harvest Date', 'harvest_date'),
+    ('Storage Location', 'storage_location'),
+    ('Storage Type', 'storage_type'),
+    ('Status', 'status'),
+    ('Created At', 'created_at'),
+]
+CSV_INCLUDE_COLUMNS = {
+    'loss_events': [
+        ('Loss Event Date', 'event_date'),
+        ('Loss Type', 'loss_type'),
+        ('Loss (kg)', 'estimated_loss_kg'),
+        ('Loss Description', 'description'),
+    ],
+    'interventions': [
+        ('Intervention Type', 'intervention_type'),
+        ('Applied Date', 'applied_date'),
+        ('Intervention Success', 'success'),
+        ('Intervention Notes', 'notes'),
+    ],
+}
+
+
+def parse_includes(value):
+    """Split ?include=loss_events,interventions, rejecting unknown names"""
+    includes = [name.strip() for name in (value or '').split(',') if name.strip()]
+    unknown = [name for name in includes if name not in INCLUDES]
+    if unknown:
+        raise ValueError(f"Unknown include(s): {', '.join(unknown)}. "
+                         f"Choose from: {', '.join(INCLUDES)}.")
+    return list(dict.fromkeys(includes))
+
+
+def iter_batches(batches, includes=(), chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield batch rows as dicts, each with the requested related rows attached.
+    Batches are read through a server-side cursor and related rows are fetched
+    once per chunk of batches, so memory is bounded by chunk_size and the
+    query count grows with rows / chunk_size rather than with rows.
+    """
+    rows = batches.values_list(*BATCH_FIELDS).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = [dict(zip(BATCH_FIELDS, row)) for row in islice(rows, chunk_size)]
+        if not chunk:
+            return
+        for name in includes:
+            model, fields = INCLUDES[name]
+            related = {batch['id']: [] for batch in chunk}
+            for row in model.objects.filter(batch_id__in=list(related)).values_list(*fields):
+                item = dict(zip(fields, row))
+                related[item['batch_id']].append(item)
+            for batch in chunk:
+                batch[name] = related[batch['id']]
+        yield from chunk
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+    def write(self, value):
+        return value
+
+
+def stream_csv(batches, includes=(), chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield CSV lines. With includes, each batch is repeated once per related
+    row (loss events and interventions on separate rows) so the file stays
+    rectangular for spreadsheets.
+    """
+    writer = csv.writer(_Echo())
+    header = [title for title, _ in CSV_BATCH_COLUMNS]
+    if includes:
+        header.insert(0, 'Batch ID')
+    for name in includes:
+        header.extend(title for title, _ in CSV_INCLUDE_COLUMNS[name])
+    yield writer.writerow(header)
+
+    for batch in iter_batches(batches, includes, chunk_size):
+        prefix = [batch[field] for _, field in CSV_BATCH_COLUMNS]
+        if not includes:
+            yield writer.writerow(prefix)
+            continue
+
+        prefix.insert(0, batch['id'])
+        wrote_child = False
+        for position, name in enumerate(includes):
+            before = sum(len(CSV_INCLUDE_COLUMNS[other]) for other in includes[:position])
+            after = sum(len(CSV_INCLUDE_COLUMNS[other]) for other in includes[position + 1:])
+            for item in batch[name]:
+                values = [item[field] for _, field in CSV_INCLUDE_COLUMNS[name]]
+                yield writer.writerow(prefix + [''] * before + values + [''] * after)
+                wrote_child = True
+        if not wrote_child:
+            yield writer.writerow(prefix)
+
+
+# datetimes go out as serializers render them: local time, DATETIME_FORMAT, microseconds
+_DATETIME_FIELD = serializers.DateTimeField()
+
+
+def _format_datetimes(row):
+    for key, value in row.items():
+        if isinstance(value, datetime):
+            row[key] = _DATETIME_FIELD.to_representation(value)
+    return row
+
+
+def ndjson_line(row):
+    """Encode one row dict the way DRF would render it, plus a newline"""
+    return json.dumps(_format_datetimes(row), cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+
+def stream_ndjson(batches, includes=(), chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield one JSON document per batch, formatted like CropBatchSerializer"""
+    for batch in iter_batches(batches, includes, chunk_size):
+        for name in includes:
+            for item in batch[name]:
+                item['batch'] = item.pop('batch_id')
+        yield ndjson_line(batch)
+
+
+async def aiter_blocks(lines, block_lines=ASYNC_BLOCK_LINES):
+    """
+    Serve a sync line generator to an ASGI response. Django would read a
+    sync iterator to the end before sending anything; this pulls
+    block_lines at a time on the sync thread (where the generator's
+    server-side cursor lives) and yields each block as it is ready.
+    """
+    next_block = sync_to_async(lambda: ''.join(islice(lines, block_lines)))
+    while block := await next_block():
+        yield block
@@ -0,0 +1,227 @@
+"""
+Bulk onboarding of farmers from CSV or JSON Lines files.
+
+Registering through UserSerializer costs a round of username-collision
+queries and one password hash per farmer, one farmer at a time. Here the
+whole file is validated first:
+
+- passwords go through AUTH_PASSWORD_VALIDATORS, as at signup;
+- emails and phone numbers are checked against the table in bulk;
+- supplied usernames must be free; the ones derived from emails are
+  allocated from a few prefix queries;
+- passwords are hashed across an executor, a process pool from the command;
+- the survivors are inserted with bulk_create.
+
+Each rejected row is reported with its line number and field errors.
+"""
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import User
+
+INSERT_BATCH_SIZE = 1000
+# Values per IN (...) lookup and startswith terms per OR, kept well inside SQLite's limits
+LOOKUP_CHUNK_SIZE = 500
+PREFIX_CHUNK_SIZE = 200
+
+LANGUAGES = {code for code, _ in User.LANGUAGE_CHOICES}
+USERNAME_MAX_LENGTH = User._meta.get_field('username').max_length
+PHONE_MAX_LENGTH = User._meta.get_field('phone_number').max_length
+
+
+@dataclass
+class FarmerImportResult:
+    read: int = 0
+    created: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def add_error(self, line, errors):
+        self.errors.append({'line': line, 'errors': errors})
+
+
+def hash_password(password):
+    """make_password for one plain-text password; runs in a pool worker"""
+    return make_password(password)
+
+
+def _chunks(items, size):
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def clean_row(record):
+    """Validate a raw record into User field values; raises ValidationError with a field dict"""
+    if not isinstance(record, dict):
+        raise ValidationError({'non_field_errors': [str(record) if isinstance(record, Exception)
+                                                    else "Expected an object"]})
+    errors = {}
+    email = User.objects.normalize_email(str(record.get('email') or '').strip())
+    try:
+        validate_email(email)
+    except ValidationError as exc:
+        errors['email'] = exc.messages if email else ["This field is required."]
+    phone = str(record.get('phone_number') or '').strip()
+    if not phone:
+        errors['phone_number'] = ["This field is required."]
+    elif len(phone) > PHONE_MAX_LENGTH:
+        errors['phone_number'] = [f"Ensure this field has no more than {PHONE_MAX_LENGTH} characters."]
+    language = str(record.get('preferred_language') or 'BN').strip().upper()
+    if language not in LANGUAGES:
+        errors['preferred_language'] = [f'"{language}" is not a valid choice.']
+    username = str(record.get('username') or '').strip()[:USERNAME_MAX_LENGTH]
+    first_name = str(record.get('first_name') or '').strip()[:150]
+    last_name = str(record.get('last_name') or '').strip()[:150]
+    password = record.get('password')
+    password = None if password in (None, '') else str(password)
+    if password is not None:
+        # the validators signup runs, the similarity check included
+        try:
+            validate_password(password, User(email=email, username=username, first_name=first_name,
+                                              last_name=last_name, phone_number=phone))
+        except ValidationError as exc:
+            errors['password'] = exc.messages
+    if errors:
+        raise ValidationError(errors)
+    return {
+        'email': email,
+        'phone_number': phone,
+        'first_name': first_name,
+        'last_name': last_name,
+        'preferred_language': language,
+        # blank: derived from the email by import_farmers()
+        'username': username,
+        'password': password,
+    }
+
+
+def existing_values(field_name, values):
+    """The subset of `values` already taken in `field_name`"""
+    taken = set()
+    for chunk in _chunks(sorted(values), LOOKUP_CHUNK_SIZE):
+        taken.update(User.objects.filter(**{f'{field_name}__in': chunk}).values_list(field_name, flat=True))
+    return taken
+
+
+def allocate_usernames(bases, reserved=()):
+    """
+    Unique usernames for `bases`, suffixed base, base1, base2, ... like
+    UserSerializer.create, from one startswith query per PREFIX_CHUNK_SIZE
+    distinct bases instead of one exists() per candidate. Names in
+    `reserved` are avoided as well.
+    """
+    taken = set(reserved)
+    for chunk in _chunks(sorted(set(bases)), PREFIX_CHUNK_SIZE):
+        prefixes = Q()
+        for base in chunk:
+            prefixes |= Q(username__startswith=base)
+        taken.update(User.objects.filter(prefixes).values_list('username', flat=True))
+
+    usernames = []
+    for base in bases:
+        username, counter = base, 1
+        while username in taken:
+            username = f"{base}{counter}"
+            counter += 1
+        taken.add(username)
+        usernames.append(username)
+    return usernames
+
+
+def _insert(users, result):
+    """bulk_create `users` ([(line, User)]), falling back to row by row if a concurrent signup collides"""
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create([user for _, user in users])
+    except IntegrityError:
+        for line, user in users:
+            try:
+                with transaction.atomic():
+                    user.save(force_insert=True)
+            except IntegrityError:
+                result.add_error(line, {'non_field_errors': ["A user with this email, phone number or "
+                                                             "username was registered meanwhile."]})
+                continue
+            result.created.append({'line': line, 'id': str(user.id), 'username': user.username})
+        return
+    result.created.extend({'line': line, 'id': str(user.id), 'username': user.username} for line, user in users)
+
+
+def import_farmers(records, executor=None, batch_size=INSERT_BATCH_SIZE):
+    """
+    Create farmers from (line number, record) pairs, as yielded by
+    record_files.read_records. Passwords are hashed with executor.map
+    when an executor is given. Returns FarmerImportResult.
+    """
+    result = FarmerImportResult()
+    started = time.monotonic()
+
+    rows = []
+    seen_emails, seen_phones, seen_usernames = {}, {}, {}
+    for line, record in records:
+        result.read += 1
+        try:
+            row = clean_row(record)
+        except ValidationError as exc:
+            result.add_error(line, exc.message_dict)
+            continue
+        errors = {}
+        if row['email'] in seen_emails:
+            errors['email'] = [f"Duplicate of line {seen_emails[row['email']]}."]
+        if row['phone_number'] in seen_phones:
+            errors['phone_number'] = [f"Duplicate of line {seen_phones[row['phone_number']]}."]
+        if row['username'] in seen_usernames:
+            errors['username'] = [f"Duplicate of line {seen_usernames[row['username']]}."]
+        if errors:
+            result.add_error(line, errors)
+            continue
+        seen_emails[row['email']] = seen_phones[row['phone_number']] = line
+        if row['username']:
+            seen_usernames[row['username']] = line
+        rows.append((line, row))
+
+    taken_emails = existing_values('email', seen_emails)
+    taken_phones = existing_values('phone_number', seen_phones)
+    taken_usernames = existing_values('username', seen_usernames)
+    valid = []
+    for line, row in rows:
+        errors = {}
+        if row['email'] in taken_emails:
+            errors['email'] = ["user with this email already exists."]
+        if row['phone_number'] in taken_phones:
+            errors['phone_number'] = ["user with this phone number already exists."]
+        if row['username'] in taken_usernames:
+            errors['username'] = ["A user with that username already exists."]
+        if errors:
+            result.add_error(line, errors)
+        else:
+            valid.append((line, row))
+
+    # only usernames derived from the email are suffixed; supplied ones were checked above
+    derived = iter(allocate_usernames(
+        [row['email'].split('@')[0][:USERNAME_MAX_LENGTH - 6] for _, row in valid if not row['username']],
+        reserved={row['username'] for _, row in valid if row['username']},
+    ))
+    usernames = [row['username'] or next(derived) for _, row in valid]
+    passwords = [row.pop('password') for _, row in valid]
+    hashed = list(executor.map(hash_password, passwords, chunksize=16) if executor
+                  else map(hash_password, passwords))
+
+    users = [(line, User(**{**row, 'username': username}, password=password))
+             for (line, row), username, password in zip(valid, usernames, hashed)]
+    for chunk in _chunks(users, batch_size):
+        _insert(chunk, result)
+
+    result.errors.sort(key=lambda error: error['line'])
+    result.elapsed = time.monotonic() - started
+    return result
+
@@ -0,0 +1,97 @@
+"""
+Sparse fieldsets: ?fields=id,status,harvest_date and ?exclude=notes.
+
+On GET requests the serializer drops the fields that were not asked for, and
+the queryset selects only the columns behind the remaining ones. Pruning the
+output and the SELECT together shrinks both the payload and the rows read.
+Fields not backed by a column (properties, method fields) still work, but
+then the queryset keeps all its columns.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+
+UNSET = object()
+
+
+def parse_field_list(value):
+    return list(dict.fromkeys(name.strip() for name in (value or '').split(',') if name.strip()))
+
+
+def model_columns(model, serializer, names):
+    """Model field names behind the serializer fields `names`, or None if one is not a plain column"""
+    columns = []
+    for name in names:
+        try:
+            model_field = model._meta.get_field(serializer.fields[name].source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete:
+            return None
+        columns.append(model_field.name)
+    return columns
+
+
+class SparseFieldsMixin:
+    """?fields= / ?exclude= for a viewset's GET responses"""
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+
+    def get_sparse_fields(self):
+        """
+        Names of the readable fields the client asked for, in serializer
+        order, or None when the full representation was asked for.
+        """
+        cached = getattr(self, '_sparse_fields', UNSET)
+        if cached is not UNSET:
+            return cached
+        self._sparse_fields = None
+        request = getattr(self, 'request', None)
+        if request is None or request.method != 'GET' or getattr(self, 'swagger_fake_view', False):
+            return None
+        requested = parse_field_list(request.query_params.get(self.fields_query_param))
+        excluded = parse_field_list(request.query_params.get(self.exclude_query_param))
+        if not requested and not excluded:
+            return None
+
+        readable = [name for name, field in self.get_serializer_class()().fields.items() if not field.write_only]
+        errors = {}
+        for param, names in ((self.fields_query_param, requested), (self.exclude_query_param, excluded)):
+            unknown = [name for name in names if name not in readable]
+            if unknown:
+                errors[param] = f"Unknown field(s): {', '.join(unknown)}. Choose from: {', '.join(readable)}."
+        if errors:
+            raise ValidationError(errors)
+        selected = [name for name in readable if (not requested or name in requested) and name not in excluded]
+        if not selected:
+            raise ValidationError({self.exclude_query_param: "At least one field must remain."})
+        self._sparse_fields = selected
+        return selected
+
+    def get_sparse_columns(self, queryset):
+        """Columns to load for the sparse fields, or None to load them all"""
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return None
+        columns = model_columns(queryset.model, self.get_serializer_class()(), fields)
+        if columns is None:
+            return None
+        # the primary key identifies rows, and keyset pagination reads its ordering column
+        extra = [queryset.model._meta.pk.name, getattr(self.paginator, 'keyset_field', None)]
+        return list(dict.fromkeys([*columns, *(name for name in extra if name)]))
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        columns = self.get_sparse_columns(queryset)
+        if columns is not None:
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            target = getattr(serializer, 'child', serializer)
+            for name in list(target.fields):
+                if name not in fields:
+                    target.fields.pop(name)
+        return serializer
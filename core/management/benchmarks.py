@@ -0,0 +1,76 @@
+"""Throwaway data, timing and request helpers for the benchmark_* commands"""
+import io
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from core.models import CropBatch, Intervention, LossEvent, User
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back"""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def make_benchmark_farmer(rows):
+    """A farmer with `rows` batches, each with one loss event and one intervention"""
+    tag = uuid.uuid4().hex[:12]
+    farmer = User.objects.create(username=f'bench-{tag}', email=f'bench-{tag}@example.com', phone_number=tag)
+    batches = CropBatch.objects.bulk_create([
+        CropBatch(farmer=farmer, estimated_weight=500 + n, harvest_date=date(2024, 1, 1) + timedelta(days=n % 365),
+                  storage_location='DHAKA', storage_type='JUTE_BAG', notes=f'batch {n}')
+        for n in range(rows)
+    ])
+    LossEvent.objects.bulk_create([
+        LossEvent(batch=batches[n], event_date=date(2024, 6, 1), loss_type='PEST',
+                  estimated_loss_kg=n % 50, description='weevils' if n % 2 else None)
+        for n in range(rows)
+    ])
+    Intervention.objects.bulk_create([
+        Intervention(batch=batches[n], intervention_type='PESTICIDE', applied_date=date(2024, 6, 2),
+                     success=n % 2 == 0)
+        for n in range(rows)
+    ])
+    return farmer
+
+
+def best_of(repeat, func):
+    """Fastest of `repeat` timed calls, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def wsgi_get(handler, path, token):
+    """GET `path` as `token`'s user through a WSGI handler; returns the status code"""
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': '127.0.0.1', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': '127.0.0.1', 'HTTP_AUTHORIZATION': f'JWT {token}',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+    }
+    statuses = []
+    result = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(result)
+    finally:
+        # fires request_finished, where Django closes or keeps the connection as under a WSGI server
+        result.close()
+    return int(statuses[0].split()[0])
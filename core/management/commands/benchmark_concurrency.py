@@ -0,0 +1,142 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import iscoroutinefunction
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import resolve
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.management.benchmarks import make_benchmark_farmer, wsgi_get
+from core.models import Achievement, CropBatch
+
+ENDPOINTS = [
+    '/api/crops/batches/',
+    '/api/crops/batches/{batch}/',
+    '/api/crops/batches/active/',
+    '/api/crops/batches/completed/',
+    '/api/crops/batches/dashboard/',
+    '/api/achievements/',
+    '/api/loss-events/',
+    '/api/interventions/',
+]
+
+
+async def asgi_get(handler, path, token):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'127.0.0.1'), (b'authorization', f'JWT {token}'.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('127.0.0.1', 80),
+    }
+    received = False
+    done = asyncio.Event()
+    statuses = []
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await handler(scope, receive, send)
+    done.set()
+    return statuses[0]
+
+
+class Command(BaseCommand):
+    help = ("Load the read endpoints with concurrent clients through Django's WSGI or ASGI handler, in "
+            "process, on throwaway rows (deleted afterwards). Under ASGI the views are async when "
+            "ASYNC_READ_VIEWS is on. The response cache is disabled so every request reaches the database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], default='asgi')
+        parser.add_argument('--clients', type=int, default=200, help="Concurrent clients")
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per endpoint")
+        parser.add_argument('--rows', type=int, default=200, help="Batches of the benchmark farmer")
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help="Milliseconds added to every query, as the round trip to a database server")
+
+    def handle(self, *args, **options):
+        if options['db_latency']:
+            latency = options['db_latency'] / 1000
+
+            def delay(execute, sql, params, many, context):
+                time.sleep(latency)
+                return execute(sql, params, many, context)
+
+            def add_delay(connection, **kwargs):
+                connection.execute_wrappers.append(delay)
+
+            connection_created.connect(add_delay, weak=False)
+        # committed rather than rolled back: the server threads read through their own connections
+        farmer = make_benchmark_farmer(options['rows'])
+        try:
+            batches = CropBatch.objects.filter(farmer=farmer)
+            batches.filter(pk__in=batches.values('pk')[:options['rows'] // 2]).update(status='COMPLETED')
+            Achievement.objects.create(user=farmer, badge_name='FIRST_HARVEST')
+            paths = [path.format(batch=batches.first().pk) for path in ENDPOINTS]
+            token = str(AccessToken.for_user(farmer))
+            with override_settings(RESPONSE_CACHE_ENABLED=False):
+                self.run(paths, token, options)
+        finally:
+            connections.close_all()
+            farmer.delete()
+
+    def run(self, paths, token, options):
+        server, clients, count = options['server'], options['clients'], options['requests']
+        views = 'async' if iscoroutinefunction(resolve(paths[0]).func) else 'sync'
+        self.stdout.write(f"{server.upper()} handler, {views} views, {clients} clients, {count} requests each, "
+                          f"{options['db_latency']:g} ms per query")
+        for path in paths:
+            if server == 'wsgi':
+                elapsed, results = self.load_wsgi(path, token, clients, count)
+            else:
+                elapsed, results = asyncio.run(self.load_asgi(path, token, clients, count))
+            latencies = sorted(latency for _, latency in results)
+            failed = sum(status != 200 for status, _ in results)
+            self.stdout.write(
+                f"  {path[:40]:<40} {count / elapsed:>8,.0f} req/s   "
+                f"p50 {latencies[len(latencies) // 2] * 1000:>7.1f} ms   "
+                f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:>7.1f} ms"
+                + (f"   {failed} failed" if failed else "")
+            )
+
+    def load_wsgi(self, path, token, clients, count):
+        handler = WSGIHandler()
+
+        def request(_):
+            started = time.perf_counter()
+            status = wsgi_get(handler, path, token)
+            return status, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(request, range(count)))
+        return time.perf_counter() - started, results
+
+    async def load_asgi(self, path, token, clients, count):
+        handler = ASGIHandler()
+        jobs = iter(range(count))
+        results = []
+
+        async def client():
+            for _ in jobs:
+                started = time.perf_counter()
+                status = await asgi_get(handler, path, token)
+                results.append((status, time.perf_counter() - started))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return time.perf_counter() - started, results
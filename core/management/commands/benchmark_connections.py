@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.dbstats import get_connection_stats
+from core.management.benchmarks import make_benchmark_farmer, wsgi_get
+
+ENDPOINTS = [
+    '/api/achievements/',
+    '/api/crops/batches/',
+]
+
+
+class Command(BaseCommand):
+    help = ("Measure request latency through Django's WSGI handler under the configured DB_CONNECTION_MODE, "
+            "on throwaway rows (deleted afterwards). Run it once per mode to compare them.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint")
+        parser.add_argument('--clients', type=int, default=1,
+                            help="Concurrent clients; 1 matches a serverless instance serving one request at a time")
+        parser.add_argument('--rows', type=int, default=50, help="Batches of the benchmark farmer")
+
+    def handle(self, *args, **options):
+        farmer = make_benchmark_farmer(options['rows'])
+        try:
+            token = str(AccessToken.for_user(farmer))
+            with override_settings(RESPONSE_CACHE_ENABLED=False):
+                self.run(token, options)
+        finally:
+            connections.close_all()
+            farmer.delete()
+
+    def run(self, token, options):
+        handler = WSGIHandler()
+        stats = get_connection_stats()
+        self.stdout.write(f"{stats['mode']} mode on {stats['vendor']}, {options['clients']} client(s), "
+                          f"{options['requests']} requests each")
+        for path in ENDPOINTS:
+            # start from no connection, like a cold process
+            connections.close_all()
+            before = get_connection_stats()
+
+            def request(_):
+                started = time.perf_counter()
+                status = wsgi_get(handler, path, token)
+                return status, time.perf_counter() - started
+
+            with ThreadPoolExecutor(max_workers=options['clients']) as pool:
+                results = list(pool.map(request, range(options['requests'])))
+            after = get_connection_stats()
+
+            latencies = sorted(latency for _, latency in results)
+            failed = sum(status != 200 for status, _ in results)
+            connects = after['connects'] - before['connects']
+            self.stdout.write(
+                f"  {path:<20} mean {sum(latencies) / len(latencies) * 1000:>6.2f} ms   "
+                f"p50 {latencies[len(latencies) // 2] * 1000:>6.2f} ms   "
+                f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:>6.2f} ms   "
+                f"{connects} connects" + (f"   {failed} failed" if failed else "")
+            )
+        if stats['pool'] is not None:
+            self.stdout.write(f"  pool: {get_connection_stats()['pool']}")
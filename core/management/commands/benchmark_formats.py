@@ -0,0 +1,51 @@
+import gzip
+import json
+
+import msgpack
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from core.management.benchmarks import best_of, make_benchmark_farmer, rolled_back
+from core.models import CropBatch
+from core.parsers import msgpack_ext_hook
+from core.reads import get_reader
+from core.renderers import MessagePackRenderer
+from core.serializers import CropBatchSerializer
+
+
+class Command(BaseCommand):
+    help = ("Compare JSON and MessagePack payload size and encode/decode time for a batch list page "
+            "and a full export, on throwaway rows (rolled back afterwards)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help="Batches in the export")
+        parser.add_argument('--page-size', type=int, default=100, help="Batches in the list page")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement; the best is reported")
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        reader = get_reader(CropBatchSerializer)
+        with rolled_back():
+            farmer = make_benchmark_farmer(options['rows'])
+            rows = list(reader.values(CropBatch.objects.filter(farmer=farmer).order_by('-created_at')))
+
+        for name, count in (('list page', options['page_size']), ('export', len(rows))):
+            # what each renderer is handed by the views: strings for JSON, native UUIDs/dates for MessagePack
+            as_json = {'count': count, 'results': reader.many(rows[:count])}
+            as_native = {'count': count, 'results': reader.many(rows[:count], native=True)}
+            json_body = JSONRenderer().render(as_json)
+            packed_body = MessagePackRenderer().render(as_native)
+            timings = {
+                'json encode': best_of(repeat, lambda: JSONRenderer().render(as_json)),
+                'json decode': best_of(repeat, lambda: json.loads(json_body)),
+                'msgpack encode': best_of(repeat, lambda: MessagePackRenderer().render(as_native)),
+                'msgpack decode': best_of(repeat, lambda: msgpack.unpackb(
+                    packed_body, ext_hook=msgpack_ext_hook, timestamp=3, raw=False)),
+            }
+            self.stdout.write(f"{name} ({count} batches)")
+            for label, body in (('json', json_body), ('msgpack', packed_body)):
+                self.stdout.write(
+                    f"  {label:<8} {len(body):>10,} bytes  {len(gzip.compress(body)):>9,} gzipped  "
+                    f"encode {timings[f'{label} encode'] * 1000:>8.2f} ms  "
+                    f"decode {timings[f'{label} decode'] * 1000:>8.2f} ms"
+                )
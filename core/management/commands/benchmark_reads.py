@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core.management.benchmarks import best_of, make_benchmark_farmer, rolled_back
+from core.models import CropBatch, Intervention, LossEvent
+from core.reads import get_reader
+from core.serializers import CropBatchSerializer, InterventionSerializer, LossEventSerializer
+
+
+class Command(BaseCommand):
+    help = ("Compare ModelSerializer and ValuesReader throughput on throwaway rows "
+            "(created in a transaction that is rolled back)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help="Rows per model")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per path; the best is reported")
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        with rolled_back():
+            farmer = make_benchmark_farmer(rows)
+            for serializer_class, queryset in [
+                (CropBatchSerializer, CropBatch.objects.filter(farmer=farmer)),
+                (LossEventSerializer, LossEvent.objects.filter(batch__farmer=farmer)),
+                (InterventionSerializer, Intervention.objects.filter(batch__farmer=farmer)),
+            ]:
+                reader = get_reader(serializer_class)
+                serializer_time = best_of(repeat, lambda: serializer_class(queryset.all(), many=True).data)
+                reader_time = best_of(repeat, lambda: reader.many(reader.values(queryset)))
+                self.stdout.write(
+                    f"{serializer_class.__name__:<24} serializer {rows / serializer_time:>9,.0f} rows/s   "
+                    f"values {rows / reader_time:>9,.0f} rows/s   {serializer_time / reader_time:.1f}x"
+                )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.revocation import compact_revoked_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete revoked refresh tokens that have expired and rebuild the in-process revocation filters"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help="Rows deleted per statement")
+
+    def handle(self, *args, **options):
+        deleted = compact_revoked_tokens(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Compacted {deleted} expired revoked tokens"))
@@ -0,0 +1,41 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from core.achievements import BADGE_RULES, award_badges
+from core.models import User, Achievement
+
+
+class Command(BaseCommand):
+    help = "Re-evaluate every badge rule for all users and award what is missing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Users evaluated per round of set-based rule queries")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = User.objects.order_by('pk').values_list('pk', flat=True)
+        last_pk, evaluated, awarded = None, 0, 0
+
+        while True:
+            chunk = users.filter(pk__gt=last_pk) if last_pk is not None else users
+            user_ids = list(chunk[:batch_size])
+            if not user_ids:
+                break
+            last_pk = user_ids[-1]
+            evaluated += len(user_ids)
+
+            held = defaultdict(set)
+            for user_id, badge in Achievement.objects.filter(user_id__in=user_ids).values_list('user_id', 'badge_name'):
+                held[badge].add(user_id)
+
+            missing = {}
+            for rule in BADGE_RULES:
+                qualified = set(rule.qualifiers(user_ids)) - held[rule.badge]
+                if qualified:
+                    missing[rule.badge] = qualified
+            award_badges(missing)
+            awarded += sum(len(user_ids) for user_ids in missing.values())
+
+        self.stdout.write(self.style.SUCCESS(f"Evaluated {evaluated} users, awarded {awarded} badges"))
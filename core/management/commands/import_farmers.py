@@ -0,0 +1,38 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from core.farmer_import import INSERT_BATCH_SIZE, import_farmers
+from core.record_files import detect_format, open_text, read_records
+
+
+class Command(BaseCommand):
+    help = "Create farmer accounts from CSV or JSON Lines files, hashing passwords in a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="CSV or JSONL files, optionally gzipped")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="File format (default: from the file extension)")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Password hashing processes (default: one per CPU)")
+        parser.add_argument('--batch-size', type=int, default=INSERT_BATCH_SIZE,
+                            help="Users inserted per statement")
+
+    def handle(self, *args, **options):
+        # workers hash with the project's PASSWORD_HASHERS, which need settings
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+            for path in options['paths']:
+                try:
+                    with open_text(path) as stream:
+                        result = import_farmers(read_records(stream, options['format'] or detect_format(path)),
+                                                executor=executor, batch_size=options['batch_size'])
+                except (OSError, ValueError) as exc:
+                    raise CommandError(f"{path}: {exc}")
+                for error in result.errors:
+                    messages = '; '.join(f"{name}: {' '.join(errors)}" for name, errors in error['errors'].items())
+                    self.stderr.write(f"{path} line {error['line']}: {messages}")
+                self.stdout.write(self.style.SUCCESS(
+                    f"{path}: read {result.read} rows, created {len(result.created)} farmers, "
+                    f"{len(result.errors)} rejected in {result.elapsed:.2f}s"
+                ))
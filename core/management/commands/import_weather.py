@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.weather_import import IMPORT_BATCH_SIZE, import_weather
+
+
+class Command(BaseCommand):
+    help = "Stream historical daily weather from CSV or JSON Lines files into WeatherData"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="CSV or JSONL files, optionally gzipped")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="File format (default: from the file extension)")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help="Rows de-duplicated and upserted per round")
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            try:
+                stats = import_weather(path, fmt=options['format'], batch_size=options['batch_size'])
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"{path}: {exc}")
+            for error in stats.errors:
+                self.stderr.write(f"{path} {error}")
+            self.stdout.write(self.style.SUCCESS(
+                f"{path}: read {stats.read} rows, upserted {stats.written}, "
+                f"{stats.duplicates} duplicates, {stats.invalid} invalid in {stats.elapsed:.2f}s "
+                f"({stats.rate:,.0f} rows/s)"
+            ))
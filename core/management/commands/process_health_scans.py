@@ -0,0 +1,42 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+from core.scans import process_scans
+
+
+class Command(BaseCommand):
+    help = "Thumbnail and classify queued health scans in a worker pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Pool size (default: one per CPU)")
+        parser.add_argument('--threads', action='store_true',
+                            help="Use a thread pool instead of worker processes")
+        parser.add_argument('--limit', type=int, default=100,
+                            help="Scans claimed per round")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling for new scans instead of exiting when the queue is empty")
+        parser.add_argument('--sleep', type=float, default=2,
+                            help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        if options['threads']:
+            executor = ThreadPoolExecutor(max_workers=options['workers'])
+        else:
+            # workers unpickle core.scans tasks, which need the app registry
+            executor = ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup)
+        with executor:
+            while True:
+                started = time.monotonic()
+                done, failed = process_scans(executor, options['limit'])
+                if done or failed:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Processed {done + failed} scans ({failed} failed) in {time.monotonic() - started:.2f}s"
+                    ))
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import recompute_batch_counters, recompute_user_counters
+from core.models import User, CropBatch
+
+
+class Command(BaseCommand):
+    help = "Recount the denormalized batch and user counters, fixing rows that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows checked per UPDATE")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, recompute in ((CropBatch, recompute_batch_counters), (User, recompute_user_counters)):
+            checked, repaired = 0, 0
+            for ids in self.chunks(model, batch_size):
+                checked += len(ids)
+                repaired += recompute(ids)
+            self.stdout.write(self.style.SUCCESS(
+                f"{model._meta.verbose_name_plural}: checked {checked}, repaired {repaired}"
+            ))
+
+    @staticmethod
+    def chunks(model, size):
+        ids = model.objects.order_by('pk').values_list('pk', flat=True)
+        last_pk = None
+        while True:
+            chunk = list((ids.filter(pk__gt=last_pk) if last_pk is not None else ids)[:size])
+            if not chunk:
+                return
+            last_pk = chunk[-1]
+            yield chunk
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.rollups import refresh_loss_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the regional loss rollups for months changed since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild every month")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        months = refresh_loss_rollups(full=options['full'])
+        elapsed = time.monotonic() - started
+        if months:
+            span = f" ({months[0]:%Y-%m} .. {months[-1]:%Y-%m})"
+        else:
+            span = ""
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed {len(months)} months{span} in {elapsed:.2f}s"
+        ))
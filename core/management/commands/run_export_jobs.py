@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from core.export_jobs import claim_job, run_export_job
+from core.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = "Process queued export jobs, resuming any whose worker died mid-run"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="Rows per gzip chunk (default: EXPORT_JOB_CHUNK_SIZE)")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling for new jobs instead of exiting when the queue is empty")
+        parser.add_argument('--sleep', type=float, default=5,
+                            help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = self.process_queue(options['chunk_size'])
+            if not options['loop']:
+                break
+            if not processed:
+                time.sleep(options['sleep'])
+
+    def process_queue(self, chunk_size):
+        stale_before = timezone.now() - settings.EXPORT_JOB_STALE_AFTER
+        candidates = ExportJob.objects.filter(
+            Q(status='PENDING') | Q(status='RUNNING', updated_at__lt=stale_before)
+        ).order_by('created_at')
+
+        processed = 0
+        for job in candidates:
+            if not claim_job(job):
+                continue
+            resumed = " (resuming)" if job.rows_written else ""
+            self.stdout.write(f"Export {job.id}: {job.dataset} as {job.format}{resumed}")
+            try:
+                run_export_job(job, chunk_size)
+            except Exception as exc:
+                self.stderr.write(self.style.ERROR(f"Export {job.id} failed: {exc}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Export {job.id}: {job.rows_written} rows, {job.bytes_written} bytes"
+                ))
+            processed += 1
+        return processed
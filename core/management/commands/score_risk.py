@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.risk import RISK_CHUNK_SIZE, score_batches
+
+
+class Command(BaseCommand):
+    help = "Score the spoilage risk of every active crop batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=RISK_CHUNK_SIZE,
+                            help="Batches scored and written per round")
+
+    def handle(self, *args, **options):
+        scored, elapsed = score_batches(chunk_size=options['chunk_size'])
+        rate = scored / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {scored} batches in {elapsed:.2f}s ({rate:,.0f} batches/s)"
+        ))
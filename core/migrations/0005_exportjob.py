@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:56
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_remove_riskprediction_batch_remove_weatherdata_batch_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('dataset', models.CharField(choices=[('BATCHES', 'Crop Batches'), ('LOSS_EVENTS', 'Loss Events'), ('INTERVENTIONS', 'Interventions')], default='BATCHES', max_length=20)),
+                ('format', models.CharField(choices=[('CSV', 'CSV'), ('NDJSON', 'NDJSON')], default='CSV', max_length=10)),
+                ('all_farmers', models.BooleanField(default=False, help_text="Export every farmer's data (staff only)")),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('file', models.FileField(blank=True, upload_to='exports/')),
+                ('last_pk', models.UUIDField(blank=True, null=True)),
+                ('bytes_written', models.BigIntegerField(default=0)),
+                ('rows_written', models.PositiveIntegerField(default=0)),
+                ('total_rows', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cropbatch',
+            index=models.Index(fields=['farmer', '-created_at', '-id'], name='cropbatch_farmer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='intervention',
+            index=models.Index(fields=['batch', '-applied_date', '-id'], name='intervention_batch_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='intervention',
+            index=models.Index(fields=['-applied_date', '-id'], name='intervention_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lossevent',
+            index=models.Index(fields=['batch', '-event_date', '-id'], name='lossevent_batch_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lossevent',
+            index=models.Index(fields=['-event_date', '-id'], name='lossevent_date_idx'),
+        ),
+    ]
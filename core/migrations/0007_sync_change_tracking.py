@@ -0,0 +1,67 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(choices=[('CropBatch', 'Crop Batch'), ('LossEvent', 'Loss Event'), ('Intervention', 'Intervention'), ('Achievement', 'Achievement')], max_length=20)),
+                ('object_id', models.UUIDField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['deleted_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='achievement',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='intervention',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='lossevent',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='achievement',
+            index=models.Index(fields=['user', 'updated_at'], name='achievement_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cropbatch',
+            index=models.Index(fields=['farmer', 'updated_at'], name='cropbatch_farmer_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='intervention',
+            index=models.Index(fields=['updated_at'], name='intervention_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lossevent',
+            index=models.Index(fields=['updated_at'], name='lossevent_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:18
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    CropBatch = apps.get_model('core', 'CropBatch')
+    LossEvent = apps.get_model('core', 'LossEvent')
+    Intervention = apps.get_model('core', 'Intervention')
+    User = apps.get_model('core', 'User')
+
+    loss_events = LossEvent.objects.filter(batch=OuterRef('pk')).order_by().values('batch')
+    interventions = Intervention.objects.filter(batch=OuterRef('pk')).order_by().values('batch')
+    CropBatch.objects.update(
+        loss_event_count=Coalesce(Subquery(loss_events.annotate(n=Count('pk')).values('n')), 0),
+        total_loss_kg=Coalesce(Subquery(loss_events.annotate(n=Sum('estimated_loss_kg')).values('n')), 0.0),
+        intervention_count=Coalesce(Subquery(interventions.annotate(n=Count('pk')).values('n')), 0),
+        successful_intervention_count=Coalesce(
+            Subquery(interventions.annotate(n=Count('pk', filter=Q(success=True))).values('n')), 0),
+    )
+    batches = CropBatch.objects.filter(farmer=OuterRef('pk')).order_by().values('farmer')
+    User.objects.update(batch_count=Coalesce(Subquery(batches.annotate(n=Count('pk')).values('n')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_sync_change_tracking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cropbatch',
+            name='intervention_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cropbatch',
+            name='loss_event_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cropbatch',
+            name='successful_intervention_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cropbatch',
+            name='total_loss_kg',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='batch_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('high_water_mark', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StaleRollupMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LossRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('division', models.CharField(choices=[('DHAKA', 'Dhaka'), ('CHITTAGONG', 'Chittagong'), ('SYLHET', 'Sylhet'), ('RAJSHAHI', 'Rajshahi'), ('KHULNA', 'Khulna'), ('BARISHAL', 'Barishal'), ('RANGPUR', 'Rangpur'), ('MYMENSINGH', 'Mymensingh')], max_length=50)),
+                ('storage_type', models.CharField(choices=[('JUTE_BAG', 'Jute Bag Stack'), ('SILO', 'Silo'), ('OPEN_AREA', 'Open Area')], max_length=20)),
+                ('loss_type', models.CharField(choices=[('PEST', 'Pest Infestation'), ('DISEASE', 'Disease'), ('WEATHER', 'Weather Damage'), ('STORAGE', 'Storage Loss'), ('OTHER', 'Other')], max_length=20)),
+                ('month', models.DateField(help_text='First day of the month of the loss events')),
+                ('loss_event_count', models.PositiveIntegerField(default=0)),
+                ('total_loss_kg', models.FloatField(default=0)),
+                ('batch_count', models.PositiveIntegerField(default=0, help_text='Distinct batches with losses')),
+                ('batch_weight_kg', models.FloatField(default=0, help_text='Estimated weight of those batches')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-month', 'division', 'storage_type', 'loss_type'],
+                'constraints': [models.UniqueConstraint(fields=('month', 'division', 'storage_type', 'loss_type'), name='lossrollup_partition_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:27
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_loss_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiskPrediction',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('risk_score', models.FloatField(default=0, help_text='Risk score 0-1')),
+                ('risk_level', models.CharField(choices=[('LOW', 'Low'), ('MEDIUM', 'Medium'), ('HIGH', 'High'), ('CRITICAL', 'Critical')], max_length=20)),
+                ('etcl_hours', models.IntegerField(help_text='Estimated Time to Critical Loss in hours')),
+                ('risk_factors', models.JSONField(default=dict, help_text='Inputs and factor scores behind the risk')),
+                ('recommendations', models.JSONField(default=list, help_text='List of recommendations')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('batch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='risk_prediction', to='core.cropbatch')),
+            ],
+            options={
+                'ordering': ['-risk_score'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WeatherData',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('location', models.CharField(choices=[('DHAKA', 'Dhaka'), ('CHITTAGONG', 'Chittagong'), ('SYLHET', 'Sylhet'), ('RAJSHAHI', 'Rajshahi'), ('KHULNA', 'Khulna'), ('BARISHAL', 'Barishal'), ('RANGPUR', 'Rangpur'), ('MYMENSINGH', 'Mymensingh')], max_length=50)),
+                ('forecast_date', models.DateField()),
+                ('temperature', models.FloatField(help_text='Temperature in Celsius')),
+                ('humidity', models.FloatField(help_text='Humidity percentage')),
+                ('rainfall_probability', models.FloatField(default=0, help_text='Rainfall probability percentage')),
+                ('wind_speed', models.FloatField(default=0, help_text='Wind speed in km/h')),
+                ('description', models.CharField(blank=True, max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['location', '-forecast_date'],
+                'constraints': [models.UniqueConstraint(fields=('location', 'forecast_date'), name='weatherdata_location_date_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:44
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_risk_scoring'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthScan',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('image', models.FileField(max_length=255, upload_to='')),
+                ('thumbnail', models.FileField(blank=True, max_length=255, upload_to='')),
+                ('content_hash', models.CharField(help_text='SHA-256 of the uploaded image', max_length=64)),
+                ('size', models.BigIntegerField(help_text='Image size in bytes')),
+                ('detection_result', models.CharField(choices=[('FRESH', 'Fresh'), ('ROTTEN', 'Rotten'), ('PENDING', 'Pending')], default='PENDING', max_length=20)),
+                ('confidence', models.FloatField(default=0, help_text='Confidence score 0-1')),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('PROCESSING', 'Processing'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='QUEUED', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='health_scans', to='core.cropbatch')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['content_hash'], name='healthscan_hash_idx'), models.Index(fields=['status', 'created_at'], name='healthscan_status_idx')],
+                'constraints': [models.UniqueConstraint(fields=('batch', 'content_hash'), name='healthscan_batch_hash_uniq')],
+            },
+        ),
+    ]
@@ -1,9 +1,33 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 import uuid
 
-class User(AbstractUser):
+
+class CountedSaveMixin:
+    """
+    Saves run in a transaction so the counter updates made by post_save
+    (core.counters via core.signals) commit or roll back with the row.
+    Counter columns listed in `counter_fields` are left out of UPDATEs:
+    they are only ever changed with F() expressions, and writing back a
+    stale in-memory value would undo concurrent increments. Deferred
+    fields (.only() / .defer()) stay out too, as in a plain save().
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (self.counter_fields and not self._state.adding and not args
+                and kwargs.get('update_fields') is None and not kwargs.get('force_insert')):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+
+class User(CountedSaveMixin, AbstractUser):
     """Custom User model for farmers"""
     LANGUAGE_CHOICES = [
         ('EN', 'English'),
@@ -19,6 +43,9 @@ class User(AbstractUser):
     preferred_language = models.CharField(max_length=2, choices=LANGUAGE_CHOICES, default='BN')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    batch_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('batch_count',)
     
     class Meta:
         verbose_name = _('User')
@@ -29,7 +56,7 @@ class User(AbstractUser):
         return f"{self.email} ({self.phone_number})"
 
 
-class CropBatch(models.Model):
+class CropBatch(CountedSaveMixin, models.Model):
     """Crop batch/harvest model"""
     CROP_TYPE_CHOICES = [
         ('PADDY', 'Paddy/Rice'),
@@ -68,9 +95,21 @@ class CropBatch(models.Model):
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    loss_event_count = models.PositiveIntegerField(default=0, editable=False)
+    total_loss_kg = models.FloatField(default=0, editable=False)
+    intervention_count = models.PositiveIntegerField(default=0, editable=False)
+    successful_intervention_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('loss_event_count', 'total_loss_kg', 'intervention_count',
+                      'successful_intervention_count')
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # backs keyset pagination of a farmer's batches
+            models.Index(fields=['farmer', '-created_at', '-id'], name='cropbatch_farmer_created_idx'),
+            models.Index(fields=['farmer', 'updated_at'], name='cropbatch_farmer_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.farmer.email} - {self.crop_type} ({self.harvest_date})"
@@ -90,15 +129,19 @@ class Achievement(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='achievements')
     badge_name = models.CharField(max_length=50, choices=BADGE_CHOICES)
     earned_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ('user', 'badge_name')
         ordering = ['-earned_at']
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='achievement_user_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.badge_name}"
 
-class LossEvent(models.Model):
+class LossEvent(CountedSaveMixin, models.Model):
     """Records any loss/damage to a crop batch"""
     LOSS_TYPE_CHOICES = [
         ('PEST', 'Pest Infestation'),
@@ -114,15 +157,21 @@ class LossEvent(models.Model):
     loss_type = models.CharField(max_length=20, choices=LOSS_TYPE_CHOICES)
     estimated_loss_kg = models.FloatField()
     description = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-event_date']
+        indexes = [
+            models.Index(fields=['updated_at'], name='lossevent_updated_idx'),
+            models.Index(fields=['batch', '-event_date', '-id'], name='lossevent_batch_date_idx'),
+            models.Index(fields=['-event_date', '-id'], name='lossevent_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.batch} - {self.loss_type} ({self.estimated_loss_kg}kg)"
 
 
-class Intervention(models.Model):
+class Intervention(CountedSaveMixin, models.Model):
     """Tracks interventions applied to mitigate losses"""
     INTERVENTION_TYPE_CHOICES = [
         ('PESTICIDE', 'Pesticide Applied'),
@@ -138,9 +187,251 @@ class Intervention(models.Model):
     applied_date = models.DateField()
     success = models.BooleanField(default=False)
     notes = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-applied_date']
+        indexes = [
+            models.Index(fields=['updated_at'], name='intervention_updated_idx'),
+            models.Index(fields=['batch', '-applied_date', '-id'], name='intervention_batch_date_idx'),
+            models.Index(fields=['-applied_date', '-id'], name='intervention_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.batch} - {self.intervention_type} ({'Success' if self.success else 'Failed'})"
+
+
+class HealthScan(models.Model):
+    """Photo of a stored batch, thumbnailed and classified by process_health_scans"""
+    DETECTION_CHOICES = [
+        ('FRESH', 'Fresh'),
+        ('ROTTEN', 'Rotten'),
+        ('PENDING', 'Pending'),
+    ]
+
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('PROCESSING', 'Processing'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    batch = models.ForeignKey(CropBatch, on_delete=models.CASCADE, related_name='health_scans')
+    # Files are stored under their content hash, so identical photos share one copy
+    image = models.FileField(max_length=255)
+    thumbnail = models.FileField(max_length=255, blank=True)
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 of the uploaded image")
+    size = models.BigIntegerField(help_text="Image size in bytes")
+    detection_result = models.CharField(max_length=20, choices=DETECTION_CHOICES, default='PENDING')
+    confidence = models.FloatField(default=0, help_text="Confidence score 0-1")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['batch', 'content_hash'], name='healthscan_batch_hash_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['content_hash'], name='healthscan_hash_idx'),
+            models.Index(fields=['status', 'created_at'], name='healthscan_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.batch} - {self.detection_result} ({self.status})"
+
+
+class WeatherData(models.Model):
+    """Daily weather for a division (one of CropBatch.LOCATION_CHOICES)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    location = models.CharField(max_length=50, choices=CropBatch.LOCATION_CHOICES)
+    forecast_date = models.DateField()
+    temperature = models.FloatField(help_text="Temperature in Celsius")
+    humidity = models.FloatField(help_text="Humidity percentage")
+    rainfall_probability = models.FloatField(default=0, help_text="Rainfall probability percentage")
+    wind_speed = models.FloatField(default=0, help_text="Wind speed in km/h")
+    description = models.CharField(max_length=100, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['location', '-forecast_date']
+        constraints = [
+            models.UniqueConstraint(fields=['location', 'forecast_date'], name='weatherdata_location_date_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.location} {self.forecast_date}: {self.temperature}°C, {self.humidity}%"
+
+
+class RiskPrediction(models.Model):
+    """Spoilage risk of a batch, written in bulk by the score_risk command"""
+    RISK_LEVEL_CHOICES = [
+        ('LOW', 'Low'),
+        ('MEDIUM', 'Medium'),
+        ('HIGH', 'High'),
+        ('CRITICAL', 'Critical'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    batch = models.OneToOneField(CropBatch, on_delete=models.CASCADE, related_name='risk_prediction')
+    risk_score = models.FloatField(default=0, help_text="Risk score 0-1")
+    risk_level = models.CharField(max_length=20, choices=RISK_LEVEL_CHOICES)
+    etcl_hours = models.IntegerField(help_text="Estimated Time to Critical Loss in hours")
+    risk_factors = models.JSONField(default=dict, help_text="Inputs and factor scores behind the risk")
+    recommendations = models.JSONField(default=list, help_text="List of recommendations")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-risk_score']
+
+    def __str__(self):
+        return f"{self.batch_id} - {self.risk_level} ({self.risk_score:.2f})"
+
+
+class Tombstone(models.Model):
+    """Marks a deleted row so delta sync can tell clients to drop it"""
+    MODEL_CHOICES = [
+        ('CropBatch', 'Crop Batch'),
+        ('LossEvent', 'Loss Event'),
+        ('Intervention', 'Intervention'),
+        ('Achievement', 'Achievement'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tombstones')
+    model_name = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.UUIDField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['deleted_at']
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model_name} {self.object_id} deleted {self.deleted_at}"
+
+
+class ExportJob(models.Model):
+    """Background export of a dataset to a gzip file on local storage"""
+    DATASET_CHOICES = [
+        ('BATCHES', 'Crop Batches'),
+        ('LOSS_EVENTS', 'Loss Events'),
+        ('INTERVENTIONS', 'Interventions'),
+    ]
+
+    FORMAT_CHOICES = [
+        ('CSV', 'CSV'),
+        ('NDJSON', 'NDJSON'),
+    ]
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    dataset = models.CharField(max_length=20, choices=DATASET_CHOICES, default='BATCHES')
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='CSV')
+    all_farmers = models.BooleanField(default=False, help_text="Export every farmer's data (staff only)")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    file = models.FileField(upload_to='exports/', blank=True)
+    # Resume state: the worker continues after last_pk and truncates the
+    # file back to bytes_written, dropping anything written after the last
+    # committed chunk.
+    last_pk = models.UUIDField(blank=True, null=True)
+    bytes_written = models.BigIntegerField(default=0)
+    rows_written = models.PositiveIntegerField(default=0)
+    total_rows = models.PositiveIntegerField(blank=True, null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.requested_by.email} - {self.dataset} {self.format} ({self.status})"
+
+    @property
+    def progress(self):
+        if self.status == 'COMPLETED':
+            return 100.0
+        if not self.total_rows:
+            return 0.0
+        return round(min(self.rows_written / self.total_rows, 1) * 100, 2)
+
+
+class LossRollup(models.Model):
+    """Monthly loss totals per division, storage type and loss type, across all farmers"""
+    division = models.CharField(max_length=50, choices=CropBatch.LOCATION_CHOICES)
+    storage_type = models.CharField(max_length=20, choices=CropBatch.STORAGE_TYPE_CHOICES)
+    loss_type = models.CharField(max_length=20, choices=LossEvent.LOSS_TYPE_CHOICES)
+    month = models.DateField(help_text="First day of the month of the loss events")
+    loss_event_count = models.PositiveIntegerField(default=0)
+    total_loss_kg = models.FloatField(default=0)
+    batch_count = models.PositiveIntegerField(default=0, help_text="Distinct batches with losses")
+    batch_weight_kg = models.FloatField(default=0, help_text="Estimated weight of those batches")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-month', 'division', 'storage_type', 'loss_type']
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'division', 'storage_type', 'loss_type'],
+                                    name='lossrollup_partition_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.division}/{self.storage_type}/{self.loss_type}"
+
+    @property
+    def loss_rate(self):
+        """Lost share of the affected batches' weight, in percent"""
+        if not self.batch_weight_kg:
+            return 0.0
+        return round(self.total_loss_kg / self.batch_weight_kg * 100, 2)
+
+
+class RollupWatermark(models.Model):
+    """How far a rollup has been refreshed; rows changed after this are re-rolled"""
+    name = models.CharField(max_length=50, primary_key=True)
+    high_water_mark = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.high_water_mark}"
+
+
+class StaleRollupMonth(models.Model):
+    """
+    A month whose loss rollups lost rows through a delete or a date change,
+    which the updated_at high-water mark cannot see.
+    """
+    month = models.DateField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.month:%Y-%m}"
+
+
+class RevokedToken(models.Model):
+    """
+    A refresh token that may no longer be used, e.g. the old token after a
+    rotation. Rows are only needed until the token expires on its own;
+    compact_revoked_tokens deletes them after that.
+    """
+    jti = models.CharField(max_length=255, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='revoked_tokens', blank=True, null=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.jti} (expires {self.expires_at:%Y-%m-%d %H:%M})"
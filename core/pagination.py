@@ -0,0 +1,190 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class AsyncPaginationMixin:
+    """apaginate_queryset(): paginate_queryset() for async views, through the async ORM"""
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # count is a cached_property, so the Paginator never counts again
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+        self.page.object_list = [item async for item in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+
+class AsyncPageNumberPagination(AsyncPaginationMixin, PageNumberPagination):
+    pass
+
+
+class StandardResultsSetPagination(AsyncPaginationMixin, PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPaginationMixin:
+    """
+    Opt-in keyset (cursor) pagination on top of a page-number paginator.
+
+    Requests carrying ?pagination=cursor or a ?cursor= token are paged by
+    seeking past the last seen (keyset_field, id) pair in descending order,
+    which an index on those columns answers in constant time however deep
+    the page. No total count is computed. All other requests keep the
+    page-number behaviour of the base class.
+    """
+    keyset_field = 'created_at'
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def use_keyset(self, request):
+        return (self.cursor_query_param in request.query_params
+                or request.query_params.get(self.mode_query_param) == 'cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.use_keyset(request)
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+        page = self.keyset_page(queryset, request)
+        if page is None:
+            return None
+        rows, *page = page
+        return self.keyset_results(list(rows), *page)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.use_keyset(request)
+        if not self.keyset_mode:
+            return await super().apaginate_queryset(queryset, request, view)
+        page = self.keyset_page(queryset, request)
+        if page is None:
+            return None
+        rows, *page = page
+        return self.keyset_results([item async for item in rows], *page)
+
+    def keyset_page(self, queryset, request):
+        """
+        (page queryset, page size, position, reverse), or None when not
+        paginating. The queryset is unevaluated and asks for one extra row,
+        which tells whether there is more.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        position, reverse = self.decode_cursor(request, queryset.model)
+        field = self.keyset_field
+        if reverse:
+            ordering = (field, 'id')
+        else:
+            ordering = (f'-{field}', '-id')
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            value, pk = position
+            lookup = 'gt' if reverse else 'lt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': pk})
+            )
+        return queryset[:page_size + 1], page_size, position, reverse
+
+    def keyset_results(self, results, page_size, position, reverse):
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.first_item = results[0] if results else None
+        self.last_item = results[-1] if results else None
+        return results
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(urlsafe_b64decode(padded.encode()).decode())
+            value = model._meta.get_field(self.keyset_field).to_python(payload['v'])
+            pk = model._meta.get_field('id').to_python(payload['id'])
+            reverse = bool(payload.get('r'))
+        except (ValueError, TypeError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None or pk is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (value, pk), reverse
+
+    def encode_cursor(self, item, reverse):
+        # items are model instances, or .values() rows on the ValuesReader path
+        if isinstance(item, dict):
+            value, pk = item[self.keyset_field], item['id']
+        else:
+            value, pk = getattr(item, self.keyset_field), item.id
+        payload = {'v': value.isoformat(), 'id': str(pk)}
+        if reverse:
+            payload['r'] = 1
+        token = urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        url = remove_query_param(self.base_url, 'page')
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, token.rstrip('='))
+
+    def get_next_link(self):
+        if not getattr(self, 'keyset_mode', False):
+            return super().get_next_link()
+        if not self.has_next or self.last_item is None:
+            return None
+        return self.encode_cursor(self.last_item, reverse=False)
+
+    def get_previous_link(self):
+        if not getattr(self, 'keyset_mode', False):
+            return super().get_previous_link()
+        if not self.has_previous or self.first_item is None:
+            return None
+        return self.encode_cursor(self.first_item, reverse=True)
+
+    def get_paginated_response(self, data):
+        if not getattr(self, 'keyset_mode', False):
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class CropBatchPagination(KeysetPaginationMixin, StandardResultsSetPagination):
+    keyset_field = 'created_at'
+
+
+class LossEventPagination(KeysetPaginationMixin, AsyncPageNumberPagination):
+    keyset_field = 'event_date'
+
+
+class InterventionPagination(KeysetPaginationMixin, AsyncPageNumberPagination):
+    keyset_field = 'applied_date'
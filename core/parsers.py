@@ -0,0 +1,29 @@
+import struct
+import uuid
+from datetime import date
+
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .renderers import DATE_EXT, EPOCH_ORDINAL, UUID_EXT
+
+
+def msgpack_ext_hook(code, data):
+    if code == UUID_EXT:
+        return uuid.UUID(bytes=data)
+    if code == DATE_EXT:
+        return date.fromordinal(struct.unpack('>i', data)[0] + EPOCH_ORDINAL)
+    return msgpack.ExtType(code, data)
+
+
+class MessagePackParser(BaseParser):
+    """application/msgpack request bodies, with the extension types MessagePackRenderer writes"""
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), ext_hook=msgpack_ext_hook, timestamp=3, raw=False,
+                                   strict_map_key=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
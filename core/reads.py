@@ -0,0 +1,201 @@
+"""
+Read path for list and detail responses that skips ModelSerializer.
+
+Serializing thousands of model instances spends most of its time in DRF's
+per-field machinery: get_attribute, to_representation and the OrderedDict
+per row. ValuesReader fetches the same columns with .values() and converts
+them with functions picked once per serializer class. It produces exactly
+the data the serializer would, as the equivalence tests check. Fields it has
+no fast converter for fall back to the field's own to_representation.
+"""
+from datetime import timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .asyncviews import AsyncReadMixin, aget_object_or_404, fetch_all
+from .fieldsets import SparseFieldsMixin
+from .renderers import wants_native_types
+
+ISO_8601 = 'iso-8601'
+NATIVE = 'native'
+
+_readers = {}
+
+
+def _datetime_converter(field):
+    if getattr(field, 'format', api_settings.DATETIME_FORMAT) != ISO_8601 or hasattr(field, 'timezone'):
+        return lambda tz: field.to_representation, None
+
+    def bind(tz):
+        def convert(value):
+            if isinstance(value, str) or timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(tz).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+    return bind, NATIVE
+
+
+def _converter(field):
+    """
+    (bind, native) for `field`. bind(tz) returns the converter for non-None
+    values, or None when values pass through unchanged; native is NATIVE
+    when a renderer that packs the Python value itself may skip conversion.
+    """
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return lambda tz: None, None
+    if isinstance(field, serializers.DateField) and getattr(field, 'format', api_settings.DATE_FORMAT) == ISO_8601:
+        def convert_date(value):
+            return field.to_representation(value) if isinstance(value, str) else value.isoformat()
+        return lambda tz: convert_date, NATIVE
+    if isinstance(field, serializers.UUIDField) and field.uuid_format == 'hex_verbose':
+        return lambda tz: str, NATIVE
+    if isinstance(field, serializers.ChoiceField):
+        choices = field.choice_strings_to_values
+        return lambda tz: lambda value: value if value == '' else choices.get(str(value), value), None
+    if type(field) in (serializers.CharField, serializers.EmailField):
+        return lambda tz: str, None
+    if type(field) is serializers.FloatField:
+        return lambda tz: float, None
+    if type(field) is serializers.IntegerField:
+        return lambda tz: int, None
+    if type(field) is serializers.BooleanField:
+        return lambda tz: bool, None
+    return lambda tz: field.to_representation, None
+
+
+class ValuesReader:
+    """Serializes .values() rows of `serializer_class`'s model the way the serializer would"""
+
+    def __init__(self, serializer_class):
+        model = serializer_class.Meta.model
+        self.plan = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            column = model._meta.get_field(field.source).attname
+            self.plan.append((name, column, *_converter(field)))
+        self.columns = list(dict.fromkeys(column for _, column, _, _ in self.plan))
+
+    def values(self, queryset, fields=None, extra=()):
+        """
+        queryset.values() with the columns behind `fields` (default: all),
+        plus `extra` columns the caller needs, e.g. for pagination
+        """
+        columns = self.columns if fields is None else [column for name, column, _, _ in self.plan if name in fields]
+        return queryset.values(*dict.fromkeys([*columns, *extra]))
+
+    def _bind(self, fields=None, native=False):
+        tz = timezone.get_current_timezone() if settings.USE_TZ else dt_timezone.utc
+        return [(name, column, None if native and kind is NATIVE else bind(tz))
+                for name, column, bind, kind in self.plan if fields is None or name in fields]
+
+    def to_representation(self, row, fields=None, native=False):
+        return self.many([row], fields, native)[0]
+
+    def many(self, rows, fields=None, native=False):
+        """
+        Serializer-equivalent dicts for `rows`; with `native`, UUIDs, dates
+        and datetimes stay Python objects for a renderer that packs them itself
+        """
+        plan = self._bind(fields, native)
+        return [
+            {name: row[column] if convert is None or row[column] is None else convert(row[column])
+             for name, column, convert in plan}
+            for row in rows
+        ]
+
+
+def get_reader(serializer_class):
+    reader = _readers.get(serializer_class)
+    if reader is None:
+        reader = _readers[serializer_class] = ValuesReader(serializer_class)
+    return reader
+
+
+def serialize_many(serializer_class, queryset, native=False, **kwargs):
+    """serializer_class(queryset, many=True).data, through a ValuesReader when enabled"""
+    if not settings.VALUES_READ_PATH_ENABLED:
+        return serializer_class(queryset, many=True, **kwargs).data
+    reader = get_reader(serializer_class)
+    return reader.many(reader.values(queryset), native=native)
+
+
+class ValuesReadMixin(AsyncReadMixin, SparseFieldsMixin):
+    """
+    list() and retrieve() through a ValuesReader for the viewset's
+    serializer_class, honouring ?fields= / ?exclude=. Views that switch to
+    another serializer (e.g. to embed extra data) keep the regular
+    ModelSerializer path. alist() and aretrieve() are their async twins.
+    """
+
+    def uses_values_reader(self):
+        return (settings.VALUES_READ_PATH_ENABLED and not getattr(self, 'swagger_fake_view', False)
+                and self.get_serializer_class() is self.serializer_class)
+
+    def read_values(self, queryset):
+        """(reader, .values() rows, sparse fields) for `queryset`"""
+        reader = get_reader(self.serializer_class)
+        fields = self.get_sparse_fields()
+        # keyset pagination reads the id and its ordering column from each row
+        extra = ['id', getattr(self.paginator, 'keyset_field', None)] if fields is not None else []
+        return reader, reader.values(queryset, fields, [name for name in extra if name]), fields
+
+    def serialize_many(self, queryset):
+        """get_serializer(queryset, many=True).data, through the reader when possible"""
+        if not self.uses_values_reader():
+            return self.get_serializer(queryset, many=True).data
+        reader, rows, fields = self.read_values(queryset)
+        return reader.many(rows, fields, wants_native_types(self.request))
+
+    def list(self, request, *args, **kwargs):
+        if not self.uses_values_reader():
+            return super().list(request, *args, **kwargs)
+        reader, rows, fields = self.read_values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        native = wants_native_types(request)
+        if page is not None:
+            return self.get_paginated_response(reader.many(page, fields, native))
+        return Response(reader.many(rows, fields, native))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.uses_values_reader():
+            return super().retrieve(request, *args, **kwargs)
+        reader, rows, fields = self.read_values(self.filter_queryset(self.get_queryset()))
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(rows, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(reader.to_representation(row, fields, wants_native_types(request)))
+
+    async def aserialize_many(self, queryset):
+        if not self.uses_values_reader():
+            return await sync_to_async(self.serialize_many)(queryset)
+        reader, rows, fields = self.read_values(queryset)
+        return reader.many(await fetch_all(rows), fields, wants_native_types(self.request))
+
+    async def alist(self, request, *args, **kwargs):
+        if not self.uses_values_reader():
+            return await sync_to_async(super().list)(request, *args, **kwargs)
+        reader, rows, fields = self.read_values(self.filter_queryset(self.get_queryset()))
+        page = await self.apaginate_queryset(rows)
+        native = wants_native_types(request)
+        if page is not None:
+            return self.get_paginated_response(reader.many(page, fields, native))
+        return Response(reader.many(await fetch_all(rows), fields, native))
+
+    async def aretrieve(self, request, *args, **kwargs):
+        if not self.uses_values_reader():
+            return await sync_to_async(super().retrieve)(request, *args, **kwargs)
+        reader, rows, fields = self.read_values(self.filter_queryset(self.get_queryset()))
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = await aget_object_or_404(rows, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(reader.to_representation(row, fields, wants_native_types(request)))
@@ -0,0 +1,37 @@
+"""Reading CSV and JSON Lines files, optionally gzipped, as a stream of records"""
+import csv
+import gzip
+import json
+
+
+def open_text(path):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def detect_format(path):
+    name = str(path).lower().removesuffix('.gz')
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    raise ValueError(f"Cannot tell the format of {path}; pass --format")
+
+
+def read_records(stream, fmt):
+    """Yield (line number, dict) pairs from a CSV or JSON Lines stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield line_number, exc
+                continue
+            yield line_number, record
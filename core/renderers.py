@@ -0,0 +1,83 @@
+import struct
+import uuid
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+import msgpack
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class PassthroughRenderer(BaseRenderer):
+    """
+    Lets streamed export formats pass DRF content negotiation.
+    Views using it return their own (streaming) HttpResponse; only error
+    payloads ever reach render(), and those are sent back as JSON.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, str)):
+            return data
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = JSONRenderer.media_type
+        return JSONRenderer().render(data)
+
+
+class CSVRenderer(PassthroughRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(PassthroughRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+# MessagePack extension types; clients register decoders for these two codes.
+# Aware datetimes use the standard Timestamp extension (-1) instead.
+UUID_EXT = 1    # 16 raw bytes
+DATE_EXT = 2    # days since 1970-01-01, big-endian signed 32-bit
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def msgpack_default(obj):
+    """Pack what MessagePack has no native type for, compactly where clients decode it back"""
+    if isinstance(obj, uuid.UUID):
+        return msgpack.ExtType(UUID_EXT, obj.bytes)
+    if isinstance(obj, datetime):
+        # aware datetimes never get here: datetime=True packs them as Timestamps
+        return obj.isoformat()
+    if isinstance(obj, date):
+        return msgpack.ExtType(DATE_EXT, struct.pack('>i', obj.toordinal() - EPOCH_ORDINAL))
+    if isinstance(obj, (time, Decimal, Promise)):
+        return obj.isoformat() if isinstance(obj, time) else str(obj)
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if hasattr(obj, 'tolist'):    # numpy scalars and arrays
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)) or hasattr(obj, '__iter__'):
+        return list(obj)
+    raise TypeError(f"Cannot pack {type(obj).__name__}")
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    application/msgpack responses, chosen with the Accept header or
+    ?format=msgpack. Views that can skip string conversion of UUIDs and
+    dates (core.reads) hand them over natively when `native_types` is set.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    native_types = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=msgpack_default, use_bin_type=True, datetime=True)
+
+
+def wants_native_types(request):
+    """True when the negotiated renderer packs UUIDs and dates itself"""
+    return getattr(getattr(request, 'accepted_renderer', None), 'native_types', False)
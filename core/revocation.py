@@ -0,0 +1,176 @@
+"""
+Refresh-token revocation without a query per refresh.
+
+Revoked jtis are stored in RevokedToken until the token would have expired
+anyway. Each process keeps a Bloom filter of the unexpired jtis, so the
+common "not revoked" answer is settled in memory. Only the rare hit (a
+revoked token or a false positive) is confirmed against the table.
+
+Processes keep their filters in step through two stamps in the shared cache.
+Every revocation sets a new generation, which makes other processes load the
+rows revoked since their last load. Compaction sets a new epoch, which makes
+them rebuild from scratch so deleted jtis leave the filter.
+"""
+import hashlib
+import math
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .cache import get_cache
+from .models import RevokedToken
+
+EPOCH_KEY = 'hg:revoked:epoch'
+GENERATION_KEY = 'hg:revoked:generation'
+
+
+class BloomFilter:
+    """Set membership with no false negatives and about `error_rate` false positives"""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = max(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationFilter:
+    """This process's Bloom filter of revoked jtis, loaded from RevokedToken"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.epoch = self.generation = None
+        self.loaded_until = None
+
+    def _load(self, since=None):
+        started = timezone.now()
+        rows = RevokedToken.objects.filter(expires_at__gt=_expiry_cutoff(started))
+        if since is not None:
+            rows = rows.filter(revoked_at__gte=since - settings.REVOKED_TOKEN_OVERLAP)
+        for jti in rows.values_list('jti', flat=True).iterator(chunk_size=10000):
+            self.bloom.add(jti)
+        self.loaded_until = started
+
+    def _rebuild(self):
+        capacity = max(settings.REVOKED_TOKEN_BLOOM_CAPACITY,
+                       RevokedToken.objects.filter(expires_at__gt=_expiry_cutoff()).count() * 2)
+        self.bloom = BloomFilter(capacity, settings.REVOKED_TOKEN_BLOOM_ERROR_RATE)
+        self._load()
+
+    def sync(self):
+        """Catch up with revocations made by other processes, if there were any"""
+        stamps = get_cache().get_many([EPOCH_KEY, GENERATION_KEY])
+        epoch, generation = stamps.get(EPOCH_KEY), stamps.get(GENERATION_KEY)
+        if self.bloom is not None and (epoch, generation) == (self.epoch, self.generation):
+            return
+        with self.lock:
+            if self.bloom is None or epoch != self.epoch or self.bloom.count > self.bloom.capacity:
+                self._rebuild()
+            elif generation != self.generation:
+                self._load(since=self.loaded_until)
+            # stamps read before loading: a revocation that lands meanwhile triggers another load
+            self.epoch, self.generation = epoch, generation
+
+    def add(self, jti):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def might_contain(self, jti):
+        self.sync()
+        return jti in self.bloom
+
+
+_filter = None
+
+
+def get_filter():
+    global _filter
+    if _filter is None:
+        _filter = RevocationFilter()
+    return _filter
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    global _filter
+    if setting.startswith('REVOKED_TOKEN'):
+        _filter = None
+
+
+def _expiry_cutoff(now=None):
+    """Tokens that expired before this are rejected on their own, whether revoked or not"""
+    leeway = api_settings.LEEWAY
+    if not isinstance(leeway, timedelta):
+        leeway = timedelta(seconds=leeway)
+    return (now or timezone.now()) - leeway
+
+
+def _stamp(key):
+    get_cache().set(key, uuid.uuid4().hex, timeout=None)
+
+
+def is_revoked(jti):
+    return get_filter().might_contain(jti) and RevokedToken.objects.filter(jti=jti).exists()
+
+
+def revoke(jti, expires_at, user_id=None):
+    """Revoke a token until it expires; other processes learn of it once this commits"""
+    RevokedToken.objects.bulk_create(
+        [RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at)], ignore_conflicts=True)
+    get_filter().add(jti)
+    transaction.on_commit(lambda: _stamp(GENERATION_KEY))
+
+
+def compact_revoked_tokens(batch_size=10000):
+    """Delete revoked tokens that have expired; returns how many were deleted"""
+    cutoff = _expiry_cutoff()
+    deleted = 0
+    while True:
+        jtis = list(RevokedToken.objects.filter(expires_at__lte=cutoff)
+                    .values_list('jti', flat=True)[:batch_size])
+        if not jtis:
+            break
+        deleted += RevokedToken.objects.filter(jti__in=jtis).delete()[0]
+    if deleted:
+        _stamp(EPOCH_KEY)
+    return deleted
+
+
+class RevocableRefreshToken(RefreshToken):
+    """RefreshToken checked against, and revoked into, the RevokedToken store"""
+
+    def verify(self):
+        super().verify()
+        if is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        revoke(self.payload[api_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp']),
+               self.payload.get(api_settings.USER_ID_CLAIM))
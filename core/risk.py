@@ -0,0 +1,201 @@
+"""
+Vectorized spoilage risk scoring.
+
+ACTIVE batches are read as plain tuples in chunks, turned into NumPy
+arrays and scored in one pass per chunk from storage type, days in
+storage and the latest weather for their division. Results go back as
+plain tuples through one executemany of an INSERT ... ON CONFLICT per
+chunk, skipping model instances and per-field preparation, which cost
+far more than the scoring itself.
+"""
+import json
+import time
+import uuid
+from datetime import date
+
+import numpy as np
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import CropBatch, RiskPrediction, WeatherData
+
+RISK_CHUNK_SIZE = 50000
+
+# Relative exposure of each storage type; unknown types count as open air
+STORAGE_EXPOSURE = {'SILO': 0.45, 'JUTE_BAG': 0.75, 'OPEN_AREA': 1.0}
+
+# Used for divisions without any weather rows yet (typical Bangladesh storage season)
+DEFAULT_TEMPERATURE = 28.0
+DEFAULT_HUMIDITY = 75.0
+
+FACTOR_WEIGHTS = {'humidity': 0.45, 'temperature': 0.30, 'storage_age': 0.25}
+
+RISK_LEVELS = ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']
+# lower score bounds of MEDIUM, HIGH and CRITICAL
+RISK_THRESHOLDS = [0.25, 0.5, 0.75]
+
+# Hours until critical loss at a score of zero; shrinks quadratically with the score
+MAX_ETCL_HOURS = 720
+
+RECOMMENDATIONS = {
+    'humidity': "Improve ventilation or dry the grain; humidity is the main risk driver.",
+    'temperature': "Move the batch somewhere cooler or shade the storage.",
+    'storage_age': "The batch has been stored for a long time; plan to sell or process it.",
+}
+LEVEL_RECOMMENDATIONS = {
+    'LOW': [],
+    'MEDIUM': ["Inspect the batch weekly."],
+    'HIGH': ["Inspect the batch every two days."],
+    'CRITICAL': ["Inspect the batch today and consider moving it to a silo."],
+}
+
+
+def score_arrays(exposure, days_stored, temperature, humidity):
+    """
+    Score equally long float arrays. Returns (score, level index, etcl hours,
+    dominant factor index into FACTOR_WEIGHTS, factor matrix).
+    """
+    factors = np.column_stack([
+        np.clip((humidity - 60.0) / 30.0, 0.0, 1.0),
+        np.clip((temperature - 20.0) / 15.0, 0.0, 1.0),
+        np.clip(days_stored / 180.0, 0.0, 1.0),
+    ])
+    weighted = factors * np.fromiter(FACTOR_WEIGHTS.values(), dtype=float)
+    score = np.clip(weighted.sum(axis=1) * exposure, 0.0, 1.0)
+    levels = np.digitize(score, RISK_THRESHOLDS)
+    etcl = np.rint(MAX_ETCL_HOURS * (1.0 - score) ** 2).astype(int)
+    return score, levels, etcl, weighted.argmax(axis=1), factors
+
+
+def latest_weather(on=None):
+    """{location: (temperature, humidity)} from each division's latest row up to `on`"""
+    on = on or date.today()
+    latest = (
+        WeatherData.objects.filter(location=OuterRef('location'), forecast_date__lte=on)
+        .order_by('-forecast_date')
+        .values('forecast_date')[:1]
+    )
+    rows = WeatherData.objects.filter(forecast_date=Subquery(latest)).values_list(
+        'location', 'temperature', 'humidity'
+    )
+    return {location: (temperature, humidity) for location, temperature, humidity in rows}
+
+
+def _recommendations():
+    """Recommendations for each (level, dominant factor) pair, built once per run"""
+    return [
+        [
+            LEVEL_RECOMMENDATIONS[level] + ([RECOMMENDATIONS[factor]] if level != 'LOW' else [])
+            for factor in FACTOR_WEIGHTS
+        ]
+        for level in RISK_LEVELS
+    ]
+
+
+def score_chunk(rows, weather, today, recommendations=None):
+    """
+    Score (batch id, storage_type, storage_location, harvest_date) tuples,
+    where harvest_date may be a date or an ISO string. Returns (batch id,
+    score, level, etcl hours, risk factors, recommendations) tuples for
+    save_predictions().
+    """
+    if not rows:
+        return []
+    recommendations = recommendations or _recommendations()
+    ids, storage_types, locations, harvest_dates = zip(*rows)
+
+    storage_keys, storage_index = np.unique(np.array(storage_types), return_inverse=True)
+    exposure = np.array([STORAGE_EXPOSURE.get(key, 1.0) for key in storage_keys])[storage_index]
+
+    location_keys, location_index = np.unique(np.array(locations), return_inverse=True)
+    known = [weather.get(key, (DEFAULT_TEMPERATURE, DEFAULT_HUMIDITY)) for key in location_keys]
+    temperature = np.array([t for t, _ in known], dtype=float)[location_index]
+    humidity = np.array([h for _, h in known], dtype=float)[location_index]
+
+    harvested = np.array(harvest_dates, dtype='datetime64[D]')
+    days_stored = np.maximum((np.datetime64(today, 'D') - harvested).astype(int), 0)
+
+    score, levels, etcl, dominant, factors = score_arrays(exposure, days_stored, temperature, humidity)
+
+    factor_names = list(FACTOR_WEIGHTS)
+    return [
+        (
+            batch_id,
+            batch_score,
+            RISK_LEVELS[level],
+            hours,
+            {
+                'temperature': round(temp, 1),
+                'humidity': round(hum, 1),
+                'days_stored': days,
+                'storage_type': storage_type,
+                'factors': dict(zip(factor_names, (round(value, 3) for value in batch_factors))),
+                'dominant_factor': factor_names[factor],
+            },
+            recommendations[level][factor],
+        )
+        for (batch_id, storage_type, batch_score, level, hours, factor, batch_factors, temp, hum, days) in zip(
+            ids, storage_types, np.round(score, 4).tolist(), levels.tolist(), etcl.tolist(), dominant.tolist(),
+            factors.tolist(), temperature.tolist(), humidity.tolist(), days_stored.tolist(),
+        )
+    ]
+
+
+PREDICTION_COLUMNS = ['id', 'batch_id', 'risk_score', 'risk_level', 'etcl_hours',
+                      'risk_factors', 'recommendations', 'updated_at']
+
+
+def save_predictions(rows):
+    """Upsert score_chunk() rows on their batch with a single executemany"""
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    updates = ', '.join(f'{quote(name)} = EXCLUDED.{quote(name)}' for name in PREDICTION_COLUMNS[2:])
+    sql = (
+        f'INSERT INTO {quote(RiskPrediction._meta.db_table)} ({", ".join(map(quote, PREDICTION_COLUMNS))}) '
+        f'VALUES ({", ".join(["%s"] * len(PREDICTION_COLUMNS))}) '
+        f'ON CONFLICT ({quote("batch_id")}) DO UPDATE SET {updates}'
+    )
+    # what UUIDField and DateTimeField would send, worked out once per chunk
+    as_uuid = (lambda value: value) if connection.features.has_native_uuid_field else (lambda value: value.hex)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            (as_uuid(uuid.uuid4()), as_uuid(batch_id), score, level, hours,
+             json.dumps(factors), json.dumps(recommendations), now)
+            for batch_id, score, level, hours, factors, recommendations in rows
+        ])
+
+
+def score_batches(batches=None, chunk_size=RISK_CHUNK_SIZE, today=None):
+    """
+    Score every ACTIVE batch in `batches` (default: all of them) and upsert
+    their predictions. Returns (batches scored, seconds taken).
+    """
+    started = time.monotonic()
+    today = today or date.today()
+    weather = latest_weather(today)
+    recommendations = _recommendations()
+    batches = CropBatch.objects.all() if batches is None else batches
+    # completed batches are no longer at risk
+    RiskPrediction.objects.filter(batch__in=batches.exclude(status='ACTIVE').values('pk')).delete()
+    rows = (
+        batches.filter(status='ACTIVE')
+        .order_by()
+        .values_list('id', 'storage_type', 'storage_location', 'harvest_date')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    scored = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            save_predictions(score_chunk(chunk, weather, today, recommendations))
+            scored += len(chunk)
+            chunk = []
+    if chunk:
+        save_predictions(score_chunk(chunk, weather, today, recommendations))
+        scored += len(chunk)
+    return scored, time.monotonic() - started
@@ -0,0 +1,126 @@
+"""
+Regional loss rollups: LossRollup rows per (month, division, storage_type,
+loss_type) across all farmers, refreshed incrementally.
+
+A refresh rebuilds whole months. It picks the months of loss events
+changed since the high-water mark (directly, or through their batch moving
+division or storage type) plus months marked stale by deletes and date
+changes, which leave no updated_at behind.
+"""
+from collections import defaultdict
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import LossEvent, LossRollup, RollupWatermark, StaleRollupMonth
+
+WATERMARK_NAME = 'loss_rollup'
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def remember_month(event):
+    """Snapshot the month a loss event is rolled up under"""
+    if 'event_date' in event.__dict__ and event.event_date:
+        event._rollup_month = month_of(event.event_date)
+
+
+def mark_stale(months):
+    months = {month for month in months if month is not None}
+    if months:
+        StaleRollupMonth.objects.bulk_create(
+            [StaleRollupMonth(month=month) for month in months], ignore_conflicts=True
+        )
+
+
+def record_moves(events):
+    """Mark the old month of events whose event_date moved to another month"""
+    moved = set()
+    for event in events:
+        old = getattr(event, '_rollup_month', None)
+        new = month_of(event.event_date) if event.event_date else None
+        if old is not None and old != new:
+            moved.add(old)
+        event._rollup_month = new
+    mark_stale(moved)
+
+
+def changed_months(since):
+    """Months holding loss events whose row or batch changed after `since`"""
+    changed = LossEvent.objects.filter(Q(updated_at__gt=since) | Q(batch__updated_at__gt=since))
+    return set(changed.dates('event_date', 'month'))
+
+
+def rebuild_months(months):
+    """Replace the rollups of `months` with fresh totals, in one transaction"""
+    window = Q()
+    for month in months:
+        window |= Q(event_date__gte=month, event_date__lt=next_month(month))
+
+    with transaction.atomic():
+        # Clear the stale marks before reading: a delete racing this rebuild
+        # then leaves a fresh mark behind for the next run
+        StaleRollupMonth.objects.filter(month__in=months).delete()
+
+        # One row per (partition, batch), so each batch's weight is counted once
+        rows = (
+            LossEvent.objects.filter(window)
+            .annotate(month=TruncMonth('event_date'))
+            .order_by()
+            .values('month', 'batch__storage_location', 'batch__storage_type', 'loss_type',
+                    'batch_id', 'batch__estimated_weight')
+            .annotate(events=Count('id'), kg=Sum('estimated_loss_kg'))
+            .values_list('month', 'batch__storage_location', 'batch__storage_type', 'loss_type',
+                         'batch__estimated_weight', 'events', 'kg')
+        )
+        totals = defaultdict(lambda: [0, 0.0, 0, 0.0])
+        for month, division, storage_type, loss_type, weight, events, kg in rows.iterator():
+            partition = totals[(month_of(month), division, storage_type, loss_type)]
+            partition[0] += events
+            partition[1] += kg or 0.0
+            partition[2] += 1
+            partition[3] += weight or 0.0
+
+        LossRollup.objects.filter(month__in=months).delete()
+        LossRollup.objects.bulk_create([
+            LossRollup(month=month, division=division, storage_type=storage_type, loss_type=loss_type,
+                       loss_event_count=events, total_loss_kg=kg, batch_count=batches,
+                       batch_weight_kg=weight)
+            for (month, division, storage_type, loss_type), (events, kg, batches, weight) in totals.items()
+        ])
+    return len(totals)
+
+
+def refresh_loss_rollups(full=False):
+    """
+    Rebuild every month touched since the last run (all months when `full`
+    or on the first run). Returns the refreshed months.
+    """
+    started = timezone.now()
+    watermark, _ = RollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+
+    if full or watermark.high_water_mark is None:
+        months = set(LossEvent.objects.dates('event_date', 'month'))
+        months |= set(LossRollup.objects.dates('month', 'month'))
+    else:
+        months = changed_months(watermark.high_water_mark)
+    months |= set(StaleRollupMonth.objects.values_list('month', flat=True))
+
+    months = sorted(months)
+    size = settings.LOSS_ROLLUP_MONTHS_PER_CHUNK
+    for start in range(0, len(months), size):
+        rebuild_months(months[start:start + size])
+
+    watermark.high_water_mark = started - settings.LOSS_ROLLUP_OVERLAP
+    watermark.save()
+    return months
@@ -0,0 +1,244 @@
+"""
+Health scan intake and background processing.
+
+Uploads are hashed chunk by chunk while they are written to a staging file
+under MEDIA_ROOT (HashingUploadHandler), then renamed into place under their
+SHA-256. The request never holds the image in memory and its remaining work
+is a rename and an INSERT, whatever the photo's size. Thumbnails and
+classification run later in a process or thread pool (process_health_scans),
+once per distinct image however many scans share it.
+"""
+import hashlib
+import os
+import tempfile
+from collections import defaultdict
+from concurrent.futures import as_completed
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import HealthScan
+
+SCAN_DIR = 'health_scans'
+STAGING_DIR = f'{SCAN_DIR}/incoming'
+THUMBNAIL_SIZE = (256, 256)
+
+# Pillow format -> stored file extension
+IMAGE_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+# Orders finished scans of the same image before unfinished ones
+DONE_FIRST = Case(When(status='DONE', then=Value(0)), default=Value(1), output_field=IntegerField())
+
+
+class StagedUpload(TemporaryUploadedFile):
+    """
+    TemporaryUploadedFile staged inside MEDIA_ROOT rather than the system temp
+    directory, so storing it is a rename on the same filesystem, not a copy.
+    """
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        directory = default_storage.path(STAGING_DIR)
+        os.makedirs(directory, exist_ok=True)
+        file = tempfile.NamedTemporaryFile(suffix='.upload', dir=directory)
+        UploadedFile.__init__(self, file, name, content_type, size, charset, content_type_extra)
+        self.content_hash = None
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """Streams uploads to disk, computing their SHA-256 on the way through"""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.too_large = False
+
+    def new_file(self, *args, **kwargs):
+        super(TemporaryFileUploadHandler, self).new_file(*args, **kwargs)
+        self.file = StagedUpload(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.HEALTH_SCAN_MAX_UPLOAD_SIZE:
+            self.too_large = True
+            self.upload_interrupted()
+            raise SkipFile()
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.content_hash = self.hasher.hexdigest()
+        return upload
+
+
+def image_extension(upload):
+    """Extension for a staged upload, read from the image header only"""
+    try:
+        with Image.open(upload.temporary_file_path()) as image:
+            image_format = image.format
+    except (UnidentifiedImageError, OSError):
+        image_format = None
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError("Upload a JPEG, PNG or WebP image.")
+    return IMAGE_FORMATS[image_format]
+
+
+def image_name(content_hash, extension):
+    return f'{SCAN_DIR}/{content_hash[:2]}/{content_hash}{extension}'
+
+
+def thumbnail_name(content_hash):
+    return f'{SCAN_DIR}/thumbs/{content_hash[:2]}/{content_hash}.jpg'
+
+
+def store_image(upload):
+    """
+    Store a staged upload under its hash and return the name. When two
+    requests store the same new photo at once, the second copy is dropped.
+    """
+    name = image_name(upload.content_hash, image_extension(upload))
+    if default_storage.exists(name):
+        return name
+    stored = default_storage.save(name, upload)
+    if stored != name:
+        # the same bytes were stored under `name` since exists() said no
+        default_storage.delete(stored)
+    return name
+
+
+def delete_unused_files(names):
+    """Delete stored images and thumbnails that no scan refers to any more"""
+    names = set(filter(None, names))
+    if not names:
+        return
+    for image, thumbnail in HealthScan.objects.filter(Q(image__in=names) | Q(thumbnail__in=names)) \
+            .values_list('image', 'thumbnail'):
+        names -= {image, thumbnail}
+    for name in names:
+        default_storage.delete(name)
+
+
+def create_scan(batch, upload):
+    """
+    Record a staged upload as a scan of `batch`. Returns (scan, created);
+    a photo already scanned for the batch returns the existing scan, which
+    the unique (batch, content_hash) constraint finds even when the two
+    uploads race. Photos seen before on any batch reuse the stored file,
+    and its results when they are already in.
+    """
+    twin = (
+        HealthScan.objects.filter(content_hash=upload.content_hash)
+        .order_by(DONE_FIRST, 'created_at')
+        .first()
+    )
+    scan = HealthScan(batch=batch, content_hash=upload.content_hash, size=upload.size)
+    if twin is not None:
+        scan.image = twin.image.name
+        if twin.status == 'DONE':
+            scan.thumbnail = twin.thumbnail.name
+            scan.detection_result = twin.detection_result
+            scan.confidence = twin.confidence
+            scan.status = 'DONE'
+            scan.processed_at = timezone.now()
+    else:
+        scan.image = store_image(upload)
+
+    try:
+        with transaction.atomic():
+            scan.save(force_insert=True)
+    except IntegrityError:
+        # already scanned for this batch, perhaps by a request racing this one
+        return HealthScan.objects.get(batch=batch, content_hash=upload.content_hash), False
+    return scan, True
+
+
+class ScanClassifier:
+    """Labels a scan FRESH or ROTTEN"""
+
+    def classify(self, image):
+        """Thumbnail-sized RGB PIL image -> (detection_result, confidence 0-1)"""
+        raise NotImplementedError
+
+
+class DarkSpotClassifier(ScanClassifier):
+    """
+    Local stand-in for a trained model: photos where more than `threshold`
+    of the pixels are dark (mould, rot, damp patches) are called ROTTEN.
+    """
+    threshold = 0.25
+    dark_below = 60
+
+    def classify(self, image):
+        histogram = image.convert('L').histogram()
+        dark = sum(histogram[:self.dark_below]) / max(sum(histogram), 1)
+        margin = abs(dark - self.threshold) / max(self.threshold, 1 - self.threshold)
+        label = 'ROTTEN' if dark > self.threshold else 'FRESH'
+        return label, round(0.5 + margin / 2, 3)
+
+
+def process_image(path, thumbnail_path, classifier_path):
+    """
+    Pool task: write the thumbnail and classify it. Touches only files, so
+    it runs the same in a thread or a worker process.
+    """
+    classifier = import_string(classifier_path)()
+    with Image.open(path) as image:
+        image.draft('RGB', THUMBNAIL_SIZE)   # JPEGs decode straight at a reduced scale
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    image.thumbnail(THUMBNAIL_SIZE)
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    image.save(thumbnail_path, 'JPEG', quality=85)
+    return classifier.classify(image)
+
+
+def claim_scans(limit):
+    """
+    Move up to `limit` QUEUED scans, or PROCESSING ones whose worker went
+    quiet, to PROCESSING. Returns the claimed scans.
+    """
+    now = timezone.now()
+    claimable = Q(status='QUEUED') | Q(status='PROCESSING', updated_at__lt=now - settings.HEALTH_SCAN_STALE_AFTER)
+    ids = list(HealthScan.objects.filter(claimable).order_by('created_at').values_list('pk', flat=True)[:limit])
+    if not ids:
+        return []
+    HealthScan.objects.filter(claimable, pk__in=ids).update(status='PROCESSING', updated_at=now)
+    # rows another worker claimed first carry its timestamp, not ours
+    return list(HealthScan.objects.filter(pk__in=ids, status='PROCESSING', updated_at=now))
+
+
+def process_scans(executor, limit=100):
+    """
+    Claim up to `limit` scans and run one process_image() task per distinct
+    image on `executor`. Returns (scans done, scans failed).
+    """
+    by_hash = defaultdict(list)
+    for scan in claim_scans(limit):
+        by_hash[scan.content_hash].append(scan)
+
+    futures = {}
+    for content_hash, scans in by_hash.items():
+        future = executor.submit(
+            process_image, default_storage.path(scans[0].image.name),
+            default_storage.path(thumbnail_name(content_hash)), settings.HEALTH_SCAN_CLASSIFIER,
+        )
+        futures[future] = content_hash
+
+    done = failed = 0
+    for future in as_completed(futures):
+        content_hash = futures[future]
+        scans = HealthScan.objects.filter(pk__in=[scan.pk for scan in by_hash[content_hash]])
+        try:
+            label, confidence = future.result()
+        except Exception as exc:
+            failed += scans.update(status='FAILED', error=str(exc), updated_at=timezone.now())
+            continue
+        now = timezone.now()
+        done += scans.update(status='DONE', detection_result=label, confidence=confidence,
+                             thumbnail=thumbnail_name(content_hash), error='',
+                             processed_at=now, updated_at=now)
+    return done, failed
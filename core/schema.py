@@ -0,0 +1,56 @@
+"""
+The OpenAPI schema behind /api/swagger/ and /api/redoc/.
+
+drf-yasg builds the schema by introspecting every viewset and serializer,
+by default on each request. `python manage.py build_openapi_schema` builds
+it once at deploy time into STATIC_ROOT (settings.OPENAPI_SCHEMA_FILE, with
+a gzipped copy), where WhiteNoise serves it to the docs pages. The schema
+views build it once per process and answer from memory, for the processes
+that have no prebuilt file and for clients asking ?format=openapi.
+"""
+import functools
+
+from django.http import HttpResponse
+from drf_yasg import openapi
+from drf_yasg.app_settings import swagger_settings
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+from rest_framework.response import Response
+
+API_INFO = openapi.Info(
+   title="Harvest Guard API",
+   default_version='v1',
+   description="API documentation for Harvest Guard application.",
+   terms_of_service="https://www.harvestguard.com/terms/",
+   contact=openapi.Contact(email="tanbinali@gmail.com"),
+   license=openapi.License(name="BSD License"),
+)
+
+
+@functools.cache
+def get_schema():
+    """
+    The schema of every endpoint, built on the first call. It is built
+    without a request, so it names no host and clients resolve its paths
+    against the host they loaded it from.
+    """
+    generator = swagger_settings.DEFAULT_GENERATOR_CLASS(API_INFO)
+    return generator.get_schema(request=None, public=True)
+
+
+@functools.cache
+def get_schema_json():
+    """get_schema() encoded as JSON, as ?format=openapi returns it"""
+    return OpenAPICodecJson(validators=[]).encode(get_schema())
+
+
+class SchemaView(get_schema_view(API_INFO, public=True, permission_classes=(permissions.AllowAny,))):
+    """drf-yasg's schema view, answering from get_schema()"""
+
+    def get(self, request, version='', format=None):
+        renderer = request.accepted_renderer
+        if getattr(renderer, 'codec_class', None) is OpenAPICodecJson:
+            # encoding the schema costs several times more than serving it
+            return HttpResponse(get_schema_json(), content_type=f'{renderer.media_type}; charset=utf-8')
+        return Response(get_schema())
@@ -1,6 +1,14 @@
 from rest_framework import serializers
-from .models import CropBatch, Achievement, LossEvent, Intervention
+from .models import (CropBatch, Achievement, LossEvent, Intervention, ExportJob, LossRollup, RiskPrediction,
+                     HealthScan)
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer, TokenVerifySerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+from .revocation import RevocableRefreshToken, is_revoked
+from .weather import WeatherUnavailable, current_conditions
 
 User = get_user_model()
 
@@ -11,8 +19,8 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'email', 'phone_number', 'first_name', 'last_name', 
-                  'preferred_language', 'password', 'created_at','username']
-        read_only_fields = ['id', 'created_at']
+                  'preferred_language', 'password', 'created_at','username', 'batch_count']
+        read_only_fields = ['id', 'created_at', 'batch_count']
     
     def create(self, validated_data):
         password = validated_data.pop('password', None)
@@ -41,13 +49,71 @@ class UserSerializer(serializers.ModelSerializer):
         return instance
 
 
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh that rejects revoked tokens and revokes the old one on rotation"""
+    token_class = RevocableRefreshToken
+
+
+class RevocableTokenVerifySerializer(TokenVerifySerializer):
+    """Verify that also reports revoked refresh tokens as invalid"""
+
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+        jti = token.get(api_settings.JTI_CLAIM)
+        if api_settings.BLACKLIST_AFTER_ROTATION and jti and is_revoked(jti):
+            raise serializers.ValidationError(_("Token is blacklisted"))
+        return {}
+
+
 class CropBatchSerializer(serializers.ModelSerializer):
     class Meta:
         model = CropBatch
         fields = ['id', 'crop_type', 'estimated_weight', 'harvest_date', 
                   'storage_location', 'storage_type', 'status', 'notes',
-                  'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+                  'created_at', 'updated_at', 'loss_event_count', 'total_loss_kg',
+                  'intervention_count', 'successful_intervention_count']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'loss_event_count', 'total_loss_kg',
+                            'intervention_count', 'successful_intervention_count']
+
+
+class CropBatchWeatherSerializer(CropBatchSerializer):
+    """CropBatchSerializer plus the current conditions in the batch's division"""
+    current_weather = serializers.SerializerMethodField()
+
+    class Meta(CropBatchSerializer.Meta):
+        fields = CropBatchSerializer.Meta.fields + ['current_weather']
+
+    def get_current_weather(self, batch):
+        # served from the per-division cache, so a page costs at most 8 lookups
+        try:
+            return current_conditions(batch.storage_location)
+        except WeatherUnavailable:
+            return None
+
+
+class OwnedBatchField(serializers.PrimaryKeyRelatedField):
+    """
+    Batch reference limited to the requesting farmer's own batches.
+    Bulk endpoints preload those batches into context['owned_batches'] so
+    each item validates without its own query.
+    """
+    def get_queryset(self):
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return CropBatch.objects.none()
+        return CropBatch.objects.filter(farmer=request.user)
+
+    def to_internal_value(self, data):
+        owned_batches = self.context.get('owned_batches')
+        if owned_batches is None:
+            return super().to_internal_value(data)
+        try:
+            pk = CropBatch._meta.pk.to_python(data)
+        except (DjangoValidationError, TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in owned_batches:
+            self.fail('does_not_exist', pk_value=data)
+        return owned_batches[pk]
 
 
 class AchievementSerializer(serializers.ModelSerializer):
@@ -56,13 +122,73 @@ class AchievementSerializer(serializers.ModelSerializer):
         fields = ['id', 'badge_name', 'earned_at']
 
 class LossEventSerializer(serializers.ModelSerializer):
+    batch = OwnedBatchField()
+
     class Meta:
         model = LossEvent
         fields = ['id', 'batch', 'event_date', 'loss_type', 'estimated_loss_kg', 'description']
         read_only_fields = ['id']
 
 class InterventionSerializer(serializers.ModelSerializer):
+    batch = OwnedBatchField()
+
     class Meta:
         model = Intervention
         fields = ['id', 'batch', 'intervention_type', 'applied_date', 'success', 'notes']
         read_only_fields = ['id']
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'dataset', 'format', 'all_farmers', 'status', 'progress',
+                  'rows_written', 'total_rows', 'error', 'created_at', 'finished_at']
+        read_only_fields = ['id', 'status', 'progress', 'rows_written', 'total_rows',
+                            'error', 'created_at', 'finished_at']
+
+    def validate_all_farmers(self, value):
+        if value and not self.context['request'].user.is_staff:
+            raise serializers.ValidationError("Only staff can export every farmer's data.")
+        return value
+
+
+class HealthScanSerializer(serializers.ModelSerializer):
+    """
+    Upload with multipart `batch` + `image`; the image arrives already staged
+    on disk and hashed by core.scans.HashingUploadHandler.
+    """
+    batch = OwnedBatchField()
+    image = serializers.FileField(allow_empty_file=False)
+    thumbnail = serializers.FileField(read_only=True)
+
+    class Meta:
+        model = HealthScan
+        fields = ['id', 'batch', 'image', 'thumbnail', 'content_hash', 'size', 'status',
+                  'detection_result', 'confidence', 'error', 'created_at', 'processed_at']
+        read_only_fields = ['id', 'thumbnail', 'content_hash', 'size', 'status', 'detection_result',
+                            'confidence', 'error', 'created_at', 'processed_at']
+
+    def validate_image(self, upload):
+        if getattr(upload, 'content_hash', None) is None:
+            raise serializers.ValidationError("Upload the image as multipart form data.")
+        return upload
+
+
+class LossRollupSerializer(serializers.ModelSerializer):
+    loss_rate = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = LossRollup
+        fields = ['month', 'division', 'storage_type', 'loss_type', 'loss_event_count',
+                  'total_loss_kg', 'batch_count', 'batch_weight_kg', 'loss_rate']
+        read_only_fields = fields
+
+
+class RiskPredictionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RiskPrediction
+        fields = ['batch', 'risk_score', 'risk_level', 'etcl_hours', 'risk_factors',
+                  'recommendations', 'updated_at']
+        read_only_fields = fields
@@ -0,0 +1,184 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .achievements import forget_earned_badges
+from .authentication import forget_authenticated_user
+from .cache import invalidate_user
+from . import counters, rollups
+from .models import User, CropBatch, LossEvent, Intervention, Achievement, HealthScan, Tombstone
+from .scans import delete_unused_files
+
+
+def _deleting_user(origin):
+    """True when the delete cascades from a User, whose tombstones go with it"""
+    if isinstance(origin, QuerySet):
+        return origin.model is User
+    return isinstance(origin, User)
+
+
+def _cascades_from_batch(sender, origin):
+    """True for a loss event, intervention or scan deleted along with its batch"""
+    if sender not in (LossEvent, Intervention, HealthScan):
+        return False
+    if isinstance(origin, QuerySet):
+        return origin.model is CropBatch
+    return isinstance(origin, CropBatch)
+
+
+def _batch_owner_id(instance, origin=None):
+    if isinstance(origin, CropBatch) and origin.pk == instance.batch_id:
+        return origin.farmer_id
+    if type(instance).batch.is_cached(instance):
+        return instance.batch.farmer_id
+    return CropBatch.objects.filter(pk=instance.batch_id).values_list('farmer_id', flat=True).first()
+
+
+def _owner_id(sender, instance, origin=None):
+    if sender is CropBatch:
+        return instance.farmer_id
+    if sender is Achievement:
+        return instance.user_id
+    return _batch_owner_id(instance, origin)
+
+
+@receiver(pre_delete, sender=CropBatch)
+def record_child_deletes(sender, instance, origin=None, **kwargs):
+    """
+    Mark the rollup months of a batch's loss events and tombstone its loss
+    events and interventions before the cascade removes them, in one insert
+    each rather than one per child from their post_delete receivers
+    """
+    events = list(LossEvent.objects.filter(batch=instance).values_list('pk', 'event_date'))
+    rollups.mark_stale({rollups.month_of(event_date) for _, event_date in events if event_date})
+    if _deleting_user(origin):
+        return
+    tombstones = [Tombstone(user_id=instance.farmer_id, model_name='LossEvent', object_id=pk) for pk, _ in events]
+    tombstones += [
+        Tombstone(user_id=instance.farmer_id, model_name='Intervention', object_id=pk)
+        for pk in Intervention.objects.filter(batch=instance).values_list('pk', flat=True)
+    ]
+    Tombstone.objects.bulk_create(tombstones)
+
+
+@receiver(pre_delete, sender=CropBatch)
+def delete_child_scan_files(sender, instance, **kwargs):
+    """Remove the files of a batch's scans once the delete commits, checked in one query"""
+    names = [name for pair in HealthScan.objects.filter(batch=instance).values_list('image', 'thumbnail')
+             for name in pair]
+    if names:
+        transaction.on_commit(lambda: delete_unused_files(names))
+
+
+@receiver(post_delete, sender=HealthScan)
+def delete_scan_files(sender, instance, origin=None, **kwargs):
+    """Remove a deleted scan's image and thumbnail once no other scan shares them"""
+    if _cascades_from_batch(sender, origin):
+        return
+    names = [instance.image.name, instance.thumbnail.name]
+    transaction.on_commit(lambda: delete_unused_files(names))
+
+
+@receiver(post_delete, sender=CropBatch)
+@receiver(post_delete, sender=LossEvent)
+@receiver(post_delete, sender=Intervention)
+@receiver(post_delete, sender=Achievement)
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    """Log deletes of synced models for /api/sync/"""
+    if _deleting_user(origin) or _cascades_from_batch(sender, origin):
+        return
+    user_id = _owner_id(sender, instance, origin)
+    if user_id is None:
+        return
+    Tombstone.objects.create(user_id=user_id, model_name=sender.__name__, object_id=instance.pk)
+    invalidate_user(user_id)
+
+
+@receiver(post_save, sender=CropBatch)
+@receiver(post_save, sender=LossEvent)
+@receiver(post_save, sender=Intervention)
+@receiver(post_save, sender=Achievement)
+def invalidate_cached_responses(sender, instance, **kwargs):
+    """Any write to a farmer's data retires their cached responses"""
+    invalidate_user(_owner_id(sender, instance))
+
+
+@receiver(post_save, sender=User)
+def invalidate_profile_responses(sender, instance, **kwargs):
+    """The JSON export embeds the farmer's email"""
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """Profile edits, deactivation and password changes reach authentication at once"""
+    forget_authenticated_user(instance.pk)
+
+
+@receiver(post_save, sender=Achievement)
+@receiver(post_delete, sender=Achievement)
+def forget_cached_badges(sender, instance, **kwargs):
+    """Badges granted or revoked outside the rules engine (e.g. the admin)"""
+    forget_earned_badges(instance.user_id)
+
+
+@receiver(post_init, sender=CropBatch)
+@receiver(post_init, sender=LossEvent)
+@receiver(post_init, sender=Intervention)
+def snapshot_counted(sender, instance, **kwargs):
+    counters.remember(instance)
+
+
+@receiver(pre_save, sender=CropBatch)
+@receiver(pre_save, sender=LossEvent)
+@receiver(pre_save, sender=Intervention)
+def ensure_counted_snapshot(sender, instance, **kwargs):
+    """Rows loaded without the counted columns need their stored values for the diff"""
+    if not instance._state.adding and not hasattr(instance, '_counted'):
+        instance._counted = counters.load_snapshot(instance)
+
+
+@receiver(post_save, sender=CropBatch)
+@receiver(post_save, sender=LossEvent)
+@receiver(post_save, sender=Intervention)
+def update_counters(sender, instance, created, raw=False, **kwargs):
+    """Runs inside the atomic save of CountedSaveMixin"""
+    if raw:
+        # fixtures carry their own counter values
+        return
+    if created:
+        counters.record_created([instance])
+    else:
+        counters.record_updated([instance])
+
+
+@receiver(post_delete, sender=CropBatch)
+@receiver(post_delete, sender=LossEvent)
+@receiver(post_delete, sender=Intervention)
+def release_counters(sender, instance, origin=None, **kwargs):
+    """Skipped when the parent row is being deleted along with this one"""
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model is User or (origin_model is CropBatch and sender is not CropBatch):
+        return
+    counters.record_deleted([instance])
+
+
+@receiver(post_init, sender=LossEvent)
+def snapshot_rollup_month(sender, instance, **kwargs):
+    rollups.remember_month(instance)
+
+
+@receiver(post_save, sender=LossEvent)
+def mark_moved_rollup_month(sender, instance, created, **kwargs):
+    if not created:
+        rollups.record_moves([instance])
+
+
+@receiver(post_delete, sender=LossEvent)
+def mark_deleted_rollup_month(sender, instance, origin=None, **kwargs):
+    """Deletes leave no updated_at, so the refresh is told about the month here"""
+    # a batch delete marks its events' months in record_child_deletes
+    if instance.event_date and not _cascades_from_batch(sender, origin):
+        rollups.mark_stale([rollups.month_of(instance.event_date)])
@@ -1,3 +1,2197 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+import msgpack
+import numpy as np
+from PIL import Image
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import authentication, counters, revocation, risk, weather
+from .achievements import award_badges
+from .cache import get_cache, get_metrics, invalidate_user
+from .export_jobs import run_export_job
+from .exports import aiter_blocks, stream_ndjson
+from .lru import LRUCache
+from .models import (User, CropBatch, LossEvent, Intervention, Achievement, ExportJob, Tombstone, LossRollup,
+                     RiskPrediction, WeatherData, HealthScan, RevokedToken, StaleRollupMonth)
+from .parsers import MessagePackParser
+from .reads import serialize_many
+from .renderers import msgpack_default
+from .rollups import refresh_loss_rollups
+from .scans import process_scans
+from .schema import get_schema, get_schema_json
+from .serializers import CropBatchSerializer, InterventionSerializer, LossEventSerializer
+from .views import CropBatchViewSet
+from .sync import encode_token
+from .weather_import import import_weather
+
+
+def make_farmer(email='farmer@example.com', phone='01700000000'):
+    return User.objects.create_user(
+        email=email, username=email.split('@')[0], phone_number=phone, password='pass1234!'
+    )
+
+
+def make_batches(farmer, count, location='DHAKA', storage_type='JUTE_BAG',
+                 harvest_date=None, losses_per_batch=1, interventions_per_batch=1):
+    batches = CropBatch.objects.bulk_create([
+        CropBatch(
+            farmer=farmer,
+            estimated_weight=500,
+            harvest_date=harvest_date or date(2025, 1, 1),
+            storage_location=location,
+            storage_type=storage_type,
+        )
+        for _ in range(count)
+    ])
+    loss_events = LossEvent.objects.bulk_create([
+        LossEvent(batch=batch, event_date=batch.harvest_date, loss_type='PEST', estimated_loss_kg=2.5)
+        for batch in batches for _ in range(losses_per_batch)
+    ])
+    interventions = Intervention.objects.bulk_create([
+        Intervention(batch=batch, intervention_type='PESTICIDE', applied_date=batch.harvest_date,
+                     success=(i % 2 == 0))
+        for batch in batches for i in range(interventions_per_batch)
+    ])
+    # bulk_create() sends no signals; maintain counters and retire cached
+    # responses as the API would
+    for instances in (batches, loss_events, interventions):
+        counters.record_created(instances)
+    invalidate_user(farmer.pk)
+    return batches
+
+
+class DashboardTests(APITestCase):
+    url = reverse('crop-batch-dashboard')
+
+    def setUp(self):
+        self.farmer = make_farmer()
+        self.client.force_authenticate(self.farmer)
+
+    def test_totals_and_breakdowns(self):
+        make_batches(self.farmer, 3, location='DHAKA', losses_per_batch=2, interventions_per_batch=2)
+        make_batches(self.farmer, 1, location='SYLHET', storage_type='SILO')
+        other = make_farmer('other@example.com', '01800000000')
+        make_batches(other, 5)
+
+        data = self.client.get(self.url).data
+
+        self.assertEqual(data['total_batches'], 4)
+        self.assertEqual(data['active_batches'], 4)
+        self.assertEqual(data['total_loss_events'], 7)
+        self.assertEqual(data['total_loss_kg'], 17.5)
+        self.assertEqual(data['total_interventions'], 7)
+        self.assertEqual(data['successful_interventions'], 4)
+        locations = {row['storage_location']: row for row in data['by_storage_location']}
+        self.assertEqual(locations['DHAKA']['batches'], 3)
+        self.assertEqual(locations['DHAKA']['loss_kg'], 15.0)
+        self.assertEqual(locations['SYLHET']['loss_event_count'], 1)
+        types = {row['storage_type']: row['batches'] for row in data['by_storage_type']}
+        self.assertEqual(types, {'JUTE_BAG': 3, 'SILO': 1})
+        self.assertEqual(list(data['by_loss_type']), [{'loss_type': 'PEST', 'loss_event_count': 7, 'loss_kg': 17.5}])
+
+    def test_date_range_filter(self):
+        make_batches(self.farmer, 2, harvest_date=date(2025, 1, 10))
+        make_batches(self.farmer, 3, harvest_date=date(2025, 3, 10))
+
+        data = self.client.get(self.url, {'from': '2025-03-01', 'to': '2025-03-31'}).data
+
+        self.assertEqual(data['total_batches'], 3)
+        self.assertEqual(data['total_loss_events'], 3)
+        self.assertEqual(data['total_interventions'], 3)
+
+    def test_invalid_date_rejected(self):
+        response = self.client.get(self.url, {'from': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_independent_of_batch_count(self):
+        make_batches(self.farmer, 1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url)
+
+        make_batches(self.farmer, 50, location='KHULNA', losses_per_batch=3, interventions_per_batch=2)
+        make_batches(self.farmer, 50, harvest_date=date.today() - timedelta(days=3))
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(self.url)
+
+        self.assertEqual(len(small), len(large))
+        # one validator query for the ETag plus four aggregates
+        self.assertLessEqual(len(large), 5)
+
+
+class StreamingExportTests(APITestCase):
+    url = reverse('crop-batch-export-data')
+
+    def setUp(self):
+        self.farmer = make_farmer()
+        self.client.force_authenticate(self.farmer)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_streams_batches(self):
+        make_batches(self.farmer, 3)
+        response = self.client.get(self.url, {'format': 'csv'})
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = self.read(response).splitlines()
+        self.assertEqual(lines[0], 'Crop Type,Weight (kg),Harvest Date,Storage Location,'
+                                   'Storage Type,Status,Created At')
+        self.assertEqual(len(lines), 4)
+
+    def test_csv_with_includes_repeats_batch_per_related_row(self):
+        make_batches(self.farmer, 2, losses_per_batch=2, interventions_per_batch=1)
+        response = self.client.get(self.url, {'format': 'csv', 'include': 'loss_events,interventions'})
+
+        lines = self.read(response).splitlines()
+        self.assertTrue(lines[0].startswith('Batch ID,'))
+        self.assertEqual(len(lines), 1 + 2 * 3)
+
+    def test_ndjson_matches_serializer(self):
+        batch = make_batches(self.farmer, 1, losses_per_batch=2)[0]
+        # microseconds that millisecond rounding would lose
+        CropBatch.objects.filter(pk=batch.pk).update(
+            created_at=datetime(2025, 1, 1, 6, 30, 15, 123456, tzinfo=dt_timezone.utc))
+        response = self.client.get(self.url, {'format': 'ndjson', 'include': 'loss_events'})
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 1)
+        expected = json.loads(json.dumps(CropBatchSerializer(CropBatch.objects.get(pk=batch.pk)).data))
+        loss_events = rows[0].pop('loss_events')
+        self.assertEqual(rows[0], expected)
+        self.assertTrue(rows[0]['created_at'].startswith('2025-01-01T12:30:15.123456'))
+        self.assertEqual(len(loss_events), 2)
+        self.assertEqual(loss_events[0]['batch'], str(batch.id))
+
+    async def test_asgi_gets_an_async_stream(self):
+        await sync_to_async(make_batches)(self.farmer, 3)
+        token = str(RefreshToken.for_user(self.farmer).access_token)
+        response = await self.async_client.get(self.url, {'format': 'csv'},
+                                               headers={'Authorization': f'JWT {token}'})
+
+        self.assertTrue(response.is_async)
+        self.assertEqual(len(b''.join([block async for block in response]).splitlines()), 4)
+
+    async def test_async_blocks(self):
+        lines = iter(['a\n', 'b\n', 'c\n'])
+        self.assertEqual([block async for block in aiter_blocks(lines, block_lines=2)], ['a\nb\n', 'c\n'])
+
+    def test_unknown_include_rejected(self):
+        response = self.client.get(self.url, {'format': 'ndjson', 'include': 'weather'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('include', response.json())
+
+    def test_related_rows_fetched_per_chunk_not_per_batch(self):
+        make_batches(self.farmer, 30, losses_per_batch=2, interventions_per_batch=2)
+        batches = CropBatch.objects.filter(farmer=self.farmer)
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(stream_ndjson(batches, ['loss_events', 'interventions'], chunk_size=10))
+
+        self.assertEqual(len(rows), 30)
+        # one batch query plus one query per relation for each of the three chunks
+        self.assertEqual(len(queries), 1 + 3 * 2)
+
+
+class ExportJobTests(APITestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.farmer = make_farmer()
+        self.client.force_authenticate(self.farmer)
+
+    def create_job(self, **data):
+        response = self.client.post(reverse('export-job-list'), data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return ExportJob.objects.get(pk=response.data['id'])
+
+    def download(self, job, **headers):
+        return self.client.get(reverse('export-job-download', args=[job.pk]), **headers)
+
+    def test_worker_writes_gzip_csv_for_requesting_farmer(self):
+        make_batches(self.farmer, 7)
+        make_batches(make_farmer('other@example.com', '01800000000'), 3)
+        job = self.create_job(dataset='BATCHES', format='CSV')
+
+        call_command('run_export_jobs', chunk_size=3, stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'COMPLETED')
+        self.assertEqual(job.rows_written, 7)
+        self.assertEqual(job.progress, 100.0)
+        response = self.download(job)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'farmer_id'])
+        self.assertEqual(len(lines), 8)
+
+    def test_staff_can_export_everyone(self):
+        make_batches(self.farmer, 2)
+        make_batches(make_farmer('other@example.com', '01800000000'), 3)
+        response = self.client.post(reverse('export-job-list'),
+                                    {'dataset': 'LOSS_EVENTS', 'all_farmers': True}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        self.farmer.is_staff = True
+        self.farmer.save()
+        job = self.create_job(dataset='LOSS_EVENTS', format='NDJSON', all_farmers=True)
+        run_export_job(job)
+
+        with gzip.open(default_storage.path(job.file.name), 'rt') as handle:
+            rows = [json.loads(line) for line in handle]
+        self.assertEqual(len(rows), 5)
+
+    def test_resume_after_crash_truncates_partial_chunk(self):
+        make_batches(self.farmer, 10)
+        job = self.create_job(dataset='BATCHES', format='CSV')
+        run_export_job(job, chunk_size=4)
+        path = default_storage.path(job.file.name)
+        content = open(path, 'rb').read()
+        first_member = zlib.decompressobj(wbits=31)
+        first_member.decompress(content)
+        first_member_end = len(content) - len(first_member.unused_data)
+
+        # Rewind to the state saved after the first chunk and leave a
+        # half-written member behind, as a killed worker would.
+        ExportJob.objects.filter(pk=job.pk).update(
+            status='RUNNING', rows_written=4, bytes_written=first_member_end,
+            last_pk=CropBatch.objects.order_by('pk').values_list('pk', flat=True)[3],
+            updated_at=timezone.now() - timedelta(hours=1),
+        )
+        with open(path, 'ab') as handle:
+            handle.write(gzip.compress(b'garbage')[:10])
+
+        call_command('run_export_jobs', chunk_size=4, stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'COMPLETED')
+        self.assertEqual(job.rows_written, 10)
+        self.assertEqual(open(path, 'rb').read(), content)
+
+    def test_range_download(self):
+        make_batches(self.farmer, 5)
+        job = self.create_job()
+        run_export_job(job)
+        content = open(default_storage.path(job.file.name), 'rb').read()
+
+        response = self.download(job, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(content)}')
+        self.assertEqual(b''.join(response.streaming_content), content[10:20])
+
+        response = self.download(job, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), content[-5:])
+
+        response = self.download(job, HTTP_RANGE=f'bytes={len(content)}-')
+        self.assertEqual(response.status_code, 416)
+
+        # an invalid range is ignored rather than refused
+        response = self.download(job, HTTP_RANGE='bytes=5-3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), content)
+
+    def test_download_before_completion_is_404(self):
+        job = self.create_job()
+        self.assertEqual(self.download(job).status_code, 404)
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.farmer = make_farmer()
+        self.client.force_authenticate(self.farmer)
+
+    def walk(self, url, params):
+        items, pages = [], 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            items.extend(response.data['results'])
+            pages += 1
+            if not response.data['next']:
+                return items, pages, response
+            response = self.client.get(response.data['next'])
+
+    def test_loss_events_walk_every_row_once_with_tied_dates(self):
+        # five batches sharing one event_date -> 15 loss events with equal sort keys
+        make_batches(self.farmer, 5, losses_per_batch=3)
+        make_batches(self.farmer, 2, harvest_date=date(2025, 2, 1), losses_per_batch=2)
+        url = reverse('loss-event-list')
+
+        items, pages, _ = self.walk(url, {'pagination': 'cursor'})
+
+        self.assertEqual((len(items), pages), (19, 2))
+        expected = list(LossEvent.objects.order_by('-event_date', '-id').values_list('id', flat=True))
+        self.assertEqual([item['id'] for item in items], [str(pk) for pk in expected])
+
+    def test_batches_forward_and_back(self):
+        make_batches(self.farmer, 12)
+        url = reverse('crop-batch-list')
+
+        items, pages, last = self.walk(url, {'pagination': 'cursor', 'page_size': 5})
+        self.assertEqual((len(items), pages), (12, 3))
+        self.assertEqual(len({item['id'] for item in items}), 12)
+
+        previous = self.client.get(last.data['previous']).data
+        self.assertEqual([b['id'] for b in previous['results']], [b['id'] for b in items[5:10]])
+        self.assertIsNotNone(previous['next'])
+
+    def test_page_query_count_is_constant(self):
+        make_batches(self.farmer, 40, interventions_per_batch=1)
+        url = reverse('intervention-list')
+        first = self.client.get(url, {'pagination': 'cursor'})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first.data['next'])
+        # the ETag validator query plus the page itself, which never counts
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('COUNT', queries[-1]['sql'].upper())
+
+    def test_page_number_mode_is_default(self):
+        make_batches(self.farmer, 3)
+        response = self.client.get(reverse('crop-batch-list'))
+        self.assertEqual(response.data['count'], 3)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('crop-batch-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryBudgetTests(APITestCase):
+    """
+    Every route gets a fixed query budget, checked against a farmer with a
+    handful of rows and one with hundreds of batches and thousands of events.
+    Both must fit the same budget, so an N+1 fails here before it ships.
+    Budgets are measured under the default settings.
+    """
+    password = 'pass1234!'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.light = make_farmer('light@example.com', '01700000001')
+        make_batches(cls.light, 3, losses_per_batch=2, interventions_per_batch=2)
+        cls.heavy = make_farmer('heavy@example.com', '01700000002')
+        for i, (location, _) in enumerate(CropBatch.LOCATION_CHOICES):
+            make_batches(cls.heavy, 40, location=location, harvest_date=date(2024, 1 + i, 1),
+                         losses_per_batch=8, interventions_per_batch=4)
+        for farmer in (cls.light, cls.heavy):
+            Achievement.objects.create(user=farmer, badge_name='FIRST_HARVEST')
+            ExportJob.objects.create(requested_by=farmer)
+        cls.staff = make_farmer('staff@example.com', '01700000003')
+        User.objects.filter(pk=cls.staff.pk).update(is_staff=True)
+        cls.staff.refresh_from_db()
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def routes(self, farmer):
+        batch = farmer.crop_batches.first()
+        loss_event = LossEvent.objects.filter(batch__farmer=farmer).first()
+        intervention = Intervention.objects.filter(batch__farmer=farmer).first()
+        achievement = farmer.achievements.first()
+        export_job = farmer.export_jobs.first()
+        new_batch = {'estimated_weight': 250, 'harvest_date': '2025-01-01',
+                     'storage_location': 'DHAKA', 'storage_type': 'SILO'}
+        # deleted below, with as many children as the farmer's other batches
+        children = farmer.crop_batches.first().loss_events.count()
+        doomed, = make_batches(farmer, 1, losses_per_batch=children, interventions_per_batch=children)
+        doomed_loss_event = LossEvent.objects.filter(batch__farmer=farmer).exclude(batch=doomed).last()
+        doomed_intervention = Intervention.objects.filter(batch__farmer=farmer).exclude(batch=doomed).last()
+        photo = make_photo(size=(64, 48))
+        # (name, method, path, payload, budget)
+        return [
+            ('api root', 'get', '/api/', None, 1),
+            ('user list', 'get', '/api/users/', None, 3),
+            ('user detail', 'get', f'/api/users/{farmer.id}/', None, 2),
+            ('batch list', 'get', '/api/crops/batches/', None, 4),
+            ('batch list (cursor)', 'get', '/api/crops/batches/?pagination=cursor', None, 3),
+            ('batch detail', 'get', f'/api/crops/batches/{batch.id}/', None, 2),
+            ('batch create', 'post', '/api/crops/batches/', new_batch, 4),
+            ('batch update', 'patch', f'/api/crops/batches/{batch.id}/', {'notes': 'dry'}, 3),
+            ('batch replace', 'put', f'/api/crops/batches/{batch.id}/', {**new_batch, 'notes': 'dry'}, 3),
+            ('batch bulk create', 'post', '/api/crops/batches/bulk/', [new_batch] * 20, 5),
+            ('batch active', 'get', '/api/crops/batches/active/', None, 3),
+            ('batch completed', 'get', '/api/crops/batches/completed/', None, 3),
+            ('dashboard', 'get', '/api/crops/batches/dashboard/', None, 6),
+            ('dashboard (range)', 'get', '/api/crops/batches/dashboard/?from=2024-01-01&to=2024-06-30', None, 6),
+            ('batch risk', 'get', f'/api/crops/batches/{batch.id}/risk/', None, 9),
+            ('risk summary', 'get', '/api/crops/batches/risk/', None, 5),
+            ('export json', 'get', '/api/crops/batches/export_data/?format=json', None, 2),
+            ('export csv', 'get', '/api/crops/batches/export_data/?format=csv', None, 2),
+            ('export ndjson', 'get', '/api/crops/batches/export_data/?format=ndjson', None, 2),
+            ('achievement list', 'get', '/api/achievements/', None, 4),
+            ('achievement detail', 'get', f'/api/achievements/{achievement.id}/', None, 2),
+            ('loss event list', 'get', '/api/loss-events/', None, 4),
+            ('loss event detail', 'get', f'/api/loss-events/{loss_event.id}/', None, 2),
+            ('loss event create', 'post', '/api/loss-events/',
+             {'batch': str(batch.id), 'event_date': '2025-01-02', 'loss_type': 'PEST',
+              'estimated_loss_kg': 3}, 6),
+            ('loss event bulk create', 'post', '/api/loss-events/bulk/',
+             [{'batch': str(batch.id), 'event_date': '2025-01-03', 'loss_type': 'PEST',
+               'estimated_loss_kg': 1}] * 20, 6),
+            ('loss event bulk update', 'patch', '/api/loss-events/bulk/',
+             [{'id': str(loss_event.id), 'estimated_loss_kg': 4}], 6),
+            ('intervention list', 'get', '/api/interventions/', None, 4),
+            ('intervention detail', 'get', f'/api/interventions/{intervention.id}/', None, 2),
+            ('intervention create', 'post', '/api/interventions/',
+             {'batch': str(batch.id), 'intervention_type': 'PESTICIDE', 'applied_date': '2025-01-02',
+              'success': False}, 4),
+            ('intervention bulk update', 'patch', '/api/interventions/bulk/',
+             [{'id': str(intervention.id), 'success': True}], 6),
+            ('scan upload', 'post', '/api/crops/scans/', {'batch': str(batch.id), 'image': photo}, 8),
+            ('scan list', 'get', '/api/crops/scans/', None, 3),
+            ('scan status', 'get', '/api/crops/scans/status/', None, 2),
+            ('export job list', 'get', '/api/exports/', None, 3),
+            ('export job detail', 'get', f'/api/exports/{export_job.id}/', None, 2),
+            ('export job create', 'post', '/api/exports/', {'dataset': 'BATCHES'}, 2),
+            ('sync (full)', 'get', '/api/sync/', None, 5),
+            ('sync (delta)', 'get', f'/api/sync/?since={encode_token(timezone.now() - timedelta(days=1))}',
+             None, 6),
+            ('auth me', 'get', '/api/auth/users/me/', None, 1),
+            ('auth me update', 'patch', '/api/auth/users/me/', {'first_name': 'Rahim'}, 2),
+            ('auth user list', 'get', '/api/auth/users/', None, 3),
+            ('auth user detail', 'get', f'/api/auth/users/{farmer.id}/', None, 2),
+            ('loss event delete', 'delete', f'/api/loss-events/{doomed_loss_event.id}/', None, 7),
+            ('intervention delete', 'delete', f'/api/interventions/{doomed_intervention.id}/', None, 6),
+            ('batch delete', 'delete', f'/api/crops/batches/{doomed.id}/', None, 16),
+        ]
+
+    def staff_routes(self, suffix):
+        farmers = [{'email': f'import-{suffix}-{i}@example.org', 'phone_number': f'0150{suffix}{i:06d}'}
+                   for i in range(10)]
+        return [
+            ('cache stats', 'get', '/api/cache-stats/', None, 1),
+            ('db stats', 'get', '/api/db-stats/', None, 1),
+            ('loss rollups', 'get', '/api/analytics/loss-rollups/', None, 4),
+            ('farmer import', 'post', '/api/users/import/', farmers, 7),
+        ]
+
+    def anonymous_routes(self, farmer, token):
+        # (name, method, path, payload, budget)
+        return [
+            ('jwt create', 'post', '/api/auth/jwt/create/',
+             {'email': farmer.email, 'password': self.password}, 1),
+            ('jwt refresh', 'post', '/api/auth/jwt/refresh/', {'refresh': str(token)}, 2),
+            ('jwt verify', 'post', '/api/auth/jwt/verify/', {'token': str(token.access_token)}, 0),
+            ('user register', 'post', '/api/auth/users/',
+             {'email': f'new-{farmer.username}@example.com', 'username': f'new-{farmer.username}',
+              'phone_number': f'019{farmer.username[:8]}', 'password': 'Harvest-2025!'}, 4),
+            ('swagger schema', 'get', '/api/swagger/?format=openapi', None, 0),
+        ]
+
+    def count_queries(self, method, path, payload):
+        multipart = isinstance(payload, dict) and any(hasattr(value, 'read') for value in payload.values())
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, payload, format='multipart' if multipart else 'json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f'{method.upper()} {path}: {response.status_code}')
+        return len(queries)
+
+    def measure(self, farmer, routes, authenticate):
+        counts = {}
+        for name, method, path, payload, budget in routes:
+            if authenticate:
+                token = RefreshToken.for_user(farmer)
+                self.client.credentials(HTTP_AUTHORIZATION=f'JWT {token.access_token}')
+            else:
+                self.client.credentials()
+            counts[name] = (self.count_queries(method, path, payload), budget)
+        return counts
+
+    def assert_budgets(self, light, heavy):
+        for name, (light_count, budget) in light.items():
+            heavy_count = heavy[name][0]
+            with self.subTest(route=name):
+                self.assertEqual(light_count, heavy_count,
+                                 f'{name}: query count grows with data ({light_count} -> {heavy_count})')
+                self.assertLessEqual(heavy_count, budget, f'{name}: over budget')
+
+    def test_authenticated_routes(self):
+        light = self.measure(self.light, self.routes(self.light), authenticate=True)
+        heavy = self.measure(self.heavy, self.routes(self.heavy), authenticate=True)
+        self.assert_budgets(light, heavy)
+
+    def test_staff_routes(self):
+        refresh_loss_rollups()
+        before = self.measure(self.staff, self.staff_routes(1), authenticate=True)
+        make_batches(make_farmer('more@example.com', '01700000004'), 100, losses_per_batch=5)
+        refresh_loss_rollups()
+        after = self.measure(self.staff, self.staff_routes(2), authenticate=True)
+        self.assert_budgets(before, after)
+
+    def test_auth_routes(self):
+        # the revocation filter is loaded once per process, not per refresh
+        revocation.get_filter().sync()
+        light = self.measure(self.light, self.anonymous_routes(self.light, RefreshToken.for_user(self.light)),
+                             authenticate=False)
+        heavy = self.measure(self.heavy, self.anonymous_routes(self.heavy, RefreshToken.for_user(self.heavy)),
+                             authenticate=False)
+        self.assert_budgets(light, heavy)
+
+
+class BulkWriteTests(APITestCase):
+    def setUp(self):
+        self.farmer = make_farmer()
+        self.client.force_authenticate(self.farmer)
+        self.batch = make_batches(self.farmer, 1, losses_per_batch=0, interventions_per_batch=0)[0]
+
+    def loss_event(self, **overrides):
+        item = {'batch': str(self.batch.id), 'event_date': '2025-02-01', 'loss_type': 'PEST',
+                'estimated_loss_kg': 1.5}
+        item.update(overrides)
+        return item
+
+    def test_bulk_create_loss_events_reports_errors_per_item(self):
+        other_batch = make_batches(make_farmer('other@example.com', '01800000000'), 1)[0]
+        items = [self.loss_event() for _ in range(5)]
+        items.insert(2, self.loss_event(batch=str(other_batch.id)))
+        items.append(self.loss_event(loss_type='FLOOD'))
+
+        response = self.client.post(reverse('loss-event-bulk'), items, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(len(response.data['created']), 5)
+        self.assertEqual([error['index'] for error in response.data['errors']], [2, 6])
+        self.assertIn('batch', response.data['errors'][0]['errors'])
+        self.assertEqual(LossEvent.objects.filter(batch=self.batch).count(), 5)
+        self.assertFalse(LossEvent.objects.filter(batch=other_batch, event_date='2025-02-01').exists())
+
+    def test_bulk_create_query_count_is_flat(self):
+        def sync(count):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse('loss-event-bulk'),
+                                            [self.loss_event() for _ in range(count)], format='json')
+            self.assertEqual(response.status_code, 201)
+            return len(queries)
+
+        self.assertEqual(sync(5), sync(100))
+
+    def test_bulk_create_batches_awards_first_harvest_once(self):
+        self.batch.delete()
+        items = [{'estimated_weight': 100 + i, 'harvest_date': '2025-01-01',
+                  'storage_location': 'RANGPUR', 'storage_type': 'SILO'} for i in range(3)]
+
+        response = self.client.post(reverse('crop-batch-bulk'), items, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.farmer.crop_batches.count(), 3)
+        self.assertEqual(list(self.farmer.achievements.values_list('badge_name', flat=True)), ['FIRST_HARVEST'])
+
+    def test_bulk_create_interventions_awards_risk_mitigator(self):
+        items = [{'batch': str(self.batch.id), 'intervention_type': 'PESTICIDE',
+                  'applied_date': '2025-02-02', 'success': success} for success in (False, True, True)]
+
+        response = self.client.post(reverse('intervention-bulk'), items, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.farmer.achievements.filter(badge_name='RISK_MITIGATOR').count(), 1)
+
+    def test_bulk_update(self):
+        events = LossEvent.objects.bulk_create([
+            LossEvent(batch=self.batch, event_date=date(2025, 1, 5), loss_type='PEST', estimated_loss_kg=1)
+            for _ in range(3)
+        ])
+        other_event = make_batches(make_farmer('other@example.com', '01800000000'), 1)[0].loss_events.first()
+        items = [{'id': str(event.id), 'estimated_loss_kg': 9} for event in events]
+        items.append({'id': str(other_event.id), 'estimated_loss_kg': 9})
+        items.append({'id': str(events[0].id), 'loss_type': 'FLOOD'})
+
+        response = self.client.patch(reverse('loss-event-bulk'), items, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([error['index'] for error in response.data['errors']], [3, 4])
+        self.assertEqual(set(LossEvent.objects.filter(batch=self.batch).values_list('estimated_loss_kg', flat=True)), {9})
+        other_event.refresh_from_db()
+        self.assertEqual(other_event.estimated_loss_kg, 2.5)
+
+    def test_bulk_update_batches_touches_updated_at(self):
+        before = self.batch.updated_at
+        response = self.client.patch(reverse('crop-batch-bulk'),
+                                     [{'id': str(self.batch.id), 'status': 'COMPLETED'}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.status, 'COMPLETED')
+        self.assertGreater(self.batch.updated_at, before)
+
+    def test_rejects_non_list_body(self):
+        response = self.client.post(reverse('loss-event-bulk'), self.loss_event(), format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(SYNC_TOKEN_OVERLAP=timedelta(0))
+class DeltaSyncTests(APITestCase):
+    url = reverse('sync-list')
+
+    def setUp(self):
+        self.farmer = make_farmer()
+        self.client.force_authenticate(self.farmer)
+        self.batches = make_batches(self.farmer, 3, losses_per_batch=2, interventions_per_batch=1)
+        Achievement.objects.create(user=self.farmer, badge_name='FIRST_HARVEST')
+
+    def sync(self, token=None):
+        response = self.client.get(self.url, {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_initial_sync_is_full(self):
+        data = self.sync()
+        self.assertTrue(data['full'])
+        self.assertEqual(len(data['crop_batches']['updated']), 3)
+        self.assertEqual(len(data['loss_events']['updated']), 6)
+        self.assertEqual(len(data['interventions']['updated']), 3)
+        self.assertEqual(len(data['achievements']['updated']), 1)
+
+    def test_delta_contains_only_changes_and_deletes(self):
+        token = self.sync()['token']
+        other = make_farmer('other@example.com', '01800000000')
+        make_batches(other, 2)
+
+        self.client.patch(reverse('crop-batch-detail', args=[self.batches[0].id]), {'status': 'COMPLETED'})
+        loss_event = self.batches[1].loss_events.first()
+        self.client.patch(reverse('loss-event-detail', args=[loss_event.id]), {'estimated_loss_kg': 7})
+        doomed = self.batches[2]
+        doomed_children = [str(pk) for pk in doomed.loss_events.values_list('id', flat=True)]
+        self.client.delete(reverse('crop-batch-detail', args=[doomed.id]))
+
+        data = self.sync(token)
+
+        self.assertFalse(data['full'])
+        # batches[1] changed through its loss event's counter contribution
+        self.assertCountEqual([b['id'] for b in data['crop_batches']['updated']],
+                              [str(self.batches[0].id), str(self.batches[1].id)])
+        self.assertEqual(data['crop_batches']['deleted'], [str(doomed.id)])
+        self.assertEqual([e['id'] for e in data['loss_events']['updated']], [str(loss_event.id)])
+        self.assertCountEqual(data['loss_events']['deleted'], doomed_children)
+        self.assertEqual(len(data['interventions']['deleted']), 1)
+        self.assertEqual(data['achievements'], {'updated': [], 'deleted': []})
+
+        self.assertEqual(self.sync(data['token'])['crop_batches'], {'updated': [], 'deleted': []})
+
+    def test_batch_delete_tombstones_children_in_one_insert(self):
+        batch, = make_batches(self.farmer, 1, losses_per_batch=50, interventions_per_batch=50)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(reverse('crop-batch-detail', args=[batch.id]))
+        self.assertEqual(response.status_code, 204)
+        inserts = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "core_tombstone"')]
+        # the children's and the batch's own
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(Tombstone.objects.filter(model_name='LossEvent').count(), 50)
+        self.assertEqual(Tombstone.objects.filter(model_name='Intervention').count(), 50)
+
+    def test_batch_delete_query_count_is_independent_of_children(self):
+        def delete(children):
+            batch, = make_batches(self.farmer, 1, losses_per_batch=children, interventions_per_batch=children)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.delete(reverse('crop-batch-detail', args=[batch.id]))
+            return len(queries)
+
+        self.assertEqual(delete(1), delete(50))
+        self.assertEqual(set(StaleRollupMonth.objects.values_list('month', flat=True)), {date(2025, 1, 1)})
+
+    def test_deleting_a_user_leaves_no_tombstones(self):
+        self.farmer.delete()
+        self.assertFalse(Tombstone.objects.exists())
+
+    def test_expired_token_forces_full_sync(self):
+        token = encode_token(timezone.now() - timedelta(days=365))
+        self.assertTrue(self.sync(token)['full'])
+
+    def test_invalid_token(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'garbage'}).status_code, 400)
+
+    def test_delta_query_count_is_independent_of_dataset_size(self):
+        token = self.sync()['token']
+        make_batches(self.farmer, 100, losses_per_batch=3)
+        token_after_bulk = self.sync(token)['token']
+        with CaptureQueriesContext(connection) as queries:
+            data = self.sync(token_after_bulk)
+        self.assertEqual(data['crop_batches']['updated'], [])
+        self.assertEqual(len(queries), 5)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.farmer = make_farmer()
+        self.client.force_authenticate(self.farmer)
+        self.batches = make_batches(self.farmer, 3)
+
+    def test_if_none_match_returns_304_without_serializing(self):
+        url = reverse('crop-batch-list')
+        etag = self.client.get(url)['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+
+    def test_writes_change_the_etag(self):
+        url = reverse('crop-batch-dashboard')
+        etag = self.client.get(url)['ETag']
+
+        LossEvent.objects.create(batch=self.batches[0], event_date=date(2025, 1, 3),
+                                 loss_type='PEST', estimated_loss_kg=1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        self.batches[1].delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_query_string(self):
+        url = reverse('loss-event-list')
+        first = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url, {'pagination': 'cursor'})['ETag'], first)
+
+    def test_if_modified_since_is_not_trusted(self):
+        # max(updated_at) survives the delete, so a date validator would answer 304
+        url = reverse('crop-batch-list')
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+
+        self.batches[0].delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_other_farmers_writes_do_not_invalidate(self):
+        url = reverse('intervention-list')
+        etag = self.client.get(url)['ETag']
+        make_batches(make_farmer('other@example.com', '01800000000'), 2)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.farmer = make_farmer()
+        self.client.force_authenticate(self.farmer)
+        self.batches = make_batches(self.farmer, 3, losses_per_batch=1, interventions_per_batch=0)
+
+    def test_second_read_is_served_from_cache(self):
+        url = reverse('crop-batch-dashboard')
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url)
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(len(queries), 1)  # only the ETag validator
+        stats = get_metrics()['CropBatchViewSet.dashboard']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_entries_are_per_user_and_query(self):
+        url = reverse('crop-batch-active')
+        self.client.get(url)
+        self.assertEqual(self.client.get(url, {'page': 1})['X-Cache'], 'MISS')
+
+        other = make_farmer('other@example.com', '01800000000')
+        self.client.force_authenticate(other)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json(), [])
+
+    def test_writes_through_the_api_invalidate(self):
+        url = reverse('crop-batch-dashboard')
+        self.assertEqual(self.client.get(url).data['total_loss_events'], 3)
+
+        self.client.post(reverse('loss-event-list'), {'batch': str(self.batches[0].id),
+                                                      'event_date': '2025-01-02', 'loss_type': 'PEST',
+                                                      'estimated_loss_kg': 1})
+        self.assertEqual(self.client.get(url).data['total_loss_events'], 4)
+
+        self.client.post(reverse('loss-event-bulk'), [{'batch': str(self.batches[0].id),
+                                                       'event_date': '2025-01-02', 'loss_type': 'PEST',
+                                                       'estimated_loss_kg': 1}], format='json')
+        self.assertEqual(self.client.get(url).data['total_loss_events'], 5)
+
+        self.client.delete(reverse('crop-batch-detail', args=[self.batches[0].id]))
+        self.assertEqual(self.client.get(url).data['total_batches'], 2)
+
+    def test_model_writes_invalidate(self):
+        url = reverse('crop-batch-completed')
+        self.assertEqual(self.client.get(url).json(), [])
+
+        batch = self.batches[1]
+        batch.status = 'COMPLETED'
+        batch.save()
+        self.assertEqual(len(self.client.get(url).json()), 1)
+
+        export_url = reverse('crop-batch-export-data')
+        self.client.get(export_url)
+        Achievement.objects.create(user=self.farmer, badge_name='DATA_KEEPER')
+        self.assertEqual(self.client.get(export_url)['X-Cache'], 'MISS')
+
+    def test_profile_edits_invalidate_the_export(self):
+        url = reverse('crop-batch-export-data')
+        self.client.get(url)
+        self.farmer.email = 'renamed@example.com'
+        self.farmer.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['farmer_email'], 'renamed@example.com')
+
+    def test_streamed_exports_are_not_cached(self):
+        url = reverse('crop-batch-export-data')
+        self.client.get(url, {'format': 'csv'})
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertTrue(response.streaming)
+
+    def test_cache_stats_are_staff_only(self):
+        self.assertEqual(self.client.get(reverse('cache-stats-list')).status_code, 403)
+        self.farmer.is_staff = True
+        self.farmer.save()
+        self.assertIn('CropBatchViewSet.dashboard', self.client.get(reverse('cache-stats-list')).data)
+
+
+class AchievementRuleTests(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.farmer = make_farmer()
+        self.batch = make_batches(self.farmer, 1, losses_per_batch=0, interventions_per_batch=0)[0]
+        self.client.force_authenticate(self.farmer)
+
+    def badges(self, farmer=None):
+        return set((farmer or self.farmer).achievements.values_list('badge_name', flat=True))
+
+    def log_loss(self, loss_type='PEST'):
+        return self.client.post(reverse('loss-event-list'), {
+            'batch': str(self.batch.id), 'event_date': '2025-01-02',
+            'loss_type': loss_type, 'estimated_loss_kg': 1,
+        })
+
+    def test_first_batch_awards_first_harvest_without_counting(self):
+        new_batch = {'estimated_weight': 250, 'harvest_date': '2025-01-01',
+                     'storage_location': 'DHAKA', 'storage_type': 'SILO'}
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('crop-batch-list'), new_batch)
+        self.assertEqual(self.badges(), {'FIRST_HARVEST'})
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+        # once earned, the cached badge set short-circuits the rule
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('crop-batch-list'), new_batch)
+        self.assertFalse(any('core_achievement' in query['sql'] for query in queries))
+
+    def test_weather_analyst_after_three_weather_losses(self):
+        self.log_loss('WEATHER')
+        self.log_loss('PEST')
+        self.log_loss('WEATHER')
+        self.assertNotIn('WEATHER_ANALYST', self.badges())
+        self.log_loss('WEATHER')
+        self.assertIn('WEATHER_ANALYST', self.badges())
+
+    def test_data_keeper_after_ten_records(self):
+        for _ in range(9):
+            self.log_loss()
+        self.assertNotIn('DATA_KEEPER', self.badges())
+        self.client.post(reverse('intervention-list'), {
+            'batch': str(self.batch.id), 'intervention_type': 'PESTICIDE',
+            'applied_date': '2025-01-02', 'success': False,
+        })
+        self.assertIn('DATA_KEEPER', self.badges())
+
+    def test_risk_mitigator_when_intervention_marked_successful(self):
+        response = self.client.post(reverse('intervention-list'), {
+            'batch': str(self.batch.id), 'intervention_type': 'PESTICIDE',
+            'applied_date': '2025-01-02', 'success': False,
+        })
+        self.assertNotIn('RISK_MITIGATOR', self.badges())
+        self.client.patch(reverse('intervention-detail', args=[response.data['id']]), {'success': True})
+        self.assertIn('RISK_MITIGATOR', self.badges())
+
+    def test_awarding_an_earned_badge_is_a_no_op(self):
+        award_badges({'FIRST_HARVEST': [self.farmer.pk]})
+        award_badges({'FIRST_HARVEST': [self.farmer.pk]})
+        self.assertEqual(self.farmer.achievements.count(), 1)
+
+    def test_revoked_badge_is_forgotten(self):
+        self.client.post(reverse('crop-batch-list'), {'estimated_weight': 250, 'harvest_date': '2025-01-01',
+                                                      'storage_location': 'DHAKA', 'storage_type': 'SILO'})
+        self.farmer.achievements.all().delete()
+        self.client.post(reverse('crop-batch-list'), {'estimated_weight': 250, 'harvest_date': '2025-01-01',
+                                                      'storage_location': 'DHAKA', 'storage_type': 'SILO'})
+        self.assertEqual(self.badges(), {'FIRST_HARVEST'})
+
+    def test_evaluate_badges_command_backfills(self):
+        other = make_farmer('other@example.com', '01800000000')
+        make_batches(other, 2, losses_per_batch=5, interventions_per_batch=2)
+        LossEvent.objects.bulk_create([
+            LossEvent(batch=self.batch, event_date=date(2025, 1, 2), loss_type='WEATHER', estimated_loss_kg=1)
+            for _ in range(3)
+        ])
+        Achievement.objects.create(user=other, badge_name='FIRST_HARVEST')
+
+        out = io.StringIO()
+        call_command('evaluate_badges', batch_size=1, stdout=out)
+
+        self.assertEqual(self.badges(), {'FIRST_HARVEST', 'WEATHER_ANALYST'})
+        self.assertEqual(self.badges(other), {'FIRST_HARVEST', 'RISK_MITIGATOR', 'DATA_KEEPER'})
+        self.assertIn('awarded 4 badges', out.getvalue())
+
+
+class CounterTests(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.farmer = make_farmer()
+        self.batch, self.other_batch = make_batches(self.farmer, 2, losses_per_batch=2, interventions_per_batch=2)
+        self.client.force_authenticate(self.farmer)
+
+    def counts(self, batch):
+        batch.refresh_from_db()
+        return (batch.loss_event_count, batch.total_loss_kg,
+                batch.intervention_count, batch.successful_intervention_count)
+
+    def test_api_writes_keep_batch_counters(self):
+        self.assertEqual(self.counts(self.batch), (2, 5.0, 2, 1))
+
+        response = self.client.post(reverse('loss-event-list'), {
+            'batch': str(self.batch.id), 'event_date': '2025-01-02', 'loss_type': 'PEST', 'estimated_loss_kg': 4})
+        event_url = reverse('loss-event-detail', args=[response.data['id']])
+        self.assertEqual(self.counts(self.batch), (3, 9.0, 2, 1))
+
+        self.client.patch(event_url, {'estimated_loss_kg': 1})
+        self.assertEqual(self.counts(self.batch), (3, 6.0, 2, 1))
+
+        self.client.patch(event_url, {'batch': str(self.other_batch.id)})
+        self.assertEqual(self.counts(self.batch), (2, 5.0, 2, 1))
+        self.assertEqual(self.counts(self.other_batch), (3, 6.0, 2, 1))
+
+        self.client.delete(event_url)
+        self.assertEqual(self.counts(self.other_batch), (2, 5.0, 2, 1))
+
+        intervention = self.batch.interventions.filter(success=False).first()
+        self.client.patch(reverse('intervention-detail', args=[intervention.id]), {'success': True})
+        self.assertEqual(self.counts(self.batch), (2, 5.0, 2, 2))
+
+    def test_counter_changes_reach_conditional_gets_and_sync(self):
+        url = reverse('crop-batch-list')
+        etag = self.client.get(url)['ETag']
+        token = self.client.get(reverse('sync-list')).data['token']
+
+        self.client.post(reverse('loss-event-list'), {
+            'batch': str(self.batch.id), 'event_date': '2025-01-02', 'loss_type': 'PEST', 'estimated_loss_kg': 4})
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        listed = {row['id']: row for row in response.json()['results']}
+        self.assertEqual(listed[str(self.batch.id)]['loss_event_count'], 3)
+        updated = self.client.get(reverse('sync-list'), {'since': token}).data['crop_batches']['updated']
+        self.assertEqual({b['id']: b['loss_event_count'] for b in updated}[str(self.batch.id)], 3)
+
+    def test_bulk_writes_keep_batch_counters(self):
+        items = [{'batch': str(batch.id), 'event_date': '2025-01-03', 'loss_type': 'PEST',
+                  'estimated_loss_kg': 1} for batch in (self.batch, self.batch, self.other_batch)]
+        created = self.client.post(reverse('loss-event-bulk'), items, format='json').data['created']
+        self.assertEqual(self.counts(self.batch)[:2], (4, 7.0))
+        self.assertEqual(self.counts(self.other_batch)[:2], (3, 6.0))
+
+        self.client.patch(reverse('loss-event-bulk'),
+                          [{'id': created[2]['id'], 'batch': str(self.batch.id), 'estimated_loss_kg': 3}],
+                          format='json')
+        self.assertEqual(self.counts(self.batch)[:2], (5, 10.0))
+        self.assertEqual(self.counts(self.other_batch)[:2], (2, 5.0))
+
+    def test_user_batch_count(self):
+        self.farmer.refresh_from_db()
+        self.assertEqual(self.farmer.batch_count, 2)
+        self.client.post(reverse('crop-batch-list'), {'estimated_weight': 250, 'harvest_date': '2025-01-01',
+                                                      'storage_location': 'DHAKA', 'storage_type': 'SILO'})
+        self.client.delete(reverse('crop-batch-detail', args=[self.batch.id]))
+        self.farmer.refresh_from_db()
+        self.assertEqual(self.farmer.batch_count, 2)
+
+    def test_stale_instance_save_keeps_counters(self):
+        stale = CropBatch.objects.get(pk=self.batch.pk)
+        self.client.post(reverse('loss-event-list'), {
+            'batch': str(self.batch.id), 'event_date': '2025-01-02', 'loss_type': 'PEST', 'estimated_loss_kg': 1})
+        stale.notes = 'moved to silo'
+        stale.save()
+        self.assertEqual(self.counts(self.batch)[0], 3)
+
+    def test_deferred_instance_save_writes_only_loaded_fields(self):
+        partial = CropBatch.objects.only('id', 'notes').get(pk=self.batch.pk)
+        CropBatch.objects.filter(pk=self.batch.pk).update(storage_location='KHULNA')
+        partial.notes = 'moved to silo'
+        with CaptureQueriesContext(connection) as queries:
+            partial.save()
+
+        # only the receivers' owner lookup reads anything; no deferred field is reloaded
+        selects = [q['sql'].split(' FROM ')[0] for q in queries if q['sql'].startswith('SELECT')]
+        self.assertTrue(all(set(re.findall(r'"core_cropbatch"\."(\w+)"', sql)) <= {'id', 'farmer_id'}
+                            for sql in selects), selects)
+        self.batch.refresh_from_db()
+        self.assertEqual((self.batch.notes, self.batch.storage_location), ('moved to silo', 'KHULNA'))
+
+    def test_recompute_counters_repairs_drift(self):
+        CropBatch.objects.filter(pk=self.batch.pk).update(loss_event_count=40, total_loss_kg=1.5)
+        User.objects.filter(pk=self.farmer.pk).update(batch_count=0)
+
+        out = io.StringIO()
+        call_command('recompute_counters', batch_size=1, stdout=out)
+
+        self.assertEqual(self.counts(self.batch), (2, 5.0, 2, 1))
+        self.assertEqual(self.counts(self.other_batch), (2, 5.0, 2, 1))
+        self.farmer.refresh_from_db()
+        self.assertEqual(self.farmer.batch_count, 2)
+        self.assertIn('checked 2, repaired 1', out.getvalue())
+
+    def test_dashboard_from_counters_matches_ranged_aggregate(self):
+        url = reverse('crop-batch-dashboard')
+        from_counters = self.client.get(url).json()
+        aggregated = self.client.get(url, {'from': '2000-01-01', 'to': '2100-01-01'}).json()
+        self.assertEqual(from_counters, aggregated)
+
+
+@override_settings(LOSS_ROLLUP_OVERLAP=timedelta(0))
+class LossRollupTests(APITestCase):
+    url = reverse('loss-rollup-list')
+
+    def setUp(self):
+        self.farmer = make_farmer()
+        self.other = make_farmer('other@example.com', '01800000000')
+        # 2 batches x 2 loss events of 2.5 kg, all PEST in January 2025
+        self.batches = make_batches(self.farmer, 2, location='DHAKA', losses_per_batch=2)
+        make_batches(self.other, 1, location='DHAKA', losses_per_batch=1)
+        make_batches(self.other, 1, location='SYLHET', storage_type='SILO', harvest_date=date(2025, 2, 3))
+        self.staff = make_farmer('staff@example.com', '01900000000')
+        self.staff.is_staff = True
+        self.staff.save()
+
+    def rollups(self):
+        return {
+            (r.month.strftime('%Y-%m'), r.division, r.storage_type, r.loss_type):
+                (r.loss_event_count, r.total_loss_kg, r.batch_count, r.batch_weight_kg)
+            for r in LossRollup.objects.all()
+        }
+
+    def test_full_refresh(self):
+        months = refresh_loss_rollups()
+
+        self.assertEqual(months, [date(2025, 1, 1), date(2025, 2, 1)])
+        self.assertEqual(self.rollups(), {
+            ('2025-01', 'DHAKA', 'JUTE_BAG', 'PEST'): (5, 12.5, 3, 1500.0),
+            ('2025-02', 'SYLHET', 'SILO', 'PEST'): (1, 2.5, 1, 500.0),
+        })
+
+    def test_incremental_refresh_only_touches_changed_months(self):
+        # a batch without events: the counter update on its first one re-rolls no other month
+        empty_batch, = make_batches(self.farmer, 1, location='DHAKA', losses_per_batch=0, interventions_per_batch=0)
+        refresh_loss_rollups()
+        self.assertEqual(refresh_loss_rollups(), [])
+
+        self.client.force_authenticate(self.farmer)
+        self.client.post(reverse('loss-event-list'), {
+            'batch': str(empty_batch.id), 'event_date': '2025-03-31', 'loss_type': 'WEATHER',
+            'estimated_loss_kg': 10})
+
+        self.assertEqual(refresh_loss_rollups(), [date(2025, 3, 1)])
+        self.assertEqual(self.rollups()[('2025-03', 'DHAKA', 'JUTE_BAG', 'WEATHER')], (1, 10.0, 1, 500.0))
+
+    def test_deletes_and_moves_are_picked_up(self):
+        refresh_loss_rollups()
+        self.client.force_authenticate(self.other)
+        sylhet_batch = self.other.crop_batches.get(storage_location='SYLHET')
+
+        # moving the batch re-rolls its month under the new division
+        self.client.patch(reverse('crop-batch-detail', args=[sylhet_batch.id]), {'storage_location': 'KHULNA'})
+        refresh_loss_rollups()
+        self.assertIn(('2025-02', 'KHULNA', 'SILO', 'PEST'), self.rollups())
+        self.assertNotIn(('2025-02', 'SYLHET', 'SILO', 'PEST'), self.rollups())
+
+        # a date moved to another month leaves the old month stale
+        event = sylhet_batch.loss_events.get()
+        self.client.patch(reverse('loss-event-detail', args=[event.id]), {'event_date': '2025-04-01'})
+        self.assertEqual(refresh_loss_rollups(), [date(2025, 2, 1), date(2025, 4, 1)])
+        self.assertNotIn(('2025-02', 'KHULNA', 'SILO', 'PEST'), self.rollups())
+
+        # deleting a batch re-rolls the months of its loss events
+        dhaka_batch = self.other.crop_batches.get(storage_location='DHAKA')
+        self.client.delete(reverse('crop-batch-detail', args=[dhaka_batch.id]))
+        refresh_loss_rollups()
+        self.assertEqual(self.rollups()[('2025-01', 'DHAKA', 'JUTE_BAG', 'PEST')], (4, 10.0, 2, 1000.0))
+
+    def test_refresh_command(self):
+        out = io.StringIO()
+        call_command('refresh_loss_rollups', '--full', stdout=out)
+        self.assertIn('Refreshed 2 months (2025-01 .. 2025-02)', out.getvalue())
+
+    def test_endpoint_is_staff_only_and_filters(self):
+        refresh_loss_rollups()
+        self.client.force_authenticate(self.farmer)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        self.client.force_authenticate(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'division': 'sylhet', 'from': '2025-02', 'to': '2025-02'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        row = response.data['results'][0]
+        self.assertEqual((row['month'], row['loss_rate']), ('2025-02-01', 0.5))
+        self.assertLessEqual(len(queries), 3)
+
+        self.assertEqual(self.client.get(self.url, {'from': '2025-13'}).status_code, 400)
+
+
+class RiskScoringTests(APITestCase):
+    today = date(2025, 7, 1)
+
+    def setUp(self):
+        self.farmer = make_farmer()
+        self.client.force_authenticate(self.farmer)
+        WeatherData.objects.bulk_create([
+            WeatherData(location='SYLHET', forecast_date=date(2025, 6, 30), temperature=34, humidity=92),
+            WeatherData(location='SYLHET', forecast_date=date(2025, 7, 2), temperature=20, humidity=40),
+            WeatherData(location='RAJSHAHI', forecast_date=date(2025, 6, 30), temperature=18, humidity=50),
+        ])
+
+    def test_score_arrays(self):
+        score, levels, etcl, dominant, _ = risk.score_arrays(
+            np.array([1.0, 0.45, 1.0]),          # open area, silo, open area
+            np.array([200.0, 0.0, 0.0]),         # days stored
+            np.array([35.0, 35.0, 20.0]),        # temperature
+            np.array([90.0, 90.0, 60.0]),        # humidity
+        )
+        self.assertEqual(score.tolist(), [1.0, 0.45 * 0.75, 0.0])
+        self.assertEqual([risk.RISK_LEVELS[level] for level in levels], ['CRITICAL', 'MEDIUM', 'LOW'])
+        self.assertEqual(etcl.tolist(), [0, round(720 * (1 - 0.3375) ** 2), 720])
+        self.assertEqual(dominant[1], 0)  # humidity
+
+    def test_vectorized_pass_over_a_million_batches(self):
+        # the arithmetic alone; writing the predictions back is timed below
+        count = 1_000_000
+        rng = np.random.default_rng(0)
+        started = time.perf_counter()
+        score, levels, _, _, _ = risk.score_arrays(
+            rng.choice(list(risk.STORAGE_EXPOSURE.values()), count), rng.uniform(0, 300, count),
+            rng.uniform(15, 38, count), rng.uniform(40, 100, count),
+        )
+        self.assertEqual(len(score), count)
+        self.assertLess(time.perf_counter() - started, 5)
+
+    def test_scores_active_batches_with_division_weather(self):
+        hot = make_batches(self.farmer, 2, location='SYLHET', storage_type='OPEN_AREA',
+                           harvest_date=date(2025, 1, 1))
+        cool = make_batches(self.farmer, 1, location='RAJSHAHI', storage_type='SILO',
+                            harvest_date=date(2025, 6, 30))[0]
+        done = make_batches(self.farmer, 1, location='DHAKA')[0]
+        RiskPrediction.objects.create(batch=done, risk_level='HIGH', etcl_hours=1)
+        CropBatch.objects.filter(pk=done.pk).update(status='COMPLETED')
+
+        scored, _ = risk.score_batches(today=self.today)
+
+        self.assertEqual(scored, 3)
+        predictions = {p.batch_id: p for p in RiskPrediction.objects.all()}
+        self.assertEqual(set(predictions), {hot[0].id, hot[1].id, cool.id})
+        self.assertEqual(predictions[hot[0].id].risk_level, 'CRITICAL')
+        self.assertEqual(predictions[hot[0].id].risk_factors['humidity'], 92.0)
+        self.assertEqual(predictions[hot[0].id].risk_factors['days_stored'], 181)
+        self.assertEqual(predictions[cool.id].risk_level, 'LOW')
+        self.assertEqual(predictions[cool.id].recommendations, [])
+
+        # a second run updates in place
+        CropBatch.objects.filter(pk=cool.pk).update(storage_type='OPEN_AREA', storage_location='SYLHET')
+        risk.score_batches(today=self.today)
+        self.assertEqual(RiskPrediction.objects.count(), 3)
+        self.assertEqual(RiskPrediction.objects.get(batch=cool).risk_level, 'HIGH')
+
+    def test_persists_twenty_thousand_batches(self):
+        make_batches(self.farmer, 20_000, location='SYLHET', storage_type='OPEN_AREA',
+                     losses_per_batch=0, interventions_per_batch=0)
+        scored, elapsed = risk.score_batches(today=self.today)
+
+        self.assertEqual(scored, 20_000)
+        self.assertEqual(RiskPrediction.objects.filter(risk_level='CRITICAL').count(), 20_000)
+        # about 1s here; bulk_create took three times as long
+        self.assertLess(elapsed, 10)
+
+    def test_query_count_does_not_grow_with_batches(self):
+        def run(count):
+            CropBatch.objects.all().delete()
+            make_batches(self.farmer, count, losses_per_batch=0, interventions_per_batch=0)
+            with CaptureQueriesContext(connection) as queries:
+                risk.score_batches(today=self.today)
+            return len(queries)
+
+        self.assertEqual(run(3), run(60))
+
+    def test_batch_risk_endpoint_scores_on_demand(self):
+        batch = make_batches(self.farmer, 1, location='SYLHET', storage_type='OPEN_AREA')[0]
+        response = self.client.get(reverse('crop-batch-risk', args=[batch.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['batch'], batch.id)
+        self.assertTrue(RiskPrediction.objects.filter(batch=batch).exists())
+
+        other_batch = make_batches(make_farmer('other@example.com', '01800000000'), 1)[0]
+        self.assertEqual(self.client.get(reverse('crop-batch-risk', args=[other_batch.id])).status_code, 404)
+
+        batch.status = 'COMPLETED'
+        batch.save()
+        RiskPrediction.objects.all().delete()
+        self.assertEqual(self.client.get(reverse('crop-batch-risk', args=[batch.id])).status_code, 404)
+
+    def test_farmer_risk_summary(self):
+        make_batches(self.farmer, 2, location='SYLHET', storage_type='OPEN_AREA', harvest_date=date(2025, 1, 1))
+        make_batches(self.farmer, 1, location='RAJSHAHI', storage_type='SILO', harvest_date=date(2025, 6, 30))
+        make_batches(make_farmer('other@example.com', '01800000000'), 4)
+        risk.score_batches(today=self.today)
+
+        response = self.client.get(reverse('crop-batch-risk-summary'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['levels'], {'LOW': 1, 'MEDIUM': 0, 'HIGH': 0, 'CRITICAL': 2})
+        self.assertEqual([row['risk_level'] for row in response.data['results']], ['CRITICAL', 'CRITICAL', 'LOW'])
+        self.assertIn('ETag', response)
+
+    def test_score_risk_command(self):
+        make_batches(self.farmer, 3)
+        out = io.StringIO()
+        call_command('score_risk', chunk_size=2, stdout=out)
+        self.assertIn('Scored 3 batches', out.getvalue())
+        self.assertEqual(RiskPrediction.objects.count(), 3)
+
+
+class WeatherImportTests(APITestCase):
+    def write(self, name, content, compress=False):
+        directory = tempfile.mkdtemp()
+        path = f'{directory}/{name}'
+        opener = gzip.open if compress else open
+        with opener(path, 'wt', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def test_imports_csv_with_duplicates_and_bad_rows(self):
+        path = self.write('weather.csv', (
+            "location,date,temperature,humidity,rainfall_probability,wind_speed,description\n"
+            "DHAKA,2024-01-01,20,70,10,5,Clear\n"
+            "Dhaka,2024-01-01,21,72,,,Hazy\n"        # same day by display name: last one wins
+            "SYLHET,2024-01-01,18,90,80,12,Rain\n"
+            "NOWHERE,2024-01-01,18,90,80,12,Rain\n"
+            "SYLHET,2024-01-02,18,150,0,0,\n"
+            "SYLHET,not-a-date,18,90,0,0,\n"
+        ))
+
+        stats = import_weather(path, batch_size=3)
+
+        self.assertEqual((stats.read, stats.written, stats.duplicates, stats.invalid), (6, 2, 1, 3))
+        self.assertEqual(len(stats.errors), 3)
+        self.assertTrue(stats.errors[0].startswith('line 5:'))
+        dhaka = WeatherData.objects.get(location='DHAKA', forecast_date=date(2024, 1, 1))
+        self.assertEqual((dhaka.temperature, dhaka.rainfall_probability, dhaka.description), (21, 0, 'Hazy'))
+        self.assertEqual(WeatherData.objects.count(), 2)
+
+    def test_reimport_updates_in_place(self):
+        WeatherData.objects.create(location='KHULNA', forecast_date=date(2024, 3, 1), temperature=30, humidity=60)
+        path = self.write('weather.jsonl.gz', "\n".join([
+            json.dumps({'location': 'KHULNA', 'forecast_date': '2024-03-01', 'temperature': 31, 'humidity': 65}),
+            '',
+            '{broken',
+            json.dumps({'location': 'KHULNA', 'forecast_date': '2024-03-02', 'temperature': 29, 'humidity': 61}),
+        ]), compress=True)
+
+        stats = import_weather(path)
+
+        self.assertEqual((stats.read, stats.written, stats.invalid), (3, 2, 1))
+        self.assertEqual(WeatherData.objects.count(), 2)
+        self.assertEqual(WeatherData.objects.get(forecast_date=date(2024, 3, 1)).humidity, 65)
+
+    def test_query_count_grows_with_batches_not_rows(self):
+        def run(days, batch_size):
+            WeatherData.objects.all().delete()
+            path = self.write('weather.csv', "location,date,temperature,humidity\n" + "".join(
+                f"RANGPUR,{date(2020, 1, 1) + timedelta(days=day)},25,70\n" for day in range(days)
+            ))
+            with CaptureQueriesContext(connection) as queries:
+                import_weather(path, batch_size=batch_size)
+            self.assertEqual(WeatherData.objects.count(), days)
+            return len(queries)
+
+        self.assertEqual(run(10, 100), run(90, 100))
+
+    def test_import_weather_command(self):
+        path = self.write('weather.csv', "location,date,temperature,humidity\nBARISAL,2024-05-01,29,80\n")
+        out = io.StringIO()
+        call_command('import_weather', path, batch_size=500, stdout=out, stderr=io.StringIO())
+        self.assertIn('upserted 1', out.getvalue())
+        self.assertTrue(WeatherData.objects.filter(location='BARISHAL').exists())
+        self.assertIn('rows/s', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('import_weather', self.write('weather.txt', ''), stdout=io.StringIO())
+
+
+class CountingWeatherProvider(weather.WeatherProvider):
+    delay = 0
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def current(self, location):
+        with self.lock:
+            self.calls.append(location)
+        time.sleep(self.delay)
+        return {'location': location, 'date': '2025-07-01', 'temperature': 30.0, 'humidity': 80.0,
+                'rainfall_probability': 0.0, 'wind_speed': 0.0, 'description': f'call {len(self.calls)}'}
+
+
+@override_settings(WEATHER_PROVIDER='core.tests.CountingWeatherProvider')
+class WeatherCacheTests(APITestCase):
+    def setUp(self):
+        weather.clear_weather_cache()
+        self.provider = weather.get_provider()
+
+    def test_two_tier_lookup(self):
+        first = weather.current_conditions('DHAKA')
+        self.assertEqual(first['description'], 'call 1')
+        self.assertEqual(weather.current_conditions('DHAKA'), first)
+
+        # a fresh process (empty LRU) is served by the shared cache
+        weather._local_cache().clear()
+        self.assertEqual(weather.current_conditions('DHAKA'), first)
+        self.assertEqual(self.provider.calls, ['DHAKA'])
+
+        weather.current_conditions('SYLHET')
+        self.assertEqual(self.provider.calls, ['DHAKA', 'SYLHET'])
+
+    def test_lru_evicts_and_expires(self):
+        lru = LRUCache(maxsize=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+        expired = LRUCache(maxsize=2, ttl=0)
+        expired.set('a', 1)
+        self.assertIs(expired.get('a', weather.MISSING), weather.MISSING)
+
+    def test_concurrent_misses_fetch_once(self):
+        self.provider.delay = 0.1
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(weather.current_conditions('KHULNA')))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 8)
+        self.assertEqual(self.provider.calls, ['KHULNA'])
+
+    def test_waits_for_another_workers_fetch(self):
+        cache = get_cache()
+        cache.add('hg:weather:RANGPUR:lock', 1)
+        fetched = {'location': 'RANGPUR', 'description': 'from another worker'}
+        threading.Timer(0.1, lambda: cache.set('hg:weather:RANGPUR', fetched)).start()
+
+        self.assertEqual(weather.current_conditions('RANGPUR'), fetched)
+        self.assertEqual(self.provider.calls, [])
+        cache.delete('hg:weather:RANGPUR:lock')
+
+    @override_settings(WEATHER_PROVIDER='core.weather.StoredWeatherProvider')
+    def test_stored_provider_uses_latest_row(self):
+        today = date.today()
+        WeatherData.objects.bulk_create([
+            WeatherData(location='DHAKA', forecast_date=today - timedelta(days=1), temperature=30, humidity=70),
+            WeatherData(location='DHAKA', forecast_date=today, temperature=32, humidity=75),
+            WeatherData(location='DHAKA', forecast_date=today + timedelta(days=1), temperature=20, humidity=50),
+        ])
+        conditions = weather.current_conditions('DHAKA')
+        self.assertEqual((conditions['date'], conditions['temperature']), (today.isoformat(), 32))
+        self.assertIsNone(weather.current_conditions('SYLHET'))
+
+
+class BatchWeatherTests(APITestCase):
+    def setUp(self):
+        weather.clear_weather_cache()
+        self.farmer = make_farmer()
+        self.client.force_authenticate(self.farmer)
+        make_batches(self.farmer, 3, location='SYLHET')
+
+    def test_batches_embed_current_weather_on_request(self):
+        plain = self.client.get(reverse('crop-batch-list'))
+        self.assertNotIn('current_weather', plain.data['results'][0])
+
+        response = self.client.get(reverse('crop-batch-list'), {'include': 'weather'})
+        conditions = response.data['results'][0]['current_weather']
+        self.assertEqual(conditions['location'], 'SYLHET')
+        self.assertEqual(conditions['description'], 'Heavy rain')
+
+        active = self.client.get(reverse('crop-batch-active'), {'include': 'weather'})
+        self.assertEqual(active.data[0]['current_weather'], conditions)
+
+    def test_weather_lookup_is_shared_across_batches(self):
+        url = reverse('crop-batch-list')
+        self.client.get(url, {'include': 'weather'})
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(url, {'include': 'weather'})
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get(url)
+        self.assertEqual(len(warm), len(plain))
+
+    def test_etag_follows_weather(self):
+        url = reverse('crop-batch-list')
+        etag = self.client.get(url, {'include': 'weather'})['ETag']
+        self.assertEqual(self.client.get(url, {'include': 'weather'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with override_settings(WEATHER_PROVIDER='core.tests.CountingWeatherProvider'):
+            self.assertEqual(
+                self.client.get(url, {'include': 'weather'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cached_lists_follow_weather(self):
+        get_cache().clear()
+        url = reverse('crop-batch-active')
+        first = self.client.get(url, {'include': 'weather'})
+        self.assertEqual(self.client.get(url, {'include': 'weather'})['X-Cache'], 'HIT')
+
+        with override_settings(WEATHER_PROVIDER='core.tests.CountingWeatherProvider'):
+            response = self.client.get(url, {'include': 'weather'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotEqual(response.data[0]['current_weather'], first.data[0]['current_weather'])
+
+    @override_settings(WEATHER_FIXTURE_PATH='/nonexistent/weather.json')
+    def test_unavailable_weather_is_null(self):
+        response = self.client.get(reverse('crop-batch-list'), {'include': 'weather'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['results'][0]['current_weather'])
+
+
+def make_photo(colour=(220, 200, 120), size=(1200, 900), image_format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, colour).save(buffer, image_format)
+    buffer.seek(0)
+    buffer.name = 'scan.jpg'
+    return buffer
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.tasks = 0
+
+    def submit(self, *args, **kwargs):
+        self.tasks += 1
+        return super().submit(*args, **kwargs)
+
+
+class HealthScanTests(APITestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.farmer = make_farmer()
+        self.client.force_authenticate(self.farmer)
+        self.batch, self.other_batch, self.third_batch = make_batches(self.farmer, 3)
+
+    def upload(self, batch, photo):
+        photo.seek(0)
+        return self.client.post(reverse('health-scan-list'), {'batch': str(batch.id), 'image': photo},
+                                format='multipart')
+
+    def process(self):
+        with CountingExecutor() as executor:
+            result = process_scans(executor)
+        return result, executor.tasks
+
+    def test_upload_is_staged_hashed_and_queued(self):
+        photo = make_photo()
+        response = self.upload(self.batch, photo)
+
+        self.assertEqual(response.status_code, 202, response.content)
+        scan = HealthScan.objects.get(pk=response.data['id'])
+        digest = hashlib.sha256(photo.getvalue()).hexdigest()
+        self.assertEqual((scan.status, scan.detection_result), ('QUEUED', 'PENDING'))
+        self.assertEqual((scan.content_hash, scan.size), (digest, len(photo.getvalue())))
+        self.assertEqual(scan.image.name, f'health_scans/{digest[:2]}/{digest}.jpg')
+        self.assertTrue(default_storage.exists(scan.image.name))
+        self.assertEqual(os.listdir(default_storage.path('health_scans/incoming')), [])
+
+    def test_duplicate_photos_are_detected_by_hash(self):
+        photo = make_photo()
+        first = self.upload(self.batch, photo)
+        again = self.upload(self.batch, photo)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.data['id'], first.data['id'])
+
+        # the same photo on another batch is a new scan sharing the stored file
+        elsewhere = self.upload(self.other_batch, photo)
+        self.assertEqual(elsewhere.status_code, 202)
+        self.assertEqual(elsewhere.data['image'], first.data['image'])
+        self.assertEqual(len(os.listdir(default_storage.path(os.path.dirname(HealthScan.objects.first().image.name)))), 1)
+
+        # one task classifies both scans
+        (done, failed), tasks = self.process()
+        self.assertEqual((done, failed, tasks), (2, 0, 1))
+
+        # and later copies take the finished result without a task
+        late = self.upload(self.third_batch, photo)
+        self.assertEqual((late.data['status'], late.data['detection_result']), ('DONE', 'FRESH'))
+        self.assertEqual(self.process(), ((0, 0), 0))
+
+    def test_racing_uploads_share_one_scan_and_one_file(self):
+        photo = make_photo()
+        digest = hashlib.sha256(photo.getvalue()).hexdigest()
+        name = f'health_scans/{digest[:2]}/{digest}.jpg'
+        racer = {}
+        stale = []
+
+        def race(upload):
+            # another request stores the photo and inserts its scan while this one is mid-way
+            default_storage.save(name, io.BytesIO(photo.getvalue()))
+            stale.append(name)
+            racer['scan'] = HealthScan.objects.create(batch=self.batch, image=name,
+                                                      content_hash=digest, size=len(photo.getvalue()))
+            return '.jpg'
+
+        exists = default_storage.exists
+
+        def stale_exists(name):
+            # this request looked before the racer's file landed
+            if name in stale:
+                stale.remove(name)
+                return False
+            return exists(name)
+
+        with patch('core.scans.image_extension', race), patch.object(default_storage, 'exists', stale_exists):
+            response = self.upload(self.batch, photo)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['id'], str(racer['scan'].id))
+        self.assertEqual(os.listdir(default_storage.path(os.path.dirname(name))), [os.path.basename(name)])
+
+    def test_deleting_scans_removes_files_no_scan_shares(self):
+        photo = make_photo()
+        first = HealthScan.objects.get(pk=self.upload(self.batch, photo).data['id'])
+        self.upload(self.other_batch, photo)
+        self.process()
+        first.refresh_from_db()
+        names = [first.image.name, first.thumbnail.name]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(all(default_storage.exists(name) for name in names))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_batch.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+    def test_rejects_non_images_and_oversized_uploads(self):
+        text = io.BytesIO(b'not an image')
+        text.name = 'scan.jpg'
+        response = self.upload(self.batch, text)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+        with override_settings(HEALTH_SCAN_MAX_UPLOAD_SIZE=1000):
+            response = self.upload(self.batch, make_photo())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most', str(response.data['image']))
+        self.assertFalse(HealthScan.objects.exists())
+
+        other_batch = make_batches(make_farmer('other@example.com', '01800000000'), 1)[0]
+        self.assertEqual(self.upload(other_batch, make_photo()).status_code, 400)
+
+    def test_pool_thumbnails_and_classifies(self):
+        fresh = self.upload(self.batch, make_photo()).data['id']
+        rotten = self.upload(self.batch, make_photo(colour=(30, 35, 20), image_format='PNG')).data['id']
+        broken = HealthScan.objects.create(batch=self.other_batch, image='health_scans/missing.jpg',
+                                           content_hash='0' * 64, size=1)
+
+        (done, failed), tasks = self.process()
+
+        self.assertEqual((done, failed, tasks), (2, 1, 3))
+        fresh, rotten = HealthScan.objects.get(pk=fresh), HealthScan.objects.get(pk=rotten)
+        self.assertEqual((fresh.status, fresh.detection_result), ('DONE', 'FRESH'))
+        self.assertEqual((rotten.status, rotten.detection_result), ('DONE', 'ROTTEN'))
+        self.assertGreater(rotten.confidence, 0.5)
+        self.assertIsNotNone(fresh.processed_at)
+        with Image.open(default_storage.path(fresh.thumbnail.name)) as thumbnail:
+            self.assertLessEqual(max(thumbnail.size), 256)
+        broken.refresh_from_db()
+        self.assertEqual((broken.status, broken.detection_result), ('FAILED', 'PENDING'))
+        self.assertTrue(broken.error)
+
+    def test_status_endpoint_reports_progress(self):
+        self.upload(self.batch, make_photo())
+        self.upload(self.other_batch, make_photo(colour=(10, 10, 10)))
+        url = reverse('health-scan-status')
+        self.assertEqual(self.client.get(url).data['progress'], 0)
+
+        self.process()
+        self.upload(self.batch, make_photo(colour=(90, 160, 90)))
+        status = self.client.get(url).data
+        self.assertEqual((status['total'], status['done'], status['queued']), (3, 2, 1))
+        self.assertEqual((status['fresh'], status['rotten']), (1, 1))
+        self.assertEqual(status['progress'], 66.67)
+        self.assertEqual(self.client.get(url, {'batch': str(self.other_batch.id)}).data['rotten'], 1)
+        self.assertEqual(self.client.get(reverse('health-scan-list'), {'batch': str(self.batch.id)}).data['count'], 2)
+
+    def test_scanner_master_badge(self):
+        HealthScan.objects.bulk_create([
+            HealthScan(batch=self.batch, image='health_scans/x.jpg', content_hash=f'{n:064d}', size=1)
+            for n in range(9)
+        ])
+        self.upload(self.batch, make_photo())
+        self.assertTrue(Achievement.objects.filter(user=self.farmer, badge_name='SCANNER_MASTER').exists())
+
+    def test_process_health_scans_command(self):
+        self.upload(self.batch, make_photo())
+        out = io.StringIO()
+        call_command('process_health_scans', workers=1, stdout=out)
+        self.assertIn('Processed 1 scans', out.getvalue())
+        self.assertEqual(HealthScan.objects.get().status, 'DONE')
+
+
+@override_settings(AUTH_USER_CACHE_ENABLED=True)
+class AuthUserCacheTests(APITestCase):
+    url = '/api/auth/users/me/'
+
+    def setUp(self):
+        get_cache().clear()
+        authentication._user_cache().clear()
+        self.farmer = make_farmer()
+        self.farmer.set_password('harvest-secret-1')
+        self.farmer.save()
+        self.authenticate()
+
+    def authenticate(self):
+        token = RefreshToken.for_user(self.farmer)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {token.access_token}')
+
+    def user_queries(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if 'core_user' in q['sql']]
+
+    def test_second_request_skips_user_lookup(self):
+        self.assertEqual(self.user_queries(), [])
+
+    @override_settings(AUTH_USER_CACHE_ENABLED=False)
+    def test_disabled_cache_looks_user_up(self):
+        self.assertEqual(len(self.user_queries()), 1)
+
+    def test_profile_update_is_visible(self):
+        self.client.get(self.url)
+        self.client.patch(self.url, {'first_name': 'Rahim'})
+        self.assertEqual(self.client.get(self.url).data['first_name'], 'Rahim')
+
+        User.objects.filter(pk=self.farmer.pk).update(last_name='Uddin')
+        authentication.forget_authenticated_user(self.farmer.pk)
+        self.assertEqual(self.client.get(self.url).data['last_name'], 'Uddin')
+
+    def test_batch_create_refreshes_batch_count(self):
+        self.assertEqual(self.client.get(self.url).data['batch_count'], 0)
+        self.client.post(reverse('crop-batch-list'), {'estimated_weight': 250, 'harvest_date': '2025-01-01',
+                                                      'storage_location': 'DHAKA', 'storage_type': 'SILO'})
+        self.assertEqual(self.client.get(self.url).data['batch_count'], 1)
+
+    def test_deactivation_rejects_cached_user(self):
+        self.client.get(self.url)
+        self.farmer.is_active = False
+        self.farmer.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_cached_user_is_not_shared_between_requests(self):
+        self.client.get(self.url)
+        token = RefreshToken.for_user(self.farmer).access_token
+        first = authentication.CachedJWTAuthentication().get_user(token)
+        first.first_name = 'changed in a request'
+        second = authentication.CachedJWTAuthentication().get_user(token)
+        self.assertNotEqual(second.first_name, 'changed in a request')
+
+
+class TokenRevocationTests(APITestCase):
+    refresh_url = '/api/auth/jwt/refresh/'
+
+    def setUp(self):
+        get_cache().clear()
+        revocation._filter = None
+        self.farmer = make_farmer()
+
+    def test_rotation_revokes_old_refresh_token(self):
+        token = str(RefreshToken.for_user(self.farmer))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.refresh_url, {'refresh': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(RevokedToken.objects.filter(user=self.farmer).exists())
+
+        self.assertEqual(self.client.post(self.refresh_url, {'refresh': token}).status_code, 401)
+        self.assertEqual(self.client.post('/api/auth/jwt/verify/', {'token': token}).status_code, 400)
+        self.assertEqual(self.client.post(self.refresh_url, {'refresh': response.data['refresh']}).status_code, 200)
+
+    def test_unrevoked_token_is_answered_in_memory(self):
+        revocation.get_filter().sync()
+        token = RefreshToken.for_user(self.farmer)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertFalse(revocation.is_revoked(token['jti']))
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_other_processes_pick_up_revocations(self):
+        revocation.get_filter().sync()
+        token = RefreshToken.for_user(self.farmer)
+        # another worker revokes the token and stamps a new generation on commit
+        RevokedToken.objects.create(jti=token['jti'], user=self.farmer, expires_at=timezone.now() + timedelta(days=1))
+        revocation._stamp(revocation.GENERATION_KEY)
+        self.assertTrue(revocation.is_revoked(token['jti']))
+
+    def test_compaction_deletes_expired_tokens(self):
+        now = timezone.now()
+        RevokedToken.objects.bulk_create([
+            RevokedToken(jti=f'expired-{n}', expires_at=now - timedelta(minutes=1)) for n in range(3)
+        ] + [RevokedToken(jti='live', expires_at=now + timedelta(days=1))])
+        revocation.get_filter().sync()
+        self.assertTrue(revocation.is_revoked('live'))
+
+        out = io.StringIO()
+        call_command('compact_revoked_tokens', batch_size=2, stdout=out)
+        self.assertIn('Compacted 3', out.getvalue())
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+        self.assertTrue(revocation.is_revoked('live'))
+        self.assertNotIn('expired-0', revocation.get_filter().bloom)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = revocation.BloomFilter(1000, 0.01)
+        for n in range(1000):
+            bloom.add(f'jti-{n}')
+        self.assertTrue(all(f'jti-{n}' in bloom for n in range(1000)))
+        false_positives = sum(f'other-{n}' in bloom for n in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class FarmerImportTests(APITestCase):
+    url = reverse('user-import')
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='ngo', email='staff@example.com',
+                                              phone_number='01800000000', password='x', is_staff=True)
+        make_farmer('rahim@example.com', '01700000001')
+        self.client.force_authenticate(self.staff)
+
+    def rows(self):
+        return [
+            {'email': 'rahim@example.org', 'phone_number': '01900000001', 'password': 'Harvest-2025!'},
+            {'email': 'rahim@example.net', 'phone_number': '01900000002', 'preferred_language': 'en'},
+            {'email': 'karim@example.org', 'phone_number': '01700000001'},       # phone taken
+            {'email': 'rahim@EXAMPLE.ORG', 'phone_number': '01900000003'},       # row 1 once normalized
+            {'email': 'not-an-email', 'phone_number': '', 'preferred_language': 'FR'},
+            {'email': 'salma@example.org', 'phone_number': '01900000005', 'username': 'salma'},
+            {'email': 'nasima@example.org', 'phone_number': '01900000006', 'password': 'nasima'},
+            {'email': 'ngo@example.org', 'phone_number': '01900000008', 'username': 'ngo'},   # username taken
+            {'email': 'rina@example.org', 'phone_number': '01900000010', 'username': 'salma'},  # line 6's
+        ]
+
+    def test_import_reports_per_row(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, self.rows(), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['read'], response.data['created']), (9, 3))
+        errors = {error['line']: error['errors'] for error in response.data['errors']}
+        self.assertEqual(sorted(errors), [3, 4, 5, 7, 8, 9])
+        self.assertIn('phone_number', errors[3])
+        self.assertIn('Duplicate of line 1', errors[4]['email'][0])
+        self.assertEqual(set(errors[5]), {'email', 'phone_number', 'preferred_language'})
+        # too short and too similar to the email
+        self.assertEqual(len(errors[7]['password']), 2)
+        self.assertEqual(errors[8], {'username': ["A user with that username already exists."]})
+        self.assertEqual(errors[9], {'username': ["Duplicate of line 6."]})
+        # email, phone and username lookups, one insert, and auth/transaction overhead
+        self.assertLessEqual(len(ctx.captured_queries), 8)
+
+        usernames = [created['username'] for created in response.data['users']]
+        self.assertEqual(usernames, ['rahim1', 'rahim2', 'salma'])
+        imported = User.objects.get(email='rahim@example.org')
+        self.assertTrue(imported.check_password('Harvest-2025!'))
+        self.assertFalse(User.objects.get(email='rahim@example.net').has_usable_password())
+        self.assertEqual(User.objects.get(email='rahim@example.net').preferred_language, 'EN')
+
+    def test_csv_upload(self):
+        upload = io.BytesIO(b'email,phone_number,first_name\nnew@example.org,01900000009,Amina\n')
+        upload.name = 'farmers.csv'
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(User.objects.get(email='new@example.org').first_name, 'Amina')
+
+    @override_settings(FARMER_IMPORT_MAX_ROWS=5)
+    def test_request_row_limit(self):
+        response = self.client.post(self.url, self.rows(), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('At most 5 farmers', response.data['file'])
+        self.assertFalse(User.objects.filter(email='rahim@example.org').exists())
+
+    def test_staff_only(self):
+        self.client.force_authenticate(User.objects.get(email='rahim@example.com'))
+        self.assertEqual(self.client.post(self.url, self.rows(), format='json').status_code, 403)
+
+    def test_command_hashes_in_process_pool(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'farmers.jsonl')
+            with open(path, 'w') as handle:
+                for row in self.rows():
+                    handle.write(json.dumps(row) + '\n')
+            out, err = io.StringIO(), io.StringIO()
+            call_command('import_farmers', path, workers=2, stdout=out, stderr=err)
+        self.assertIn('created 3 farmers, 6 rejected', out.getvalue())
+        self.assertIn('line 3: phone_number', err.getvalue())
+        self.assertTrue(User.objects.get(email='rahim@example.org').check_password('Harvest-2025!'))
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class ValuesReadTests(APITestCase):
+    def setUp(self):
+        self.farmer = make_farmer()
+        self.batch = make_batches(self.farmer, 15, losses_per_batch=2, interventions_per_batch=2)[0]
+        CropBatch.objects.filter(pk=self.batch.pk).update(notes='Moved to silo — "dry"', status='COMPLETED')
+        LossEvent.objects.filter(batch=self.batch).update(description=None)
+        self.client.force_authenticate(self.farmer)
+
+    def urls(self):
+        loss_event = LossEvent.objects.filter(batch=self.batch).first()
+        intervention = Intervention.objects.filter(batch=self.batch).first()
+        return [
+            reverse('crop-batch-list'),
+            reverse('crop-batch-list') + '?page=2',
+            reverse('crop-batch-list') + '?pagination=cursor',
+            reverse('crop-batch-detail', args=[self.batch.id]),
+            reverse('crop-batch-active'),
+            reverse('crop-batch-completed'),
+            reverse('crop-batch-export-data') + '?format=json',
+            reverse('loss-event-list'),
+            reverse('loss-event-list') + '?pagination=cursor',
+            reverse('loss-event-detail', args=[loss_event.id]),
+            reverse('intervention-list'),
+            reverse('intervention-detail', args=[intervention.id]),
+        ]
+
+    def test_responses_are_byte_identical(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                with override_settings(VALUES_READ_PATH_ENABLED=False):
+                    expected = self.client.get(url)
+                actual = self.client.get(url)
+                self.assertEqual(actual.status_code, 200)
+                self.assertEqual(actual.content, expected.content)
+
+    def test_data_matches_serializers_in_any_timezone(self):
+        sources = [
+            (CropBatchSerializer, CropBatch.objects.all()),
+            (LossEventSerializer, LossEvent.objects.all()),
+            (InterventionSerializer, Intervention.objects.all()),
+        ]
+        for zone in ('Asia/Dhaka', 'UTC'):
+            with timezone.override(zone):
+                for serializer_class, queryset in sources:
+                    with self.subTest(serializer=serializer_class.__name__, zone=zone):
+                        self.assertEqual(serialize_many(serializer_class, queryset.order_by('id')),
+                                         serializer_class(queryset.order_by('id'), many=True).data)
+
+    def test_missing_detail_is_404(self):
+        self.assertEqual(self.client.get(reverse('crop-batch-detail', args=['not-a-uuid'])).status_code, 404)
+        other = make_batches(make_farmer('other@example.com', '01700000009'), 1)[0]
+        self.assertEqual(self.client.get(reverse('crop-batch-detail', args=[other.id])).status_code, 404)
+
+    def test_weather_include_keeps_serializer_path(self):
+        weather.clear_weather_cache()
+        response = self.client.get(reverse('crop-batch-list'), {'include': 'weather'})
+        self.assertIn('current_weather', response.data['results'][0])
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        self.farmer = make_farmer()
+        self.batch = make_batches(self.farmer, 12, losses_per_batch=1)[0]
+        self.client.force_authenticate(self.farmer)
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, ' '.join(query['sql'] for query in ctx.captured_queries)
+
+    def test_fields_prune_output_and_select(self):
+        url = reverse('crop-batch-list')
+        for enabled in (True, False):
+            with self.subTest(values_read_path=enabled), override_settings(VALUES_READ_PATH_ENABLED=enabled):
+                response, sql = self.get(url, {'fields': 'id,status,harvest_date'})
+                self.assertEqual(list(response.data['results'][0]), ['id', 'harvest_date', 'status'])
+                self.assertNotIn('"notes"', sql)
+
+                response, sql = self.get(url, {'exclude': 'notes,created_at', 'pagination': 'cursor'})
+                self.assertNotIn('notes', response.data['results'][0])
+                self.assertIsNotNone(response.data['next'])
+                self.assertNotIn('"notes"', sql)
+
+    def test_detail_and_actions(self):
+        response, _ = self.get(reverse('crop-batch-detail', args=[self.batch.id]), {'fields': 'status'})
+        self.assertEqual(response.data, {'status': 'ACTIVE'})
+        response, sql = self.get(reverse('crop-batch-active'), {'fields': 'id'})
+        self.assertEqual(set(response.data[0]), {'id'})
+        self.assertNotIn('"notes"', sql)
+        response, _ = self.get(reverse('loss-event-list'), {'fields': 'batch,estimated_loss_kg'})
+        self.assertEqual(list(response.data['results'][0]), ['batch', 'estimated_loss_kg'])
+        response, _ = self.get(reverse('achievement-list'), {'exclude': 'earned_at'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_non_column_fields_keep_full_select(self):
+        weather.clear_weather_cache()
+        response, _ = self.get(reverse('crop-batch-list'), {'include': 'weather', 'fields': 'id,current_weather'})
+        self.assertEqual(list(response.data['results'][0]), ['id', 'current_weather'])
+        self.assertIsNotNone(response.data['results'][0]['current_weather'])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('crop-batch-list'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.data['fields'])
+        response = self.client.get(reverse('crop-batch-list'), {'fields': 'id', 'exclude': 'id'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_writes_ignore_fields(self):
+        response = self.client.patch(reverse('crop-batch-detail', args=[self.batch.id]) + '?fields=id',
+                                     {'notes': 'checked'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['notes'], 'checked')
+
+
+class MessagePackTests(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.farmer = make_farmer()
+        self.batch = make_batches(self.farmer, 3, losses_per_batch=1)[0]
+        self.client.force_authenticate(self.farmer)
+
+    def unpack(self, response):
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        return MessagePackParser().parse(io.BytesIO(response.content))
+
+    def test_batch_list_packs_uuids_and_dates_natively(self):
+        url = reverse('crop-batch-list')
+        packed = self.unpack(self.client.get(url, HTTP_ACCEPT='application/msgpack'))
+        as_json = self.client.get(url).json()
+        first, expected = packed['results'][0], as_json['results'][0]
+        self.assertIsInstance(first['id'], uuid.UUID)
+        self.assertIsInstance(first['harvest_date'], date)
+        self.assertEqual(str(first['id']), expected['id'])
+        self.assertEqual(first['harvest_date'].isoformat(), expected['harvest_date'])
+        self.assertEqual(first['created_at'], datetime.fromisoformat(expected['created_at']))
+        self.assertEqual(first['notes'], expected['notes'])
+
+        # the JSON response above was not served the cached MessagePack data
+        self.assertIsInstance(as_json['results'][0]['id'], str)
+        self.assertLess(len(self.client.get(url, {'format': 'msgpack'}).content),
+                        len(self.client.get(url).content))
+
+    def test_export_and_djoser_routes(self):
+        export = self.unpack(self.client.get(reverse('crop-batch-export-data'), {'format': 'msgpack'}))
+        self.assertEqual(len(export['batches']), 3)
+        me = self.unpack(self.client.get('/api/auth/users/me/', HTTP_ACCEPT='application/msgpack'))
+        self.assertEqual(me['email'], self.farmer.email)
+
+    def test_msgpack_request_body(self):
+        body = msgpack.packb({'batch': self.batch.id, 'event_date': date(2025, 1, 2), 'loss_type': 'PEST',
+                              'estimated_loss_kg': 2.5}, default=msgpack_default, use_bin_type=True)
+        response = self.client.post(reverse('loss-event-list'), body, content_type='application/msgpack',
+                                    HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.unpack(response)['event_date'], '2025-01-02')
+
+        response = self.client.post(reverse('loss-event-list'), b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, 400)
+
+    def test_errors_are_packed(self):
+        response = self.client.get(reverse('crop-batch-list'), {'fields': 'nope', 'format': 'msgpack'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('nope', self.unpack(response)['fields'])
+
+
+class AsyncReadTests(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.farmer = make_farmer()
+        self.batch = make_batches(self.farmer, 15, losses_per_batch=2, interventions_per_batch=2)[0]
+        CropBatch.objects.filter(pk=self.batch.pk).update(status='COMPLETED')
+        Achievement.objects.create(user=self.farmer, badge_name='FIRST_HARVEST')
+        self.client.force_authenticate(self.farmer)
+
+    def get_async(self, url, user=None, **extra):
+        """GET `url` from the async twin of the view it routes to"""
+        match = resolve(url.split('?')[0])
+        view = match.func.cls.as_view(match.func.actions, **{**match.func.initkwargs, 'async_reads': True})
+        self.assertTrue(iscoroutinefunction(view))
+        request = APIRequestFactory().get(url, **extra)
+        force_authenticate(request, user or self.farmer)
+        response = async_to_sync(view)(request, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def urls(self):
+        detail = reverse('crop-batch-detail', args=[self.batch.id])
+        return [
+            reverse('crop-batch-list'),
+            reverse('crop-batch-list') + '?page=2',
+            reverse('crop-batch-list') + '?pagination=cursor&fields=id,status',
+            reverse('crop-batch-list') + '?format=msgpack',
+            detail,
+            reverse('crop-batch-active'),
+            reverse('crop-batch-completed') + '?exclude=notes',
+            reverse('crop-batch-dashboard'),
+            reverse('crop-batch-dashboard') + '?from=2025-01-01&to=2025-01-31',
+            reverse('achievement-list'),
+            reverse('loss-event-list'),
+            reverse('loss-event-list') + '?pagination=cursor',
+            reverse('intervention-list') + '?page=3',
+        ]
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_responses_match_sync_views(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                expected = self.client.get(url)
+                actual = self.get_async(url)
+                self.assertEqual(actual.status_code, 200)
+                self.assertEqual(actual.content, expected.content)
+                self.assertEqual(actual.get('ETag'), expected.get('ETag'))
+
+    def test_errors_match_sync_views(self):
+        for url in [reverse('crop-batch-detail', args=['not-a-uuid']),
+                    reverse('crop-batch-list') + '?page=9',
+                    reverse('crop-batch-list') + '?cursor=bogus',
+                    reverse('crop-batch-dashboard') + '?from=yesterday',
+                    reverse('loss-event-list') + '?fields=nope']:
+            with self.subTest(url=url):
+                self.assertEqual(self.get_async(url).status_code, self.client.get(url).status_code)
+        other = make_farmer('other@example.com', '01700000009')
+        self.assertEqual(self.get_async(reverse('crop-batch-detail', args=[self.batch.id]), other).status_code, 404)
+
+    def test_conditional_get_and_response_cache(self):
+        url = reverse('crop-batch-active')
+        etag = self.get_async(url)['ETag']
+        self.assertEqual(self.get_async(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # the async twin shares the sync view's cache entries
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        self.assertEqual(get_metrics()['CropBatchViewSet.active'], {'hits': 1, 'misses': 1, 'hit_rate': 50.0})
+
+    def test_unauthenticated_is_401(self):
+        match = resolve(reverse('crop-batch-list'))
+        view = CropBatchViewSet.as_view(match.func.actions, **{**match.func.initkwargs, 'async_reads': True})
+        response = async_to_sync(view)(APIRequestFactory().get(reverse('crop-batch-list')))
+        self.assertEqual(response.status_code, 401)
+
+    def test_writes_run_the_sync_view(self):
+        match = resolve(reverse('crop-batch-list'))
+        view = CropBatchViewSet.as_view(match.func.actions, **{**match.func.initkwargs, 'async_reads': True})
+        request = APIRequestFactory().post(reverse('crop-batch-list'), {
+            'estimated_weight': 100, 'harvest_date': '2025-02-01', 'storage_location': 'DHAKA',
+            'storage_type': 'SILO',
+        }, format='json')
+        force_authenticate(request, self.farmer)
+        self.assertEqual(async_to_sync(view)(request).status_code, 201)
+        self.assertEqual(CropBatch.objects.filter(farmer=self.farmer).count(), 16)
+
+    def test_only_actions_with_async_twins_get_async_views(self):
+        self.assertFalse(iscoroutinefunction(resolve(reverse('crop-batch-list')).func))
+        with override_settings(ASYNC_READ_VIEWS=True):
+            self.assertTrue(iscoroutinefunction(CropBatchViewSet.as_view({'get': 'list'})))
+            self.assertFalse(iscoroutinefunction(CropBatchViewSet.as_view({'get': 'export_data'})))
+
+
+class DatabaseStatsTests(APITestCase):
+    def test_staff_only(self):
+        self.client.force_authenticate(make_farmer())
+        self.assertEqual(self.client.get(reverse('db-stats-list')).status_code, 403)
+
+    def test_counts_requests_and_connects(self):
+        staff = make_farmer()
+        User.objects.filter(pk=staff.pk).update(is_staff=True)
+        staff.refresh_from_db()
+        self.client.force_authenticate(staff)
+
+        first = self.client.get(reverse('db-stats-list')).data
+        self.assertEqual(first['mode'], 'close')
+        self.assertIsNone(first['pool'])
+        fresh = connections.create_connection(DEFAULT_DB_ALIAS)
+        fresh.connect()
+        fresh.close()
+        second = self.client.get(reverse('db-stats-list')).data
+        self.assertEqual(second['requests'], first['requests'] + 1)
+        self.assertEqual(second['connects'], first['connects'] + 1)
+
+
+class OpenAPISchemaTests(APITestCase):
+    def test_static_schema_matches_live_schema(self):
+        # rerun `manage.py build_openapi_schema` when this fails after an API change
+        path = os.path.join(settings.STATIC_ROOT, settings.OPENAPI_SCHEMA_FILE)
+        with open(path, 'rb') as f:
+            static = f.read()
+        with open(path + '.gz', 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), static)
+        response = self.client.get(reverse('schema-swagger-ui'), {'format': 'openapi'})
+        self.assertEqual(response.content, static)
+
+    def test_docs_pages_load_the_static_schema(self):
+        spec_url = settings.STATIC_URL + settings.OPENAPI_SCHEMA_FILE
+        for name in ('schema-swagger-ui', 'schema-redoc'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(spec_url, response.content.decode())
+
+        response = self.client.get(spec_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_schema_is_built_once_per_process(self):
+        get_schema.cache_clear()
+        get_schema_json.cache_clear()
+        for name in ('schema-swagger-ui', 'schema-redoc'):
+            self.client.get(reverse(name))
+            self.client.get(reverse(name), {'format': 'openapi'})
+        self.assertEqual(get_schema.cache_info().misses, 1)
+        self.assertEqual(get_schema_json.cache_info().misses, 1)
+
+    def test_command_writes_compressed_schema(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+            call_command('build_openapi_schema', stdout=io.StringIO())
+            path = os.path.join(root, settings.OPENAPI_SCHEMA_FILE)
+            with open(path, 'rb') as f:
+                written = f.read()
+            with open(path + '.gz', 'rb') as f:
+                self.assertEqual(gzip.decompress(f.read()), written)
+        self.assertEqual(written, get_schema_json())
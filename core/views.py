@@ -1,29 +1,68 @@
+import asyncio
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-from rest_framework import viewsets, permissions
+from itertools import islice
+from rest_framework import mixins, viewsets, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
-import csv
-
-from .models import User, CropBatch, Achievement, LossEvent, Intervention
+from rest_framework.settings import api_settings
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+
+from .models import (User, CropBatch, Achievement, LossEvent, Intervention, ExportJob, LossRollup, RiskPrediction,
+                     HealthScan)
 from .serializers import (
     UserSerializer,
     CropBatchSerializer,
+    CropBatchWeatherSerializer,
     AchievementSerializer,
     LossEventSerializer,
-    InterventionSerializer
+    InterventionSerializer,
+    ExportJobSerializer,
+    LossRollupSerializer,
+    RiskPredictionSerializer,
+    HealthScanSerializer
 )
-from .achievements import award_badge
-
-
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
-
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+from .achievements import evaluate_badges
+from .asyncviews import AsyncReadMixin, fetch_all
+from .bulk import BulkWriteMixin
+from .cache import cached_response, get_metrics
+from .conditional import conditional_get
+from .dbstats import get_connection_stats
+from .downloads import ranged_file_response
+from .exports import aiter_blocks, parse_includes, stream_csv, stream_ndjson
+from .farmer_import import import_farmers
+from .fieldsets import SparseFieldsMixin
+from .pagination import (
+    AsyncPageNumberPagination,
+    StandardResultsSetPagination,
+    CropBatchPagination,
+    LossEventPagination,
+    InterventionPagination
+)
+from .reads import ValuesReadMixin, serialize_many
+from .parsers import MessagePackParser
+from .renderers import CSVRenderer, NDJSONRenderer, wants_native_types
+from .risk import score_batches
+from .rollups import month_of, record_moves
+from .scans import HashingUploadHandler, create_scan
+from .sync import collect_changes, decode_token
+from .weather import all_current_conditions
+from .record_files import detect_format, read_records
+
+
+class UserViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     """Optional user viewset for extra user queries"""
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -34,11 +73,66 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
             return User.objects.none()
         return User.objects.filter(id=self.request.user.id)
 
-
-class CropBatchViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='import', url_name='import',
+            permission_classes=[permissions.IsAdminUser],
+            parser_classes=[MultiPartParser, JSONParser, MessagePackParser])
+    def import_farmers(self, request):
+        """
+        Create farmer accounts in bulk (staff only). Upload a CSV or JSON Lines
+        `file`, or post a JSON list of farmers, each with email, phone_number
+        and optionally username, password, first_name, last_name and
+        preferred_language. Valid rows are created even when others are
+        rejected; `errors` lists the rejected ones by line (or list position).
+        """
+        upload = request.FILES.get('file')
+        if upload is not None:
+            try:
+                fmt = detect_format(upload.name)
+            except ValueError as exc:
+                raise ValidationError({'file': str(exc)})
+            records = read_records(io.TextIOWrapper(upload.file, encoding='utf-8', newline=''), fmt)
+        elif isinstance(request.data, list):
+            records = enumerate(request.data, start=1)
+        else:
+            raise ValidationError({'file': 'Upload a CSV or JSON Lines file, or post a list of farmers.'})
+
+        # every row costs a password hash inside this request; bigger files go through the command
+        limit = settings.FARMER_IMPORT_MAX_ROWS
+        try:
+            records = list(islice(records, limit + 1))
+        except UnicodeDecodeError:
+            raise ValidationError({'file': 'The file must be UTF-8 encoded.'})
+        if len(records) > limit:
+            raise ValidationError({'file': f'At most {limit} farmers per request; import larger files with '
+                                           f'the import_farmers management command.'})
+
+        # PBKDF2 releases the GIL, so threads hash in parallel without forking the web worker
+        with ThreadPoolExecutor(max_workers=settings.FARMER_IMPORT_HASH_THREADS) as executor:
+            result = import_farmers(records, executor=executor)
+        return Response(
+            {'read': result.read, 'created': len(result.created), 'users': result.created, 'errors': result.errors},
+            status=201 if result.created else 400,
+        )
+
+
+def dashboard_sources(view):
+    """Everything the dashboard aggregates over"""
+    user = view.request.user
+    return [
+        view.get_queryset(),
+        LossEvent.objects.filter(batch__farmer=user),
+        Intervention.objects.filter(batch__farmer=user),
+    ]
+
+
+def risk_sources(view):
+    return [RiskPrediction.objects.filter(batch__farmer=view.request.user, batch__status='ACTIVE')]
+
+
+class CropBatchViewSet(ValuesReadMixin, BulkWriteMixin, viewsets.ModelViewSet):
     """Crop batch management"""
     serializer_class = CropBatchSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = CropBatchPagination
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -46,96 +140,326 @@ class CropBatchViewSet(viewsets.ModelViewSet):
             return CropBatch.objects.none()
         return CropBatch.objects.filter(farmer=self.request.user)
 
+    def includes_weather(self):
+        request = self.request
+        return (request is not None and request.method == 'GET'
+                and 'weather' in request.query_params.get('include', '').split(','))
+
+    def get_serializer_class(self):
+        # ?include=weather embeds the current conditions of each batch's division
+        if self.includes_weather():
+            return CropBatchWeatherSerializer
+        return super().get_serializer_class()
+
+    def get_validator_parts(self):
+        # embedded weather changes without any batch row changing
+        if self.includes_weather():
+            return [json.dumps(all_current_conditions(), sort_keys=True)]
+        return []
+
+    @conditional_get()
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get()
+    async def alist(self, request, *args, **kwargs):
+        return await super().alist(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         batch = serializer.save(farmer=self.request.user)
-        # Award "First Harvest Logged" badge
-        if batch.farmer.crop_batches.count() == 1:
-            award_badge(batch.farmer, 'FIRST_HARVEST')
+        evaluate_badges(self.request.user, 'batch_created', batches=[batch])
 
-    @action(detail=False, methods=['GET'])
+    def get_bulk_create_kwargs(self):
+        return {'farmer': self.request.user}
+
+    def perform_bulk_create(self, batches):
+        evaluate_badges(self.request.user, 'batch_created', batches=batches)
+
+    @action(detail=False, methods=['GET'],
+            renderer_classes=[*api_settings.DEFAULT_RENDERER_CLASSES, CSVRenderer, NDJSONRenderer])
+    @cached_response()
     def export_data(self, request):
-        """Export user data as CSV or JSON"""
+        """
+        Export user data as JSON, CSV or NDJSON.
+        CSV and NDJSON are streamed; ?include=loss_events,interventions adds related rows.
+        """
         format_type = request.query_params.get('format', 'json')
         batches = self.get_queryset()
 
-        if format_type == 'csv':
-            return self._export_csv(batches)
+        if format_type in ('csv', 'ndjson'):
+            try:
+                includes = parse_includes(request.query_params.get('include'))
+            except ValueError as exc:
+                raise ValidationError({'include': str(exc)})
+            if format_type == 'csv':
+                return self._export_csv(batches, includes)
+            return self._export_ndjson(batches, includes)
         else:
             return self._export_json(batches)
 
-    def _export_csv(self, batches):
-        response = Response(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="harvestguard_export.csv"'
+    def _streaming_response(self, lines, content_type, filename):
+        # under ASGI a sync iterator would be read whole before the first byte went out
+        if isinstance(self.request._request, ASGIRequest):
+            lines = aiter_blocks(lines)
+        response = StreamingHttpResponse(lines, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
-        writer = csv.writer(response)
-        writer.writerow(['Crop Type', 'Weight (kg)', 'Harvest Date',
-                         'Storage Location', 'Storage Type', 'Status', 'Created At'])
+    def _export_csv(self, batches, includes=()):
+        return self._streaming_response(stream_csv(batches, includes), 'text/csv', 'harvestguard_export.csv')
 
-        for batch in batches:
-            writer.writerow([batch.crop_type, batch.estimated_weight,
-                             batch.harvest_date, batch.storage_location,
-                             batch.storage_type, batch.status, batch.created_at])
-
-        return response
+    def _export_ndjson(self, batches, includes=()):
+        return self._streaming_response(stream_ndjson(batches, includes), 'application/x-ndjson',
+                                        'harvestguard_export.ndjson')
 
     def _export_json(self, batches):
         data = {
             'export_date': str(date.today()),
             'farmer_email': self.request.user.email,
-            'batches': CropBatchSerializer(batches, many=True).data
+            'batches': serialize_many(CropBatchSerializer, batches, native=wants_native_types(self.request))
         }
         return Response(data)
 
     @action(detail=False, methods=['GET'])
+    @conditional_get()
+    @cached_response()
     def active(self, request):
         """Get only active batches"""
         if getattr(self, 'swagger_fake_view', False):
             return Response([])
-        batches = self.get_queryset().filter(status='ACTIVE')
-        serializer = self.get_serializer(batches, many=True)
-        return Response(serializer.data)
+        batches = self.filter_queryset(self.get_queryset()).filter(status='ACTIVE')
+        return Response(self.serialize_many(batches))
+
+    @conditional_get()
+    @cached_response()
+    async def aactive(self, request):
+        batches = self.filter_queryset(self.get_queryset()).filter(status='ACTIVE')
+        return Response(await self.aserialize_many(batches))
 
     @action(detail=False, methods=['GET'])
+    @conditional_get()
+    @cached_response()
     def completed(self, request):
         """Get completed batches"""
         if getattr(self, 'swagger_fake_view', False):
             return Response([])
-        batches = self.get_queryset().filter(status='COMPLETED')
-        serializer = self.get_serializer(batches, many=True)
-        return Response(serializer.data)
+        batches = self.filter_queryset(self.get_queryset()).filter(status='COMPLETED')
+        return Response(self.serialize_many(batches))
+
+    @conditional_get()
+    @cached_response()
+    async def acompleted(self, request):
+        batches = self.filter_queryset(self.get_queryset()).filter(status='COMPLETED')
+        return Response(await self.aserialize_many(batches))
 
     @action(detail=False, methods=['GET'])
+    @conditional_get(dashboard_sources)
+    @cached_response()
     def dashboard(self, request):
-        """Aggregate stats for profile page"""
+        """Aggregate stats for profile page, optionally limited by ?from=&to= (YYYY-MM-DD)"""
         if getattr(self, 'swagger_fake_view', False):
             return Response({
                 "total_batches": 0,
+                "active_batches": 0,
+                "completed_batches": 0,
                 "total_loss_events": 0,
+                "total_loss_kg": 0,
                 "total_interventions": 0,
                 "successful_interventions": 0,
-                "intervention_success_rate": 0
+                "intervention_success_rate": 0,
+                "by_storage_location": [],
+                "by_storage_type": [],
+                "by_loss_type": [],
             })
 
-        batches = self.get_queryset()
-        total_batches = batches.count()
-        total_loss_events = sum(b.loss_events.count() for b in batches)
-        total_interventions = sum(b.interventions.count() for b in batches)
-        successful_interventions = sum(b.interventions.filter(success=True).count() for b in batches)
+        queries, (interventions, totals) = self._dashboard_queries()
+        return Response(self._dashboard_data(*[list(query) for query in queries],
+                                             interventions.aggregate(**totals)))
+
+    @conditional_get(dashboard_sources)
+    @cached_response()
+    async def adashboard(self, request):
+        queries, (interventions, totals) = self._dashboard_queries()
+        # the queries are independent, so they are all issued at once
+        *rows, interventions = await asyncio.gather(*map(fetch_all, queries), interventions.aaggregate(**totals))
+        return Response(self._dashboard_data(*rows, interventions))
+
+    def _dashboard_queries(self):
+        """
+        The dashboard's queries, unevaluated: the storage location, storage
+        type and loss type breakdowns, and (interventions, aggregates) for
+        the intervention totals
+        """
+        date_from = self._parse_date_param('from')
+        date_to = self._parse_date_param('to')
+
+        # Each record is windowed on its own date: batches on harvest_date,
+        # loss events on event_date and interventions on applied_date.
+        batch_q = self._date_range_q('harvest_date', date_from, date_to)
+        loss_q = self._date_range_q('loss_events__event_date', date_from, date_to)
+
+        # Batch and loss totals are rolled up from the per-location breakdown,
+        # so the whole dashboard costs a fixed number of queries. Without a
+        # date range the batches' counter columns answer it without joins.
+        if date_from is not None or date_to is not None:
+            by_location = self._batch_breakdown('storage_location', batch_q, loss_q)
+            by_storage_type = self._batch_breakdown('storage_type', batch_q, loss_q)
+            interventions = Intervention.objects.filter(
+                batch__farmer=self.request.user,
+                **self._date_range_kwargs('applied_date', date_from, date_to)
+            )
+            totals = {'total': Count('id'), 'successful': Count('id', filter=Q(success=True))}
+        else:
+            by_location = self._counter_breakdown('storage_location')
+            by_storage_type = self._counter_breakdown('storage_type')
+            interventions = self.get_queryset()
+            totals = {
+                'total': Coalesce(Sum('intervention_count'), 0),
+                'successful': Coalesce(Sum('successful_intervention_count'), 0),
+            }
+
+        loss_events = LossEvent.objects.filter(
+            batch__farmer=self.request.user,
+            **self._date_range_kwargs('event_date', date_from, date_to)
+        )
+        by_loss_type = (
+            loss_events.order_by()
+            .values('loss_type')
+            .annotate(loss_event_count=Count('id'), loss_kg=Coalesce(Sum('estimated_loss_kg'), 0.0))
+            .order_by('loss_type')
+        )
+        return [by_location, by_storage_type, by_loss_type], (interventions, totals)
+
+    def _dashboard_data(self, by_location, by_storage_type, by_loss_type, interventions):
+        """The dashboard response from the rows and totals of _dashboard_queries()"""
+        by_location = self._breakdown_rows('storage_location', by_location)
+        by_storage_type = self._breakdown_rows('storage_type', by_storage_type)
+        total_interventions = interventions['total']
+        successful_interventions = interventions['successful']
         success_rate = (successful_interventions / total_interventions * 100) if total_interventions else 0
 
-        data = {
-            "total_batches": total_batches,
-            "total_loss_events": total_loss_events,
+        return {
+            "total_batches": sum(row['batches'] for row in by_location),
+            "active_batches": sum(row['active_batches'] for row in by_location),
+            "completed_batches": sum(row['completed_batches'] for row in by_location),
+            "total_loss_events": sum(row['loss_event_count'] for row in by_location),
+            "total_loss_kg": round(sum(row['loss_kg'] for row in by_location), 2),
             "total_interventions": total_interventions,
             "successful_interventions": successful_interventions,
-            "intervention_success_rate": round(success_rate, 2)
+            "intervention_success_rate": round(success_rate, 2),
+            "by_storage_location": by_location,
+            "by_storage_type": by_storage_type,
+            "by_loss_type": list(by_loss_type),
         }
-        return Response(data)
 
+    @action(detail=True, methods=['GET'])
+    def risk(self, request, pk=None):
+        """Spoilage risk of an active batch, scored on the spot if the last run missed it"""
+        batch = self.get_object()
+        prediction = RiskPrediction.objects.filter(batch=batch).first()
+        if prediction is None:
+            if batch.status != 'ACTIVE':
+                raise NotFound('Only active batches are scored.')
+            score_batches(CropBatch.objects.filter(pk=batch.pk))
+            prediction = RiskPrediction.objects.get(batch=batch)
+        return Response(RiskPredictionSerializer(prediction).data)
+
+    @action(detail=False, methods=['GET'], url_path='risk')
+    @conditional_get(risk_sources)
+    def risk_summary(self, request):
+        """Risk of the farmer's active batches, riskiest first, with a count per level"""
+        if getattr(self, 'swagger_fake_view', False):
+            return Response({'levels': {}, 'results': []})
+        predictions = risk_sources(self)[0]
+        levels = {level: 0 for level, _ in RiskPrediction.RISK_LEVEL_CHOICES}
+        levels.update(predictions.order_by().values_list('risk_level').annotate(n=Count('id')))
+        paginator = StandardResultsSetPagination()
+        page = paginator.paginate_queryset(predictions.order_by('-risk_score', 'batch_id'), request, view=self)
+        response = paginator.get_paginated_response(RiskPredictionSerializer(page, many=True).data)
+        response.data['levels'] = levels
+        return response
 
-class AchievementViewSet(viewsets.ReadOnlyModelViewSet):
+    def _parse_date_param(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Date has wrong format. Use YYYY-MM-DD.'})
+        return parsed
+
+    @staticmethod
+    def _date_range_kwargs(field, date_from, date_to):
+        kwargs = {}
+        if date_from:
+            kwargs[f'{field}__gte'] = date_from
+        if date_to:
+            kwargs[f'{field}__lte'] = date_to
+        return kwargs
+
+    def _date_range_q(self, field, date_from, date_to):
+        return Q(**self._date_range_kwargs(field, date_from, date_to))
+
+    def _batch_breakdown(self, field, batch_q, loss_q):
+        """One GROUP BY over the farmer's batches joined to their loss events"""
+        return (
+            self.get_queryset()
+            .order_by()
+            .values(field)
+            .annotate(
+                batches=Count('id', distinct=True, filter=batch_q),
+                active_batches=Count('id', distinct=True, filter=batch_q & Q(status='ACTIVE')),
+                completed_batches=Count('id', distinct=True, filter=batch_q & Q(status='COMPLETED')),
+                events=Count('loss_events', distinct=True, filter=loss_q),
+                loss_kg=Coalesce(Sum('loss_events__estimated_loss_kg', filter=loss_q), 0.0),
+            )
+            .order_by(field)
+        )
+
+    def _counter_breakdown(self, field):
+        """Same rows as _batch_breakdown, summed from the batches' counter columns"""
+        return (
+            self.get_queryset()
+            .order_by()
+            .values(field)
+            .annotate(
+                batches=Count('id'),
+                active_batches=Count('id', filter=Q(status='ACTIVE')),
+                completed_batches=Count('id', filter=Q(status='COMPLETED')),
+                events=Sum('loss_event_count'),
+                loss_kg=Coalesce(Sum('total_loss_kg'), 0.0),
+            )
+            .order_by(field)
+        )
+
+    @staticmethod
+    def _breakdown_rows(field, rows):
+        """
+        Response rows for a breakdown query. The event count is annotated as
+        `events` because the counter column already owns `loss_event_count`.
+        Groups with nothing in the date range are dropped.
+        """
+        return [
+            {
+                field: row[field],
+                'batches': row['batches'],
+                'active_batches': row['active_batches'],
+                'completed_batches': row['completed_batches'],
+                'loss_event_count': row['events'],
+                'loss_kg': row['loss_kg'],
+            }
+            for row in rows
+            if row['batches'] or row['events']
+        ]
+
+
+class AchievementViewSet(AsyncReadMixin, SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     """Achievement/badge management"""
     serializer_class = AchievementSerializer
+    pagination_class = AsyncPageNumberPagination
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -143,10 +467,23 @@ class AchievementViewSet(viewsets.ReadOnlyModelViewSet):
             return Achievement.objects.none()
         return Achievement.objects.filter(user=self.request.user)
 
+    @conditional_get()
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get()
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(await fetch_all(queryset), many=True).data)
 
-class LossEventViewSet(viewsets.ModelViewSet):
+
+class LossEventViewSet(ValuesReadMixin, BulkWriteMixin, viewsets.ModelViewSet):
     """CRUD for loss events per crop batch"""
     serializer_class = LossEventSerializer
+    pagination_class = LossEventPagination
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -154,13 +491,34 @@ class LossEventViewSet(viewsets.ModelViewSet):
             return LossEvent.objects.none()
         return LossEvent.objects.filter(batch__farmer=self.request.user)
 
+    @conditional_get()
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get()
+    async def alist(self, request, *args, **kwargs):
+        return await super().alist(request, *args, **kwargs)
+
     def perform_create(self, serializer):
-        serializer.save()
+        loss_event = serializer.save()
+        evaluate_badges(self.request.user, 'loss_event_created', loss_events=[loss_event])
+
+    def perform_update(self, serializer):
+        loss_event = serializer.save()
+        evaluate_badges(self.request.user, 'loss_event_updated', loss_events=[loss_event])
 
+    def perform_bulk_create(self, loss_events):
+        evaluate_badges(self.request.user, 'loss_event_created', loss_events=loss_events)
 
-class InterventionViewSet(viewsets.ModelViewSet):
+    def perform_bulk_update(self, loss_events):
+        record_moves(loss_events)
+        evaluate_badges(self.request.user, 'loss_event_updated', loss_events=loss_events)
+
+
+class InterventionViewSet(ValuesReadMixin, BulkWriteMixin, viewsets.ModelViewSet):
     """CRUD for interventions per crop batch"""
     serializer_class = InterventionSerializer
+    pagination_class = InterventionPagination
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -168,8 +526,206 @@ class InterventionViewSet(viewsets.ModelViewSet):
             return Intervention.objects.none()
         return Intervention.objects.filter(batch__farmer=self.request.user)
 
+    @conditional_get()
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get()
+    async def alist(self, request, *args, **kwargs):
+        return await super().alist(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         intervention = serializer.save()
-        # Award "Risk Mitigated Expert" badge if intervention was successful
-        if intervention.success:
-            award_badge(intervention.batch.farmer, 'RISK_MITIGATOR')
+        evaluate_badges(self.request.user, 'intervention_created', interventions=[intervention])
+
+    def perform_update(self, serializer):
+        intervention = serializer.save()
+        evaluate_badges(self.request.user, 'intervention_updated', interventions=[intervention])
+
+    def perform_bulk_create(self, interventions):
+        # Batches were already checked to belong to the caller
+        evaluate_badges(self.request.user, 'intervention_created', interventions=interventions)
+
+    def perform_bulk_update(self, interventions):
+        evaluate_badges(self.request.user, 'intervention_updated', interventions=interventions)
+
+
+class ExportJobViewSet(SparseFieldsMixin,
+                       mixins.CreateModelMixin,
+                       mixins.ListModelMixin,
+                       mixins.RetrieveModelMixin,
+                       viewsets.GenericViewSet):
+    """
+    Queue large exports for the run_export_jobs worker and download the
+    finished gzip file (Range requests supported for resuming).
+    """
+    serializer_class = ExportJobSerializer
+    pagination_class = StandardResultsSetPagination
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return ExportJob.objects.none()
+        return ExportJob.objects.filter(requested_by=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(requested_by=self.request.user)
+
+    @action(detail=True, methods=['GET'])
+    def download(self, request, pk=None):
+        """Download the finished export"""
+        job = self.get_object()
+        if job.status != 'COMPLETED' or not job.file:
+            raise NotFound('Export is not ready yet.')
+        path = default_storage.path(job.file.name)
+        return ranged_file_response(request, path, 'application/gzip',
+                                    job.file.name.rsplit('/', 1)[-1])
+
+
+class HealthScanViewSet(SparseFieldsMixin,
+                        mixins.ListModelMixin,
+                        mixins.RetrieveModelMixin,
+                        viewsets.GenericViewSet):
+    """
+    Upload batch photos (multipart `batch` + `image`) for the
+    process_health_scans worker to thumbnail and classify. Filter with ?batch=.
+    """
+    serializer_class = HealthScanSerializer
+    pagination_class = StandardResultsSetPagination
+    permission_classes = [permissions.IsAuthenticated]
+
+    def initialize_request(self, request, *args, **kwargs):
+        # must be in place before anything reads the body
+        if request.method == 'POST':
+            self.upload_handler = HashingUploadHandler(request)
+            request.upload_handlers = [self.upload_handler]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return HealthScan.objects.none()
+        queryset = HealthScan.objects.filter(batch__farmer=self.request.user)
+        batch = self.request.query_params.get('batch')
+        if batch:
+            try:
+                queryset = queryset.filter(batch=CropBatch._meta.pk.to_python(batch))
+            except DjangoValidationError:
+                raise ValidationError({'batch': 'Must be a valid UUID.'})
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        """
+        Stage the photo and queue it. Returns 202 with the new scan, or 200
+        with the existing one when the same photo was already scanned for
+        the batch.
+        """
+        data = request.data     # streams the upload through the handler
+        handler = getattr(self, 'upload_handler', None)
+        if handler is not None and handler.too_large:
+            limit = settings.HEALTH_SCAN_MAX_UPLOAD_SIZE / (1024 * 1024)
+            raise ValidationError({'image': f'Images must be at most {limit:g} MB.'})
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            scan, created = create_scan(serializer.validated_data['batch'], serializer.validated_data['image'])
+        except ValueError as exc:
+            raise ValidationError({'image': str(exc)})
+        if created:
+            evaluate_badges(request.user, 'health_scan_created', scans=[scan])
+        return Response(self.get_serializer(scan).data, status=202 if created else 200)
+
+    @action(detail=False, methods=['GET'], url_path='status', url_name='status')
+    def progress(self, request):
+        """Processing progress of the farmer's scans (or one batch's, with ?batch=)"""
+        totals = self.get_queryset().aggregate(
+            total=Count('id'),
+            queued=Count('id', filter=Q(status='QUEUED')),
+            processing=Count('id', filter=Q(status='PROCESSING')),
+            done=Count('id', filter=Q(status='DONE')),
+            failed=Count('id', filter=Q(status='FAILED')),
+            fresh=Count('id', filter=Q(detection_result='FRESH')),
+            rotten=Count('id', filter=Q(detection_result='ROTTEN')),
+        )
+        finished = totals['done'] + totals['failed']
+        totals['progress'] = round(finished / totals['total'] * 100, 2) if totals['total'] else 100.0
+        return Response(totals)
+
+
+class SyncViewSet(viewsets.ViewSet):
+    """Delta sync for the mobile app"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        """
+        Everything created, updated or deleted since ?since=<token>.
+        Omit the token (or send an expired one) for a full sync, flagged by "full": true.
+        Store the returned token for the next call.
+        """
+        since = None
+        token = request.query_params.get('since')
+        if token:
+            try:
+                since = decode_token(token)
+            except ValueError:
+                raise ValidationError({'since': 'Invalid sync token.'})
+        return Response(collect_changes(request.user, since, {'request': request}))
+
+
+class CacheStatsViewSet(viewsets.ViewSet):
+    """Response cache hit/miss counters (staff only)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        return Response(get_metrics())
+
+
+class DatabaseStatsViewSet(viewsets.ViewSet):
+    """Connection reuse and pool counters of the process serving the request (staff only)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        return Response(get_connection_stats())
+
+
+class LossRollupViewSet(SparseFieldsMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Monthly loss totals per division, storage type and loss type across all
+    farmers (staff only), served from the table kept by refresh_loss_rollups.
+    Filter with ?division=, ?storage_type=, ?loss_type= and ?from=/?to= (YYYY-MM).
+    """
+    serializer_class = LossRollupSerializer
+    pagination_class = StandardResultsSetPagination
+    permission_classes = [permissions.IsAdminUser]
+    filter_fields = ('division', 'storage_type', 'loss_type')
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return LossRollup.objects.none()
+        queryset = LossRollup.objects.all()
+        for field in self.filter_fields:
+            value = self.request.query_params.get(field)
+            if value:
+                queryset = queryset.filter(**{field: value.upper()})
+        month_from = self._parse_month_param('from')
+        month_to = self._parse_month_param('to')
+        if month_from:
+            queryset = queryset.filter(month__gte=month_from)
+        if month_to:
+            queryset = queryset.filter(month__lte=month_to)
+        return queryset
+
+    def _parse_month_param(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_date(f'{value}-01' if len(value) == 7 else value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Month has wrong format. Use YYYY-MM.'})
+        return month_of(parsed)
+
+    @conditional_get()
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
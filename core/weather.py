@@ -0,0 +1,185 @@
+"""
+Current weather per division, behind a pluggable provider and a two-tier cache.
+
+Batches only live in the eight CropBatch.LOCATION_CHOICES divisions, so
+conditions are looked up per division rather than per batch. Lookups go
+through a small in-process LRU, then the shared Django cache, and only then
+to settings.WEATHER_PROVIDER. Misses are single-flight: concurrent callers
+in a process wait on one lock per division, and workers sharing the cache
+wait on an add()-based lock, so a cold division costs one provider call.
+"""
+import json
+import threading
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .cache import get_cache
+from .lru import LRUCache
+from .models import CropBatch, WeatherData
+
+LOCATIONS = [code for code, _ in CropBatch.LOCATION_CHOICES]
+CONDITION_FIELDS = ['temperature', 'humidity', 'rainfall_probability', 'wind_speed', 'description']
+
+# How often a worker waiting on another worker's fetch looks for its result
+WAIT_INTERVAL = 0.05
+
+MISSING = object()
+
+
+class WeatherUnavailable(Exception):
+    """The provider could not produce conditions right now"""
+
+
+class WeatherProvider:
+    """Source of current conditions, looked up one division at a time"""
+
+    def current(self, location):
+        """
+        Dict with CONDITION_FIELDS plus 'location' and 'date' for a division,
+        None when the provider knows nothing about it. Raises
+        WeatherUnavailable on transient failures, which are not cached.
+        """
+        raise NotImplementedError
+
+
+class FileWeatherProvider(WeatherProvider):
+    """
+    Reads {location: {field: value}} from settings.WEATHER_FIXTURE_PATH,
+    a local stand-in for a forecast API.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or settings.WEATHER_FIXTURE_PATH
+        self._data = None
+
+    def load(self):
+        if self._data is None:
+            try:
+                with open(self.path, encoding='utf-8') as handle:
+                    self._data = json.load(handle)
+            except (OSError, ValueError) as exc:
+                raise WeatherUnavailable(f"Cannot read {self.path}: {exc}")
+        return self._data
+
+    def current(self, location):
+        row = self.load().get(location)
+        if row is None:
+            return None
+        conditions = {name: row.get(name) for name in CONDITION_FIELDS}
+        return {'location': location, 'date': row.get('date', date.today().isoformat()), **conditions}
+
+
+class StoredWeatherProvider(WeatherProvider):
+    """Latest WeatherData row for the division up to today, e.g. from import_weather"""
+
+    def current(self, location):
+        row = (
+            WeatherData.objects.filter(location=location, forecast_date__lte=date.today())
+            .order_by('-forecast_date')
+            .values('forecast_date', *CONDITION_FIELDS)
+            .first()
+        )
+        if row is None:
+            return None
+        return {'location': location, 'date': row.pop('forecast_date').isoformat(), **row}
+
+
+_provider = None
+_local = None
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        _provider = import_string(settings.WEATHER_PROVIDER)()
+    return _provider
+
+
+def _local_cache():
+    global _local
+    if _local is None:
+        _local = LRUCache(settings.WEATHER_LOCAL_CACHE_SIZE, settings.WEATHER_LOCAL_CACHE_TIMEOUT)
+    return _local
+
+
+def _flight_lock(location):
+    with _flights_lock:
+        return _flights.setdefault(location, threading.Lock())
+
+
+def _conditions_key(location):
+    return f'hg:weather:{location}'
+
+
+def clear_weather_cache():
+    """Forget both tiers and the provider instance"""
+    global _provider, _local
+    _provider = None
+    _local = None
+    get_cache().delete_many([_conditions_key(location) for location in LOCATIONS])
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    if setting.startswith('WEATHER_'):
+        clear_weather_cache()
+
+
+def _fetch_shared(location):
+    """Read the shared tier, or fetch with at most one worker calling the provider"""
+    cache = get_cache()
+    key = _conditions_key(location)
+    conditions = cache.get(key, MISSING)
+    if conditions is not MISSING:
+        return conditions
+
+    lock_key = f'{key}:lock'
+    owner = cache.add(lock_key, 1, settings.WEATHER_FETCH_LOCK_TIMEOUT)
+    if not owner:
+        deadline = time.monotonic() + settings.WEATHER_FETCH_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            conditions = cache.get(key, MISSING)
+            if conditions is not MISSING:
+                return conditions
+        # the other worker died or is very slow: fetch ourselves
+    try:
+        conditions = get_provider().current(location)
+        cache.set(key, conditions, settings.WEATHER_CACHE_TIMEOUT)
+    finally:
+        if owner:
+            cache.delete(lock_key)
+    return conditions
+
+
+def current_conditions(location):
+    """Current conditions for a division, or None. May raise WeatherUnavailable."""
+    local = _local_cache()
+    conditions = local.get(location, MISSING)
+    if conditions is not MISSING:
+        return conditions
+    with _flight_lock(location):
+        # whoever held the lock before us may have filled it
+        conditions = local.get(location, MISSING)
+        if conditions is MISSING:
+            conditions = _fetch_shared(location)
+            local.set(location, conditions)
+    return conditions
+
+
+def all_current_conditions():
+    """{location: conditions or None} for every division; unavailable ones are None"""
+    conditions = {}
+    for location in LOCATIONS:
+        try:
+            conditions[location] = current_conditions(location)
+        except WeatherUnavailable:
+            conditions[location] = None
+    return conditions
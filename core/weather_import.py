@@ -0,0 +1,156 @@
+"""
+Streaming import of daily weather files into WeatherData.
+
+Rows are read lazily from CSV or JSON Lines files (optionally gzipped),
+validated, de-duplicated on (location, forecast_date) within each batch
+and upserted batch by batch, so memory stays flat however large the file.
+On PostgreSQL each batch is COPYed into a temporary table and merged with
+INSERT ... ON CONFLICT; other databases use bulk_create(update_conflicts=True).
+"""
+import csv
+import io
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date
+from itertools import islice
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import CropBatch, WeatherData
+from .record_files import detect_format, open_text, read_records
+
+IMPORT_BATCH_SIZE = 10000
+MAX_REPORTED_ERRORS = 20
+
+VALUE_FIELDS = ['temperature', 'humidity', 'rainfall_probability', 'wind_speed', 'description']
+
+# Accept division codes, display names and common alternative spellings, in any case
+LOCATIONS = {'barisal': 'BARISHAL', 'chattogram': 'CHITTAGONG'}
+for _code, _label in CropBatch.LOCATION_CHOICES:
+    LOCATIONS[_code.lower()] = _code
+    LOCATIONS[_label.lower()] = _code
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    written: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    elapsed: float = 0.0
+    errors: list = field(default_factory=list)
+
+    @property
+    def rate(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+def _number(record, name, default=None):
+    value = record.get(name)
+    if value in (None, ''):
+        if default is None:
+            raise ValueError(f"{name} is required")
+        return default
+    return float(value)
+
+
+def parse_record(record):
+    """Validate a raw record into ((location, forecast_date), value tuple)"""
+    if not isinstance(record, dict):
+        raise ValueError(str(record) if isinstance(record, Exception) else "Expected an object")
+    location = LOCATIONS.get(str(record.get('location') or '').strip().lower())
+    if location is None:
+        raise ValueError(f"Unknown location {record.get('location')!r}")
+    raw_date = record.get('forecast_date') or record.get('date')
+    if not raw_date:
+        raise ValueError("date is required")
+    forecast_date = date.fromisoformat(str(raw_date).strip()[:10])
+    humidity = _number(record, 'humidity')
+    if not 0 <= humidity <= 100:
+        raise ValueError("humidity must be between 0 and 100")
+    values = (
+        _number(record, 'temperature'),
+        humidity,
+        _number(record, 'rainfall_probability', 0.0),
+        _number(record, 'wind_speed', 0.0),
+        str(record.get('description') or '')[:100],
+    )
+    return (location, forecast_date), values
+
+
+def upsert_fallback(rows):
+    WeatherData.objects.bulk_create(
+        [WeatherData(location=location, forecast_date=forecast_date, **dict(zip(VALUE_FIELDS, values)))
+         for (location, forecast_date), values in rows.items()],
+        update_conflicts=True,
+        unique_fields=['location', 'forecast_date'],
+        update_fields=[*VALUE_FIELDS, 'updated_at'],
+    )
+
+
+def upsert_postgresql(rows):
+    """COPY the batch into a temporary table, then merge it in one statement"""
+    table = connection.ops.quote_name(WeatherData._meta.db_table)
+    columns = ['id', 'location', 'forecast_date', *VALUE_FIELDS, 'updated_at']
+    column_list = ', '.join(columns)
+    updates = ', '.join(f'{name} = EXCLUDED.{name}' for name in [*VALUE_FIELDS, 'updated_at'])
+    now = timezone.now().isoformat()
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for (location, forecast_date), values in rows.items():
+        writer.writerow([uuid.uuid4(), location, forecast_date.isoformat(), *values, now])
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE TEMPORARY TABLE weather_import (LIKE {table} INCLUDING DEFAULTS)')
+        # unquoted empty CSV fields are NULL to COPY; descriptions are never NULL
+        copy_sql = f'COPY weather_import ({column_list}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (description))'
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):   # psycopg2
+            raw.copy_expert(copy_sql, buffer)
+        else:                             # psycopg 3
+            with raw.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+        cursor.execute(
+            f'INSERT INTO {table} ({column_list}) SELECT {column_list} FROM weather_import '
+            f'ON CONFLICT (location, forecast_date) DO UPDATE SET {updates}'
+        )
+        cursor.execute('DROP TABLE weather_import')
+
+
+def import_weather(path, fmt=None, batch_size=IMPORT_BATCH_SIZE):
+    """Stream `path` into WeatherData. Returns ImportStats."""
+    fmt = fmt or detect_format(path)
+    upsert = upsert_postgresql if connection.vendor == 'postgresql' else upsert_fallback
+    stats = ImportStats()
+    started = time.monotonic()
+
+    with open_text(path) as stream:
+        records = read_records(stream, fmt)
+        while True:
+            chunk = list(islice(records, batch_size))
+            if not chunk:
+                break
+            rows = {}
+            for line_number, record in chunk:
+                stats.read += 1
+                try:
+                    key, values = parse_record(record)
+                except (TypeError, ValueError) as exc:
+                    stats.invalid += 1
+                    if len(stats.errors) < MAX_REPORTED_ERRORS:
+                        stats.errors.append(f"line {line_number}: {exc}")
+                    continue
+                if key in rows:
+                    stats.duplicates += 1
+                rows[key] = values          # the last reading of a day wins
+            if rows:
+                with transaction.atomic():
+                    upsert(rows)
+                stats.written += len(rows)
+
+    stats.elapsed = time.monotonic() - started
+    return stats